@@ -1,63 +1,331 @@
-"""Cache de preguntas frecuentes para respuestas rápidas."""
+"""Cache de respuestas del agente para responder sin llamar al LLM.
+
+La clave no es solo la pregunta. Hay dos alcances:
+- "global": preguntas sin contexto (horario, sucursales, requisitos de financiamiento...), ver
+  is_context_free. Valen para cualquier conversación y cualquier stock.
+- "context": todo lo demás. La clave lleva además un digest de la conversación previa (un "sí" o
+  "la 2" solo se repite en un thread con exactamente la misma historia) y la generación del stock
+  (StockRepository.stock_generation, digest de su contenido: precios y links citados no sobreviven
+  a un sync, y el mismo stock da la misma clave en cualquier worker o base recién creada).
+
+Las preguntas se normalizan antes de armar la clave (normalize_question: tildes, puntuación, emoji,
+abreviaciones chilenas, saludo inicial). Si una pregunta sin contexto no está tal cual, se busca la
+global más parecida en un índice de trigramas (agent.faq_index) con similitud >= FAQ_CACHE_SIMILARITY.
+
+Dos niveles: L1 en memoria (LRU + TTL; también recuerda por un rato las preguntas que no están)
+delante de la tabla SQLite (L2), que comparten los workers. Un acierto en L1 no toca SQLite: los
+hits se acumulan y se escriben en lote (cada _FLUSH_EVERY hits o _FLUSH_INTERVAL segundos, y en
+flush() al apagar). La tabla se acota al escribir: salen las entradas sin uso hace más de
+FAQ_CACHE_MAX_AGE_DAYS y, sobre FAQ_CACHE_MAX_ROWS, las de menos hits y más antiguas.
+"""
 from __future__ import annotations
 
 import hashlib
+import re
 import sqlite3
-from pathlib import Path
+import threading
+import time
+from typing import Any, Iterable
 
+from agent.faq_index import QuestionIndex
+from config import (
+    FAQ_CACHE_L1_SIZE,
+    FAQ_CACHE_L1_TTL,
+    FAQ_CACHE_MAX_AGE_DAYS,
+    FAQ_CACHE_MAX_ROWS,
+    FAQ_CACHE_SIMILARITY,
+)
+from db import ensure_schema
+from stock.cache import SearchCache
+from stock.normalize import fold
 
-def _conn(db_path: str) -> sqlite3.Connection:
-    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    c = sqlite3.connect(db_path)
+# Marca de "no está en SQLite" en L1; dura poco porque otro worker puede guardar la respuesta
+_MISS = object()
+_MISS_TTL = 30.0
+# Escritura en lote de los hits acumulados
+_FLUSH_EVERY = 64
+_FLUSH_INTERVAL = 30.0
+# Cada cuántos set se revisa el tamaño y la antigüedad de la tabla
+_EVICT_EVERY = 100
+
+GLOBAL = "global"
+CONTEXT = "context"
+
+# Temas que se responden igual en cualquier conversación y no dependen del stock
+_CONTEXT_FREE = re.compile(
+    r"\b(horarios?|abren|cierran|atienden|direcci[oó]n|d[oó]nde (est[aá]n|quedan|se ubican)|sucursal(es)?|"
+    r"requisitos|documentos|papeles|financi(an|amiento|ar)|cr[eé]dito|garant[ií]a|parte de pago|retoma|"
+    r"test drive|prueba de manejo|transferencia)\b"
+)
+# Abreviaciones y modismos de chat (texto ya plegado) -> forma completa
+ABBREVIATIONS: dict[str, str] = {
+    "q": "que", "k": "que", "ke": "que", "xq": "porque", "pq": "porque", "porq": "porque",
+    "x": "por", "d": "de", "tb": "tambien", "tmb": "tambien", "tbn": "tambien", "dnd": "donde",
+    "cdo": "cuando", "cuantos": "cuanto", "cuanta": "cuanto", "cuantas": "cuanto",
+    "hr": "hora", "hrs": "horas", "info": "informacion", "ud": "usted", "uds": "ustedes",
+    "porfa": "por favor", "xfa": "por favor", "xfavor": "por favor", "pls": "por favor", "plis": "por favor",
+    "stgo": "santiago", "aprox": "aproximadamente", "wsp": "whatsapp", "wasap": "whatsapp",
+    "automaticos": "automatico", "automaticas": "automatico", "automatica": "automatico",
+    "mecanicos": "mecanico", "mecanicas": "mecanico", "mecanica": "mecanico",
+}
+# Saludos y cortesía al inicio: no cambian la pregunta ("hola, horario?" = "horario?")
+_LEADING_FILLER = {
+    "hola", "ola", "holi", "buenas", "buenos", "buen", "dia", "dias", "tardes", "noches",
+    "wena", "wenas", "hey", "saludos", "disculpa", "disculpe", "consulta", "pregunta",
+}
+_NOT_WORD = re.compile(r"[^\w\s]|_")
+
+# Referencias a algo dicho antes ("ese", "la 2") o montos: dependen de la conversación
+_REFERS_BACK = re.compile(r"\d|\b(es[eao]s?|est[eao]s?|aquel(la|los|las)?|anterior|mism[oa]|otr[oa]s?|tambi[eé]n)\b")
+
+
+def _create_schema(c: sqlite3.Connection) -> None:
     c.execute("""
         CREATE TABLE IF NOT EXISTS faq_cache (
             question_hash TEXT PRIMARY KEY,
             question_normalized TEXT,
             answer TEXT,
             hits INTEGER DEFAULT 1,
+            scope TEXT,
+            stock_generation INTEGER,
             created_at TEXT DEFAULT (datetime('now')),
             updated_at TEXT DEFAULT (datetime('now'))
         )
     """)
-    return c
+    # Tablas de antes de los alcances: sus claves eran solo la pregunta y no son seguras de servir
+    columns = {row["name"] for row in c.execute("PRAGMA table_info(faq_cache)")}
+    if "scope" not in columns:
+        c.execute("DELETE FROM faq_cache")
+        c.execute("ALTER TABLE faq_cache ADD COLUMN scope TEXT")
+        c.execute("ALTER TABLE faq_cache ADD COLUMN stock_generation INTEGER")
+    elif "stock_generation" not in columns:
+        # Las con contexto iban por el contador de versión, que se repite entre bases: no son seguras
+        c.execute("DELETE FROM faq_cache WHERE scope = ?", (CONTEXT,))
+        c.execute("DROP INDEX IF EXISTS idx_faq_cache_version")
+        c.execute("ALTER TABLE faq_cache RENAME COLUMN stock_version TO stock_generation")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_faq_cache_updated ON faq_cache(updated_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_faq_cache_generation ON faq_cache(stock_generation)")
+
+
+def _conn(db_path: str) -> sqlite3.Connection:
+    return ensure_schema(db_path, "faq_cache", _create_schema)
+
+
+def normalize_question(text: str) -> str:
+    """Forma canónica de una pregunta: sin tildes, puntuación ni emoji, abreviaciones expandidas
+    y sin el saludo inicial (si queda algo después). "¿Tienen autos automáticos? 🚗" -> "tienen autos automatico".
+    """
+    words = [ABBREVIATIONS.get(w, w) for w in _NOT_WORD.sub(" ", fold(text)).split()]
+    start = 0
+    while start < len(words) - 1 and words[start] in _LEADING_FILLER:
+        start += 1
+    return " ".join(words[start:])
+
+
+def is_context_free(question: str) -> bool:
+    """¿La pregunta se responde igual en cualquier conversación? (horario, sucursales, requisitos...)"""
+    return _context_free(normalize_question(question))
+
+
+def _context_free(normalized: str) -> bool:
+    return len(normalized) <= 120 and bool(_CONTEXT_FREE.search(normalized)) and not _REFERS_BACK.search(normalized)
+
+
+def context_digest(turns: Iterable[tuple[str, str]]) -> str:
+    """Digest de la conversación previa: (rol, texto) de cada mensaje, en orden. "" si no hay historia."""
+    h = hashlib.sha256()
+    empty = True
+    for role, text in turns:
+        h.update(role.encode())
+        h.update(b"\0")
+        h.update(" ".join(text.lower().split()).encode())
+        h.update(b"\1")
+        empty = False
+    return "" if empty else h.hexdigest()
 
 
 class FAQCache:
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        l1_size: int = FAQ_CACHE_L1_SIZE,
+        l1_ttl: float = FAQ_CACHE_L1_TTL,
+        max_rows: int = FAQ_CACHE_MAX_ROWS,
+        max_age_days: float = FAQ_CACHE_MAX_AGE_DAYS,
+        similarity: float = FAQ_CACHE_SIMILARITY,
+    ):
         self.db_path = db_path
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self._l1 = SearchCache(maxsize=l1_size, ttl=l1_ttl)
+        # question_hash -> hits aún no escritos en SQLite
+        self._pending: dict[str, int] = {}
+        self._pending_total = 0
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._sets = 0
+        self._stock_generation: int | None = None
+        self.evicted = 0
+        self.hits = {GLOBAL: 0, CONTEXT: 0, "similar": 0}
+        # Preguntas globales para el match aproximado; se llena desde SQLite en el primer uso
+        self.similarity = similarity
+        self._near: QuestionIndex | None = None
+        self._near_lock = threading.Lock()
 
-    def _hash(self, text: str) -> str:
-        normalized = " ".join(text.lower().split())
-        return hashlib.sha256(normalized.encode()).hexdigest()
+    @staticmethod
+    def _l1_key(scope: str, normalized: str, context: str, stock_generation: int | None) -> tuple:
+        if scope == GLOBAL:
+            return (GLOBAL, normalized)
+        return (CONTEXT, normalized, context, stock_generation)
 
-    def get(self, question: str) -> str | None:
-        key = self._hash(question)
-        with _conn(self.db_path) as c:
-            row = c.execute(
-                "SELECT answer, hits FROM faq_cache WHERE question_hash = ?",
-                (key,),
+    def _lookup(self, l1_key: tuple) -> tuple[str, str] | None:
+        # L1 va por la tupla: el sha256 solo se calcula al ir a SQLite
+        cached = self._l1.get(l1_key)
+        if cached is None:
+            key = hashlib.sha256("\0".join(map(str, l1_key)).encode()).hexdigest()
+            row = _conn(self.db_path).execute(
+                "SELECT answer FROM faq_cache WHERE question_hash = ?", (key,)
             ).fetchone()
-            if row:
-                answer, hits = row
-                c.execute(
-                    "UPDATE faq_cache SET hits = ?, updated_at = datetime('now') WHERE question_hash = ?",
-                    (hits + 1, key),
-                )
+            cached = (row[0], key) if row else _MISS
+            self._l1.put(l1_key, cached, ttl=None if row else _MISS_TTL)
+        return None if cached is _MISS else cached
+
+    def _near_index(self) -> QuestionIndex | None:
+        if not 0 < self.similarity < 1:
+            return None
+        if self._near is None:
+            with self._near_lock:
+                if self._near is None:
+                    index = QuestionIndex(self.similarity)
+                    for (normalized,) in _conn(self.db_path).execute(
+                        "SELECT question_normalized FROM faq_cache WHERE scope = ?", (GLOBAL,)
+                    ):
+                        index.add(normalized)
+                    self._near = index
+        return self._near
+
+    def get(self, question: str, *, context: str = "", stock_generation: int | None = None) -> str | None:
+        """Respuesta global para la pregunta o, si no hay, la de esta misma historia y generación del stock.
+        Si tampoco y la pregunta no tiene contexto, la global más parecida (ver agent.faq_index)."""
+        normalized = normalize_question(question)
+        for scope in (GLOBAL, CONTEXT):
+            cached = self._lookup(self._l1_key(scope, normalized, context, stock_generation))
+            if cached is not None:
+                answer, key = cached
+                self.hits[scope] += 1
+                self._count_hit(key)
+                return answer
+        near = self._near_index() if _context_free(normalized) else None
+        match = near.best(normalized) if near is not None else None
+        if match is not None:
+            cached = self._lookup((GLOBAL, match[0]))
+            if cached is not None:
+                answer, key = cached
+                self.hits["similar"] += 1
+                self._count_hit(key)
                 return answer
         return None
 
-    def set(self, question: str, answer: str) -> None:
-        key = self._hash(question)
-        normalized = " ".join(question.lower().split())
+    def set(
+        self,
+        question: str,
+        answer: str,
+        *,
+        scope: str = CONTEXT,
+        context: str = "",
+        stock_generation: int | None = None,
+    ) -> None:
+        normalized = normalize_question(question)
+        l1_key = self._l1_key(scope, normalized, context, stock_generation)
+        key = hashlib.sha256("\0".join(map(str, l1_key)).encode()).hexdigest()
+        generation = stock_generation if scope == CONTEXT else None
         with _conn(self.db_path) as c:
             c.execute(
                 """
-                INSERT INTO faq_cache (question_hash, question_normalized, answer, hits)
-                VALUES (?, ?, ?, 1)
+                INSERT INTO faq_cache (question_hash, question_normalized, answer, hits, scope, stock_generation)
+                VALUES (?, ?, ?, 1, ?, ?)
                 ON CONFLICT(question_hash) DO UPDATE SET
                     answer = excluded.answer,
                     hits = hits + 1,
                     updated_at = datetime('now')
                 """,
-                (key, normalized, answer),
+                (key, normalized, answer, scope, generation),
             )
+        self._l1.put(l1_key, (answer, key))
+        if scope == GLOBAL and self._near is not None:
+            self._near.add(normalized)
+        self._sets += 1
+        if generation is not None and generation != self._stock_generation:
+            # Stock nuevo: las respuestas con contexto de otras generaciones ya no se pueden servir
+            self._stock_generation = generation
+            self.evict()
+        elif self._sets % _EVICT_EVERY == 1:
+            self.evict()
+
+    def _count_hit(self, key: str) -> None:
+        with self._pending_lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+            self._pending_total += 1
+            due = self._pending_total >= _FLUSH_EVERY or time.monotonic() - self._last_flush >= _FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """Escribe en SQLite los hits acumulados (un executemany); también actualiza updated_at."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        with _conn(self.db_path) as c:
+            c.executemany(
+                "UPDATE faq_cache SET hits = hits + ?, updated_at = datetime('now') WHERE question_hash = ?",
+                [(hits, key) for key, hits in pending.items()],
+            )
+
+    def evict(self) -> int:
+        """Borra las entradas con contexto de otras generaciones del stock, las sin uso hace más de max_age_days
+        y, sobre max_rows, las de menos hits y más antiguas."""
+        self.flush()
+        with _conn(self.db_path) as c:
+            removed = [
+                tuple(row)
+                for row in c.execute(
+                    "DELETE FROM faq_cache WHERE updated_at < datetime('now', ?) OR (scope = ? AND stock_generation != ?) "
+                    "RETURNING scope, question_normalized",
+                    (f"-{self.max_age_days} days", CONTEXT, self._stock_generation),
+                ).fetchall()
+            ]
+            excess = c.execute("SELECT COUNT(*) FROM faq_cache").fetchone()[0] - self.max_rows
+            if excess > 0:
+                removed += [
+                    tuple(row)
+                    for row in c.execute(
+                        "DELETE FROM faq_cache WHERE question_hash IN ("
+                        "SELECT question_hash FROM faq_cache ORDER BY hits, updated_at LIMIT ?"
+                        ") RETURNING scope, question_normalized",
+                        (excess,),
+                    ).fetchall()
+                ]
+        # En L1 basta sacar las globales: las con contexto llevan la generación en la clave y salen por LRU/TTL
+        for scope, normalized in removed:
+            if scope == GLOBAL:
+                self._l1.pop((GLOBAL, normalized))
+                if self._near is not None:
+                    self._near.remove(normalized)
+        self.evicted += len(removed)
+        return len(removed)
+
+    def stats(self) -> dict[str, Any]:
+        with self._pending_lock:
+            pending = self._pending_total
+        return {
+            "l1": self._l1.stats(),
+            "hits": dict(self.hits),
+            "similar_index": len(self._near) if self._near is not None else None,
+            "pending_hits": pending,
+            "evicted": self.evicted,
+            "stock_generation": self._stock_generation,
+        }
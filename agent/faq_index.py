@@ -0,0 +1,105 @@
+"""Índice de preguntas casi iguales: trigramas de caracteres + MinHash con LSH por bandas.
+
+Cada pregunta (ya normalizada, ver agent.faq_cache.normalize_question) es el conjunto de sus
+trigramas. Su firma MinHash (_NUM_PERM mínimos de hashes permutados, calculados con NumPy) se
+parte en _BANDS bandas; dos preguntas son candidatas si coinciden en alguna banda completa, lo
+que con similitud 0.8 pasa casi siempre y con 0.3 rara vez. Los candidatos se confirman con la
+similitud de Jaccard exacta de los trigramas (a lo más _MAX_CANDIDATES, los de más bandas en
+común): una búsqueda toca unas pocas entradas, no todas.
+"""
+from __future__ import annotations
+
+import threading
+from collections import Counter
+
+import numpy as np
+
+_NUM_PERM = 48
+_BANDS = 16
+_ROWS = _NUM_PERM // _BANDS
+# Candidatos que se confirman con Jaccard exacto: los que coinciden en más bandas
+_MAX_CANDIDATES = 16
+# Primo sobre 2^32: con a, b y el hash < 2^32, a * h + b cabe en uint64
+_PRIME = np.uint64(4294967311)
+
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, 2**32 - 1, _NUM_PERM, dtype=np.uint64)[:, None]
+_B = _rng.integers(0, 2**32 - 1, _NUM_PERM, dtype=np.uint64)[:, None]
+
+
+def trigrams(text: str) -> frozenset[str]:
+    padded = f" {text} "
+    if len(padded) < 3:
+        return frozenset((padded,))
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _signature(grams: frozenset[str]) -> np.ndarray:
+    # hash() de str cambia entre procesos, pero el índice vive en memoria y se arma en cada uno
+    hashes = np.fromiter((hash(g) & 0xFFFFFFFF for g in grams), dtype=np.uint64, count=len(grams))
+    return ((_A * hashes + _B) % _PRIME).min(axis=1)
+
+
+def _bands(signature: np.ndarray) -> list[tuple[int, bytes]]:
+    return [(band, signature[band * _ROWS:(band + 1) * _ROWS].tobytes()) for band in range(_BANDS)]
+
+
+class QuestionIndex:
+    """Preguntas normalizadas -> la más parecida sobre un umbral de Jaccard de trigramas."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._grams: dict[str, frozenset[str]] = {}
+        self._band_keys: dict[str, list[tuple[int, bytes]]] = {}
+        self._buckets: dict[tuple[int, bytes], set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def add(self, text: str) -> None:
+        if not text or text in self._grams:
+            return
+        grams = trigrams(text)
+        keys = _bands(_signature(grams))
+        with self._lock:
+            self._grams[text] = grams
+            self._band_keys[text] = keys
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(text)
+
+    def remove(self, text: str) -> None:
+        with self._lock:
+            if self._grams.pop(text, None) is None:
+                return
+            for key in self._band_keys.pop(text):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(text)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def best(self, text: str) -> tuple[str, float] | None:
+        """(pregunta indexada, similitud) de la más parecida a `text` con similitud >= umbral, o None."""
+        if not text or not self._grams:
+            return None
+        grams = trigrams(text)
+        keys = _bands(_signature(grams))
+        with self._lock:
+            # Bandas en común ~ similitud estimada: solo se confirman los mejores
+            votes = Counter()
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket:
+                    votes.update(bucket)
+            scored = [(jaccard(grams, self._grams[c]), c) for c, _ in votes.most_common(_MAX_CANDIDATES)]
+        if not scored:
+            return None
+        score, match = max(scored)
+        return (match, score) if score >= self.threshold else None
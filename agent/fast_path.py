@@ -0,0 +1,267 @@
+"""Respuestas sin LLM para turnos de forma fija: saludos, agradecimientos y cambios de plazo o pie.
+
+Muchos turnos de WhatsApp son "hola", "gracias", "a 48?" o "5m en 36" justo después de una lista.
+Con la intención ya clasificada (agent.intent) y los mensajes del thread, estas reglas responden
+directo:
+- saludo solo (sin pregunta): plantilla según la hora que nombra ("buenas tardes" -> "¡Buenas tardes!").
+- "gracias" / "ok": plantilla; "ok" solo si el agente no acababa de preguntar algo.
+- solo condiciones de financiamiento: recalcula la cuota (misma fórmula que calculate_cuota) de los
+  autos de la última lista mostrada, con el pie y el plazo nuevos; lo que no dice (pie o plazo) sale
+  de las últimas llamadas de financiamiento del thread.
+
+La respuesta trae los mensajes del turno para el checkpoint: el del cliente, las llamadas a
+calculate_cuota (con su resultado real) y la respuesta, así el LLM sigue viendo la conversación
+completa en el turno siguiente. Si una regla no aplica (sin lista reciente, sin pie conocido...) no
+hay respuesta y el turno va al agente.
+"""
+from __future__ import annotations
+
+import re
+import uuid
+from dataclasses import dataclass
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent.intent import GREETING, SHORT_REPLY, Intent
+from agent.tools import calculate_cuota, vehicles_by_refs
+from config import FINANCIAMIENTO_PIE_MAX, FINANCIAMIENTO_PIE_MIN
+from stock.financing import DEFAULT_PLAZO, cuotas, normalize_plazo
+from stock.normalize import fold
+
+# Cuántos turnos del cliente hacia atrás se busca la última lista mostrada
+_LOOKBACK_TURNS = 3
+_LIST_TOOLS = ("search_stock", "similar_vehicles")
+# Patente al final del link de una ficha ("www.pompeyo.cl/usados/TFDL48" o "#TFDL48" en modo compacto)
+_REF = re.compile(r"(?:usados/|#)([A-Za-z0-9]+)")
+_WORD = re.compile(r"[a-z0-9]+")
+# Id de las llamadas a calculate_cuota que escribe este módulo en el thread
+_CALL_PREFIX = "call_fast_"
+
+_GREETING_WORDS = frozenset({
+    "hola", "holaa", "holi", "ola", "buenas", "buenass", "buenos", "buen", "dia", "dias", "tardes",
+    "noches", "hey", "hi", "hello", "que", "tal", "saludos", "cordiales", "wena", "wenas",
+})
+_THANKS_WORDS = frozenset({"gracias", "muchas", "mil", "muy", "amable", "ok", "dale", "perfecto", "genial"})
+_ACK_WORDS = frozenset({"ok", "oka", "okey", "okay", "dale", "perfecto", "genial", "excelente", "vale", "bacan"})
+
+_GREETING_REPLY = (
+    "{saludo} Soy Jaime, ejecutivo de ventas de Pompeyo Carrasco Usados. "
+    "¿Qué tipo de auto buscas y qué presupuesto tienes en mente?"
+)
+_GREETING_AGAIN_REPLY = "{saludo} Aquí sigo. ¿En qué te puedo ayudar?"
+_THANKS_REPLY = "¡De nada! Si quieres ver más opciones o simular el financiamiento de alguna, me avisas."
+_ACK_REPLY = "¡Perfecto! ¿Te ayudo con algo más? Puedo mostrarte más opciones o calcular la cuota de la que te guste."
+
+# Turnos respondidos por regla y, en "declined", los que tenían la forma de una regla pero el thread
+# no la dejó aplicar (sin lista reciente, "ok" a una pregunta...) y fueron al agente; para /admin/stats
+_counts = {"greeting": 0, "thanks": 0, "ack": 0, "financing": 0, "declined": 0}
+
+
+@dataclass(slots=True)
+class FastReply:
+    answer: str
+    rule: str
+    # Mensajes del turno para el checkpoint (desde el del cliente hasta la respuesta)
+    messages: list
+
+
+def is_fast_candidate(intent: Intent) -> bool:
+    """¿Puede responderse sin LLM? Barato: decide si vale la pena leer el thread."""
+    return intent.kind in (GREETING, SHORT_REPLY) or intent.terms_only
+
+
+def fast_path_stats() -> dict:
+    return dict(_counts)
+
+
+def _text(m) -> str:
+    c = getattr(m, "content", None)
+    return c if isinstance(c, str) else ""
+
+
+def _pesos(value: float) -> str:
+    """$14.580.000 (separador de miles chileno, como se le escribe al cliente)."""
+    return f"${value:,.0f}".replace(",", ".")
+
+
+def _saludo(words: set[str]) -> str:
+    if "tardes" in words:
+        return "¡Buenas tardes!"
+    if "noches" in words:
+        return "¡Buenas noches!"
+    if "dia" in words or "dias" in words:
+        return "¡Buenos días!"
+    return "¡Hola!"
+
+
+def _last_agent_text(prior: list) -> str:
+    for m in reversed(prior):
+        if getattr(m, "type", None) == "ai" and _text(m):
+            return _text(m)
+    return ""
+
+
+def _template(intent: Intent, message: str, prior: list) -> tuple[str, str | None] | None:
+    """(regla, respuesta) para saludos y agradecimientos sin nada más en el mensaje; respuesta None
+    si el mensaje tiene esa forma pero el thread no deja usar la plantilla. None si no la tiene."""
+    words = set(_WORD.findall(fold(message)))
+    if not words:
+        return None
+    started = any(getattr(m, "type", None) == "human" for m in prior)
+    if intent.kind == GREETING and words <= _GREETING_WORDS:
+        template = _GREETING_AGAIN_REPLY if started else _GREETING_REPLY
+        return "greeting", template.format(saludo=_saludo(words))
+    if "gracias" in words and words <= _THANKS_WORDS:
+        return "thanks", _THANKS_REPLY if started else None
+    if words <= _ACK_WORDS:
+        # "ok" a una pregunta del agente es una respuesta ("¿son para el pie?" -> "ok"): va al agente
+        return "ack", _ACK_REPLY if started and "?" not in _last_agent_text(prior) else None
+    return None
+
+
+def _recent(prior: list) -> list:
+    """Mensajes desde el _LOOKBACK_TURNS-ésimo turno del cliente contando desde el final. Los
+    recálculos hechos aquí no cuentan: "a 48?", "y con 40%?", "y a 36" siguen sobre la misma lista."""
+    seen = 0
+    recalculated = False
+    for i in range(len(prior) - 1, -1, -1):
+        m = prior[i]
+        kind = getattr(m, "type", None)
+        if kind == "ai" and any((c.get("id") or "").startswith(_CALL_PREFIX) for c in getattr(m, "tool_calls", None) or []):
+            recalculated = True
+        elif kind == "human":
+            if not recalculated:
+                seen += 1
+                if seen == _LOOKBACK_TURNS:
+                    return prior[i:]
+            recalculated = False
+    return prior
+
+
+def _last_list(prior: list) -> tuple[list[str], list[dict] | dict | None] | None:
+    """(patentes de la última lista mostrada, condiciones de financiamiento vigentes) o None.
+
+    Las condiciones son la lista de args de las últimas llamadas a calculate_cuota (una por auto)
+    o los args de la última calculate_cuotas / search_stock con pie.
+    """
+    window = _recent(prior)
+    outputs = {m.tool_call_id: _text(m) for m in window if getattr(m, "type", None) == "tool"}
+    terms: list[dict] | dict | None = None
+    for m in reversed(window):
+        calls = getattr(m, "tool_calls", None) if getattr(m, "type", None) == "ai" else None
+        if not calls:
+            continue
+        if terms is None:
+            singles = [c["args"] for c in calls if c["name"] == "calculate_cuota"]
+            if singles:
+                terms = singles
+            else:
+                terms = next(
+                    (c["args"] for c in calls if c["name"] in ("calculate_cuotas", "search_stock") and c["args"].get("pie")),
+                    None,
+                )
+        for c in reversed(calls):
+            if c["name"] == "calculate_cuotas":
+                refs = [str(r) for r in c["args"].get("vehiculos") or []]
+            elif c["name"] in _LIST_TOOLS:
+                refs = _REF.findall(outputs.get(c.get("id"), ""))
+            else:
+                continue
+            if refs:
+                return list(dict.fromkeys(refs)), terms
+    return None
+
+
+def _financing(intent: Intent, prior: list) -> tuple[str, list] | None:
+    """(respuesta, llamadas a calculate_cuota con sus resultados) con las condiciones nuevas."""
+    found = _last_list(prior)
+    if found is None:
+        return None
+    refs, terms = found
+    vehicles = [v for v in vehicles_by_refs(refs) if v is not None and v.precio]
+    if not vehicles:
+        return None
+    prev_pies: list[float] | None = None
+    prev_plazo = None
+    if isinstance(terms, list):
+        # Cuota calculada auto por auto (ej. el que eligió de la lista): se recalculan esos
+        by_price = {float(a.get("precio_lista") or 0): a for a in terms}
+        vehicles = [v for v in vehicles if float(v.precio) in by_price]
+        if not vehicles:
+            return None
+        prev_pies = [float(by_price[float(v.precio)].get("pie") or 0) for v in vehicles]
+        prev_plazo = terms[0].get("plazo")
+    elif terms:
+        prev_pies = [float(terms["pie"])] * len(vehicles)
+        prev_plazo = terms.get("plazo")
+
+    precios = np.array([float(v.precio) for v in vehicles], dtype=np.float64)
+    if intent.pie is not None:
+        pies = np.full(len(vehicles), float(intent.pie))
+        header = f"Con pie de {_pesos(intent.pie)}"
+    elif intent.pie_pct is not None:
+        if not 0 < intent.pie_pct <= 100:
+            return None
+        pies = precios * intent.pie_pct / 100
+        header = f"Con {intent.pie_pct}% de pie"
+    elif prev_pies:
+        pies = np.array(prev_pies, dtype=np.float64)
+        header = "Con el mismo pie"
+    else:
+        return None
+    plazo = normalize_plazo(intent.plazo or (int(prev_plazo) if prev_plazo else DEFAULT_PLAZO))
+    pie_efectivo, cuota = cuotas(precios, pies, plazo)
+
+    lines = [f"{header} a {plazo} meses, las cuotas quedan así:"]
+    for i, v in enumerate(vehicles):
+        lines.append(
+            f"{i + 1}. {v.marca or ''} {v.modelo or ''} ({v.año or 'N/A'}) - {_pesos(precios[i])} - "
+            f"pie {_pesos(pie_efectivo[i])} - cuota {_pesos(cuota[i])}/mes"
+        )
+        link = (v.link or "").strip()
+        if link:
+            lines.append(link if link.startswith("http") else f"https://{link}")
+    if (pies < precios * FINANCIAMIENTO_PIE_MIN - 0.5).any():
+        lines.append(
+            f"El pie mínimo es {FINANCIAMIENTO_PIE_MIN:.0%} del precio (también puedes pagarlo con tarjetas de crédito); "
+            "donde no alcanzaba, la cuota ya está calculada con ese mínimo."
+        )
+    if (pies > precios * FINANCIAMIENTO_PIE_MAX + 0.5).any():
+        lines.append(
+            f"El pie máximo es {FINANCIAMIENTO_PIE_MAX:.0%} del precio; donde tu pie lo supera, la cuota usa ese "
+            "máximo y el resto queda para ti."
+        )
+    lines.append("¿Qué te parece?")
+
+    calls, results = [], []
+    for precio, pie in zip(precios.tolist(), pies.tolist()):
+        call_id = f"{_CALL_PREFIX}{uuid.uuid4().hex[:16]}"
+        args = {"precio_lista": precio, "pie": round(pie), "plazo": plazo}
+        calls.append({"name": "calculate_cuota", "args": args, "id": call_id})
+        results.append(ToolMessage(content=calculate_cuota.func(**args), name="calculate_cuota", tool_call_id=call_id))
+    return "\n".join(lines), [AIMessage(content="", tool_calls=calls), *results]
+
+
+def fast_reply(intent: Intent, message: str, prior: list) -> FastReply | None:
+    """Respuesta sin LLM para el mensaje, o None si va al agente. prior: mensajes ya en el thread."""
+    if not is_fast_candidate(intent):
+        return None
+    tool_messages: list = []
+    if intent.terms_only:
+        rule = "financing"
+        done = _financing(intent, prior)
+        answer, tool_messages = done if done is not None else (None, [])
+    else:
+        rule, answer = _template(intent, message, prior) or (None, None)
+    if rule is None:
+        return None
+    if answer is None:
+        _counts["declined"] += 1
+        return None
+    _counts[rule] += 1
+    return FastReply(
+        answer=answer,
+        rule=rule,
+        messages=[HumanMessage(content=message), *tool_messages, AIMessage(content=answer)],
+    )
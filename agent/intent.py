@@ -0,0 +1,224 @@
+"""Pre-clasificador de intención de un mensaje, en una sola pasada y sin LLM.
+
+Reconoce las formas de mensaje que no pasan por el filtro de off-topic (saludos y respuestas
+cortas, presupuesto, elección de una opción, datos de lead, seguimiento de financiamiento) y
+extrae de paso los datos: montos en millones, pie (en pesos o %), plazo, número de opción, RUT
+y correo. El texto se normaliza una vez y se recorre con expresiones precompiladas; el
+orquestador y los atajos sin LLM reutilizan lo extraído sin volver a parsear.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+from config import FINANCIAMIENTO_PLAZOS
+
+GREETING = "greeting"
+SHORT_REPLY = "short_reply"
+BUDGET = "budget"
+OPTION = "option"
+LEAD_DATA = "lead_data"
+FINANCING = "financing"
+OTHER = "other"
+
+_GREETINGS = (
+    "hola", "buenas", "buenos días", "buen día", "buenas tardes", "buenas noches",
+    "hey", "hi", "hello", "qué tal", "tal", "saludos", "buenass", "ola",
+)
+_GREETING_START = re.compile(r"^(?:" + "|".join(map(re.escape, _GREETINGS)) + r")(?:$|[ ,])")
+_GREETING_ANYWHERE = re.compile(r"hola|buenas|buenos|saludos|qué tal")
+_SHORT_TEXT_CHARS = re.compile(r"[^\W\d_]|[\s.,!?¿¡']")
+_NAME_CHARS = re.compile(r"[^\W\d_]|[\s.\-']")
+
+# "12 millones", "3 palos", "12mm", "9,5m": número + unidad de millones
+_MILLIONS_AMOUNT = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:millones|millón|millon|palos|mm|m)\b")
+_PLAZO = re.compile(r"\b(" + "|".join(str(p) for p in FINANCIAMIENTO_PLAZOS) + r")\b")
+_PLAZO_NUMBERS = re.compile("|".join(str(p) for p in FINANCIAMIENTO_PLAZOS))
+_PLAZO_FILLER = re.compile(r"a|en|cuotas|cuota|y|\s")
+_PIE_PERCENT = re.compile(r"(\d{1,3})\s*(?:%|por ?ciento)")
+_PERCENT_EDGE = re.compile(r"^\s*\d{1,3}\s*%|\d{1,3}\s*%\s*$")
+_PERCENT_ONLY = re.compile(r"^(?:y )?(?:con )?\d{1,3}\s*(?:%|por ?ciento)(?: de pie| pie)?\s*[?.!]*$")
+_MONTO_EN_PLAZO = re.compile(r"^(.+?) en (" + "|".join(str(p) for p in FINANCIAMIENTO_PLAZOS) + r")$")
+_MILLION_WORDS = re.compile(r"millones|millón|millon|palos")
+_FIRST_NUMBER = re.compile(r"\d+")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_OPTION_WORD = re.compile(r"opcion|opción|opciòn|opciin")
+
+_FINANCING_WORDS = re.compile(
+    r"cuota|cara|barata|alta|baja|financiar|financiamiento|pie|plazo|mensual|pagando|pagar "
+)
+_FOLLOW_PHRASES = re.compile(
+    r"listo|te envi|mi nombre|mi correo|mi rut|ahí está|envié|enviado|datos|nombre es|correo es|"
+    r"rut es|te pas|aquí está|es |soy "
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Intent:
+    kind: str
+    # Monto en pesos expresado en millones o como cifra ("12 palos", "12.000.000")
+    millions: int | None = None
+    # Pie en pesos ("5m en 36") o en porcentaje ("30%")
+    pie: int | None = None
+    pie_pct: int | None = None
+    plazo: int | None = None
+    option: int | None = None
+    rut: str | None = None
+    email: str | None = None
+    # El mensaje es solo condiciones de financiamiento ("a 48?", "5m en 36", "30%"), sin más texto
+    terms_only: bool = False
+
+    @property
+    def skip_off_topic(self) -> bool:
+        """Formas de respuesta dentro de una conversación de venta: no pasan por el filtro de off-topic."""
+        return self.kind != OTHER
+
+
+def _millions_value(lower: str, compact: str) -> int | None:
+    """Pesos del monto expresado en millones (1-5 dígitos = millones, 6+ = pesos)."""
+    m = _MILLIONS_AMOUNT.search(lower)
+    if m:
+        return int(float(m.group(1).replace(",", ".")) * 1_000_000)
+    digits = compact.replace("palos", "").replace("mm", "").rstrip("m")
+    if digits.isdigit():
+        n = int(digits)
+        return n * 1_000_000 if len(digits) <= 5 else n
+    return None
+
+
+def _expresses_millions(lower: str, nospace: str, compact: str) -> bool:
+    """¿El texto expresa un monto en millones (Chile)? 12mm, 12m, 12 palos, 12 millones, 12.000.000."""
+    if len(lower) > 80:
+        return False
+    if "millon" in lower:
+        return True
+    if "palos" in lower:
+        without = compact.replace("palos", "")
+        if without.isdigit() and 1 <= len(without) <= 5:
+            return True
+    if nospace.endswith("mm") and len(nospace) <= 10 and nospace[:-2].replace(".", "").replace(",", "").isdigit():
+        return True
+    if (nospace.endswith("m") or lower.endswith(" m")) and len(lower) <= 15:
+        num_part = nospace.rstrip("m").replace(".", "").replace(",", "")
+        if num_part.isdigit() and 1 <= len(num_part) <= 5:
+            return True
+    if compact.isdigit():
+        if len(compact) <= 5:
+            return True
+        if 6 <= len(compact) <= 10 and int(compact) >= 1_000_000:
+            return True
+    return False
+
+
+def _monto_en_plazo(lower: str) -> tuple[int, int] | None:
+    """'5m en 36', '8 millones en 24', '8000000 en 24' -> (pie en pesos, plazo)."""
+    if len(lower) > 50:
+        return None
+    m = _MONTO_EN_PLAZO.match(lower)
+    if not m:
+        return None
+    left = _MILLION_WORDS.sub("", m.group(1)).strip().replace(".", "").replace(",", "").replace(" ", "")
+    if left.endswith("m"):
+        left = left[:-1]
+    if not left.isdigit() or not 1 <= len(left) <= 10:
+        return None
+    n = int(left)
+    return (n if len(left) >= 6 else n * 1_000_000), int(m.group(2))
+
+
+def _plazo_only(lower: str) -> bool:
+    """'a 36', 'y a 24?', 'en 48': solo un plazo con conectores."""
+    if len(lower) > 35:
+        return False
+    clean = lower.replace("?", " ").replace(".", " ").replace("!", " ")
+    if not _PLAZO_NUMBERS.search(clean):
+        return False
+    return len(_PLAZO_FILLER.sub("", _PLAZO_NUMBERS.sub("", clean))) <= 2
+
+
+def _is_pie_percentage(lower: str) -> bool:
+    """'20%', '30 por ciento', '40% de pie'."""
+    if _PERCENT_EDGE.search(lower) or ("%" in lower and any(c.isdigit() for c in lower)):
+        return True
+    return "por ciento" in lower or "porciento" in lower
+
+
+def _is_greeting(text: str, lower: str) -> str | None:
+    """GREETING, SHORT_REPLY (ok, sí, gracias...) o None."""
+    if _GREETING_START.match(lower) or (len(lower) <= 25 and _GREETING_ANYWHERE.search(lower)):
+        return GREETING
+    if len(text) <= 20 and not any(c.isdigit() for c in text):
+        if len(_SHORT_TEXT_CHARS.findall(text)) >= len(text) * 0.8:
+            return SHORT_REPLY
+    return None
+
+
+def _rut(lower: str) -> str | None:
+    clean = lower.replace(".", "").replace(",", "").replace("-", "").replace(" ", "")
+    body = clean[:-1] if clean.endswith("k") else clean
+    if body.isdigit() and 7 <= len(body) <= 12:
+        return clean.upper()
+    return None
+
+
+def _is_lead_data(text: str, lower: str, rut: str | None) -> bool:
+    if len(text) > 120:
+        return False
+    if ("@" in text and "." in text) or rut:
+        return True
+    if len(lower) <= 80 and _FOLLOW_PHRASES.search(lower):
+        return True
+    words = text.split()
+    if 1 <= len(words) <= 6 and len(text) <= 60:
+        return len(_NAME_CHARS.findall(text)) >= 0.7 * len(text)
+    return False
+
+
+def classify(message: str) -> Intent:
+    """Intención y datos del mensaje. kind OTHER = ninguna forma conocida (pasa por off-topic)."""
+    text = message.strip()
+    if not text:
+        return Intent(OTHER)
+    lower = text.lower()
+    nospace = lower.replace(" ", "")
+    compact = nospace.replace(".", "").replace(",", "")
+
+    # Datos sueltos: se extraen siempre, sea cual sea la intención
+    email_match = _EMAIL.search(text)
+    email = email_match.group(0) if email_match else None
+    rut = _rut(lower) if len(text) <= 120 else None
+    pct = _PIE_PERCENT.search(lower)
+    pie_pct = int(pct.group(1)) if pct else None
+    monto_plazo = _monto_en_plazo(lower)
+    pie = monto_plazo[0] if monto_plazo else None
+    plazo_match = _PLAZO.search(lower)
+    plazo = monto_plazo[1] if monto_plazo else (int(plazo_match.group(1)) if plazo_match else None)
+    expresses_millions = len(lower) <= 80 and _expresses_millions(lower, nospace, compact)
+    millions = _millions_value(lower, compact) if expresses_millions else pie
+    terms_only = monto_plazo is not None or (plazo is not None and _plazo_only(lower)) or bool(_PERCENT_ONLY.match(lower))
+    fields = dict(
+        millions=millions, pie=pie, pie_pct=pie_pct, plazo=plazo, rut=rut, email=email, terms_only=terms_only
+    )
+
+    kind = _is_greeting(text, lower)
+    if kind:
+        return Intent(kind, **fields)
+    if len(lower) <= 80 and (expresses_millions or (compact.isdigit() and len(lower) <= 15)):
+        if monto_plazo is None:
+            return Intent(BUDGET, **fields)
+    if len(lower) <= 25:
+        option_word = _OPTION_WORD.search(lower)
+        short_pick = (lower.startswith("la ") or lower.startswith("el ")) and len(lower) <= 8 and any(c.isdigit() for c in lower)
+        if option_word or short_pick:
+            number = _FIRST_NUMBER.search(lower)
+            return Intent(OPTION, option=int(number.group(0)) if number else None, **fields)
+    if monto_plazo is None and _is_lead_data(text, lower, rut):
+        return Intent(LEAD_DATA, **fields)
+    if len(lower) <= 80 and (
+        monto_plazo is not None
+        or (len(lower) <= 40 and _is_pie_percentage(lower))
+        or _plazo_only(lower)
+        or _FINANCING_WORDS.search(lower)
+    ):
+        return Intent(FINANCING, **fields)
+    return Intent(OTHER, **fields)
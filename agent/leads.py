@@ -2,13 +2,12 @@
 from __future__ import annotations
 
 import sqlite3
-from pathlib import Path
 from typing import Any
 
+from db import ensure_schema
 
-def _conn(db_path: str) -> sqlite3.Connection:
-    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    c = sqlite3.connect(db_path)
+
+def _create_schema(c: sqlite3.Connection) -> None:
     c.execute("""
         CREATE TABLE IF NOT EXISTS leads (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,7 +21,15 @@ def _conn(db_path: str) -> sqlite3.Connection:
             created_at TEXT DEFAULT (datetime('now'))
         )
     """)
-    return c
+    # Migrar DBs antiguas sin columna notas
+    try:
+        c.execute("ALTER TABLE leads ADD COLUMN notas TEXT")
+    except sqlite3.OperationalError:
+        pass
+
+
+def _conn(db_path: str) -> sqlite3.Connection:
+    return ensure_schema(db_path, "leads", _create_schema)
 
 
 def register_lead(
@@ -42,10 +49,6 @@ def register_lead(
         return {"ok": False, "message": "Falta el nombre."}
     try:
         with _conn(path) as c:
-            try:
-                c.execute("ALTER TABLE leads ADD COLUMN notas TEXT")
-            except sqlite3.OperationalError:
-                pass
             c.execute(
                 """
                 INSERT INTO leads (nombre, rut, correo, patente_vehiculo_vpp, kilometraje_vehiculo_vpp, notas, thread_id)
@@ -1,11 +1,17 @@
-"""Detección de preguntas no relacionadas con automóviles."""
+"""Detección de preguntas no relacionadas con automóviles.
+
+Primero el clasificador local (agent.topic_model, microsegundos): si su probabilidad de "autos"
+cae fuera de la banda OFF_TOPIC_LOCAL_LOW..OFF_TOPIC_LOCAL_HIGH, decide él. Solo lo incierto
+va al LLM.
+"""
 from __future__ import annotations
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.output_parsers import StrOutputParser
 
-from config import OPENAI_API_KEY, OPENAI_MODEL
+from agent.topic_model import STATIC_LEXICON, get_model
+from config import OFF_TOPIC_LOCAL_HIGH, OFF_TOPIC_LOCAL_LOW, OPENAI_API_KEY, OPENAI_MODEL
 
 _PROMPT = """Eres un clasificador. Responde exactamente una palabra:
 - AUTOS: si la pregunta trata de automóviles, coches, vehículos, compra/venta de autos, stock, precios, marcas, modelos, características de autos.
@@ -13,16 +19,64 @@ _PROMPT = """Eres un clasificador. Responde exactamente una palabra:
 
 Responde solo: AUTOS o OTRO."""
 
+_chain = None
+# Decisiones por origen (local_autos, local_otro, llm), para /admin/stats
+_counts = {"local_autos": 0, "local_otro": 0, "llm": 0}
 
-def is_automotive_related(question: str) -> bool:
+
+def _get_chain():
+    global _chain
+    if _chain is None:
+        llm = ChatOpenAI(model=OPENAI_MODEL, api_key=OPENAI_API_KEY, temperature=0)
+        _chain = llm | StrOutputParser()
+    return _chain
+
+
+_merged_lexicon: tuple[frozenset[str], frozenset[str]] | None = None
+
+
+def _lexicon() -> frozenset[str]:
+    """STATIC_LEXICON + marcas/modelos del stock; la unión se rehace solo cuando cambia el stock."""
+    global _merged_lexicon
+    from agent.tools import stock_lexicon
+
+    try:
+        stock = stock_lexicon()
+    except Exception:
+        return STATIC_LEXICON
+    if _merged_lexicon is None or _merged_lexicon[0] is not stock:
+        _merged_lexicon = (stock, STATIC_LEXICON | stock)
+    return _merged_lexicon[1]
+
+
+def warm_up() -> None:
+    """Entrena el clasificador local y arma el léxico con el stock publicado. Al arrancar y tras cada
+    recarga del stock, así el primer mensaje no lo hace en el event loop (local_verdict corre ahí)."""
+    get_model()
+    _lexicon()
+
+
+def local_verdict(question: str) -> bool | None:
+    """True/False si el clasificador local está seguro (autos / otro tema); None si hay que preguntar al LLM."""
     if not question or not question.strip():
         return False
+    p = get_model().probability(question, _lexicon())
+    if p >= OFF_TOPIC_LOCAL_HIGH:
+        _counts["local_autos"] += 1
+        return True
+    if p <= OFF_TOPIC_LOCAL_LOW:
+        _counts["local_otro"] += 1
+        return False
+    return None
+
+
+def llm_is_automotive(question: str) -> bool:
+    """Clasificación con el LLM (bloqueante: desde async, en un thread)."""
     if not OPENAI_API_KEY:
         return True
+    _counts["llm"] += 1
     try:
-        llm = ChatOpenAI(model=OPENAI_MODEL, api_key=OPENAI_API_KEY, temperature=0)
-        chain = llm | StrOutputParser()
-        out = chain.invoke(
+        out = _get_chain().invoke(
             [
                 SystemMessage(content=_PROMPT),
                 HumanMessage(content=question.strip()),
@@ -31,3 +85,14 @@ def is_automotive_related(question: str) -> bool:
         return "AUTOS" in (out or "").upper()
     except Exception:
         return True
+
+
+def is_automotive_related(question: str) -> bool:
+    if not question or not question.strip():
+        return False
+    verdict = local_verdict(question)
+    return llm_is_automotive(question) if verdict is None else verdict
+
+
+def off_topic_stats() -> dict:
+    return dict(_counts)
@@ -1,16 +1,26 @@
-"""Orquestador: cache FAQ, off-topic e invocación del agente."""
+"""Orquestador: cache de respuestas, off-topic e invocación del agente."""
 from __future__ import annotations
 
-import re
+import asyncio
+from functools import partial
 from typing import AsyncGenerator
 
-from agent.off_topic import is_automotive_related
-from agent.faq_cache import FAQCache
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from agent.off_topic import llm_is_automotive, local_verdict
+from agent.faq_cache import CONTEXT, GLOBAL, FAQCache, context_digest, is_context_free, normalize_question
+from agent.singleflight import SingleFlight
+from agent.intent import Intent, classify as classify_intent
+from agent.fast_path import fast_reply, is_fast_candidate
 from agent.builder import build_agent
-from config import FAQ_CACHE_PATH
+from agent.tools import stock_generation
+from config import FAQ_CACHE_PATH, FAST_PATH, SPECULATIVE_AGENT
 
 _faq: FAQCache | None = None
 _agent = None
+# Turnos idénticos en curso (misma clave de cache, o mismo thread y mensaje) se calculan una vez
+_flights = SingleFlight()
 
 # Contador de off-topic por thread: tras 3 respuestas off-topic, cerramos con mensaje gentil
 _thread_off_topic_count: dict[str, int] = {}
@@ -19,6 +29,9 @@ _thread_off_topic_count: dict[str, int] = {}
 # No usamos mensaje genérico tipo "Soy un asesor, solo temas de autos" porque mata la conversación; todo lo ambiguo va al agente.
 OFF_TOPIC_GOODBYE = "Para no ocupar este espacio con temas que no puedo atender, te dejo por acá. Cuando necesites algo de autos usados, aquí estaré. ¡Que tengas un buen día!"
 
+# Un turno que llamó a estas herramientas tiene efectos: repetir su respuesta desde el cache se los saltaría
+_UNCACHEABLE_TOOLS = {"register_lead"}
+
 
 def _get_faq() -> FAQCache:
     global _faq
@@ -27,6 +40,22 @@ def _get_faq() -> FAQCache:
     return _faq
 
 
+def faq_cache_stats() -> dict:
+    """L1 (hits, misses, evictions), hits pendientes de escribir y filas expulsadas del cache FAQ."""
+    return _get_faq().stats()
+
+
+def flush_faq_cache() -> None:
+    """Escribe los hits pendientes del cache FAQ (al apagar el servidor)."""
+    if _faq is not None:
+        _faq.flush()
+
+
+def single_flight_stats() -> dict:
+    """Ejecuciones del agente, pedidos que esperaron una idéntica en curso y cuánto esperaron."""
+    return _flights.stats()
+
+
 def _get_agent():
     global _agent
     if _agent is None:
@@ -34,250 +63,126 @@ def _get_agent():
     return _agent
 
 
-def _extract_answer(messages) -> str:
-    answer = ""
-    for m in reversed(messages):
-        if hasattr(m, "content") and m.content:
-            c = m.content
-            if isinstance(c, str):
-                return c
-            if isinstance(c, list):
-                for part in c:
-                    if isinstance(part, dict) and part.get("type") == "text":
-                        return part.get("text", "")
-    return answer or "No pude generar una respuesta. ¿Puedes reformular?"
-
-
-def _expresses_millions(text: str) -> bool:
-    """Concepto: ¿el texto expresa un monto en millones (Chile)? 12mm, 12m, 12 palos, 12 millones, 12.000.000, etc."""
-    t = text.strip().lower()
-    if not t or len(t) > 80:
-        return False
-    # "12 millones", "20 millón", "15 millones de pesos"
-    if "millon" in t:
-        return True
-    # "12 palos", "15 palos" (coloquial Chile)
-    if "palos" in t:
-        clean = t.replace(".", "").replace(",", "").replace(" ", "")
-        # quitar "palos" y ver si queda número (1-5 dígitos = millones)
-        without = clean.replace("palos", "").strip()
-        if without.isdigit() and 1 <= len(without) <= 5:
-            return True
-    # "12mm", "12 mm", "12m", "12 m", "15m"
-    clean = t.replace(" ", "")
-    if clean.endswith("mm") and len(clean) <= 10:
-        if clean[:-2].replace(".", "").replace(",", "").isdigit():
-            return True
-    if (clean.endswith("m") or t.endswith(" m")) and len(t) <= 15:
-        num_part = clean.rstrip("m").replace(".", "").replace(",", "")
-        if num_part.isdigit() and 1 <= len(num_part) <= 5:
-            return True
-    # Solo número: "12", "15", "12000000", "12.000.000"
-    digits_only = t.replace(".", "").replace(",", "").replace(" ", "")
-    if digits_only.isdigit():
-        if len(digits_only) <= 5:  # 12 = 12 millones
-            return True
-        if 6 <= len(digits_only) <= 10 and int(digits_only) >= 1_000_000:
-            return True
-    return False
+def _message_text(m) -> str:
+    c = getattr(m, "content", None)
+    if isinstance(c, str):
+        return c
+    if isinstance(c, list):
+        for part in c:
+            if isinstance(part, dict) and part.get("type") == "text":
+                return part.get("text", "")
+    return ""
 
 
-def _looks_like_budget_or_short_reply(text: str) -> bool:
-    """Mensajes que expresan presupuesto (cualquier forma de millones: 12mm, 12m, 12 palos, 12 millones) o respuesta corta numérica → no off-topic."""
-    t = text.strip().lower()
-    if not t or len(t) > 80:
-        return False
-    if _expresses_millions(text):
-        return True
-    # Número corto sin contexto (ej. "12" como posible presupuesto)
-    if t.replace(".", "").replace(",", "").replace(" ", "").isdigit() and len(t) <= 15:
-        return True
-    return False
+_NO_ANSWER = "No pude generar una respuesta. ¿Puedes reformular?"
 
 
-def _looks_like_option_choice(text: str) -> bool:
-    """'opcion 5', 'opción 3', 'la 2' = eligiendo de una lista → no off-topic."""
-    t = text.strip().lower()
-    if not t or len(t) > 25:
-        return False
-    if "opcion" in t or "opción" in t or "opciòn" in t or "opciin" in t:
-        return True
-    if (t.startswith("la ") or t.startswith("el ")) and len(t) <= 8 and any(c.isdigit() for c in t):
-        return True
-    return False
+def _extract_answer(messages) -> str:
+    for m in reversed(messages):
+        text = _message_text(m)
+        if text:
+            return text
+    return _NO_ANSWER
 
 
-def _looks_like_greeting_or_very_short(text: str) -> bool:
-    """Saludos o mensajes muy cortos (hola, ok, sí, gracias) → no off-topic."""
-    t = text.strip()
-    if not t:
-        return False
-    lower = t.lower()
-    # Saludos explícitos
-    greetings = (
-        "hola", "buenas", "buenos días", "buen día", "buenas tardes", "buenas noches",
-        "hey", "hi", "hello", "qué tal", "tal", "saludos", "buenass", "ola",
-    )
-    if any(lower == g or lower.startswith(g + " ") or lower.startswith(g + ",") for g in greetings):
-        return True
-    if any(g in lower and len(lower) <= 25 for g in ("hola", "buenas", "buenos", "saludos", "qué tal")):
-        return True
-    # Mensajes muy cortos: el agente puede responder sin castigar (sí, no, ok, gracias, dale, etc.)
-    if len(t) <= 20 and not any(c.isdigit() for c in t):
-        letters_etc = sum(1 for c in t if c.isalpha() or c.isspace() or c in ".,!?¿¡'")
-        if letters_etc >= len(t) * 0.8:
-            return True
-    return False
+def _thread_messages(thread_id: str) -> list:
+    """Mensajes ya guardados en el checkpoint del thread (vacío si es nuevo)."""
+    state = _get_agent().get_state({"configurable": {"thread_id": thread_id}})
+    return list((state.values or {}).get("messages") or []) if state else []
 
 
-def _looks_like_lead_data_or_follow_up(text: str) -> bool:
-    """Nombre, RUT, correo o frases tipo 'listo te envié mis datos' → no off-topic (es respuesta al agente)."""
-    t = text.strip()
-    if not t or len(t) > 120:
-        return False
-    lower = t.lower()
-    # Correo electrónico
-    if "@" in t and "." in t:
-        return True
-    # RUT: dígitos, opcionalmente con . - y k
-    clean = t.replace(".", "").replace(",", "").replace("-", "").replace(" ", "").lower()
-    if clean.endswith("k"):
-        clean = clean[:-1]
-    if clean.isdigit() and 7 <= len(clean) <= 12:
-        return True
-    # Frases cortas de seguimiento / envío de datos
-    follow_phrases = (
-        "listo", "te envi", "mi nombre", "mi correo", "mi rut", "ahí está", "envié", "enviado",
-        "datos", "nombre es", "correo es", "rut es", "te pas", "aquí está", "es ", "soy ",
-    )
-    if len(lower) <= 80 and any(p in lower for p in follow_phrases):
-        return True
-    # Posible nombre: una o más palabras, mayormente letras
-    words = t.split()
-    if 1 <= len(words) <= 6 and len(t) <= 60:
-        letters = sum(1 for c in t if c.isalpha() or c.isspace() or c in ".-'")
-        if letters >= 0.7 * len(t):
-            return True
-    return False
+def _conversation(messages) -> list[tuple[str, str]]:
+    """(rol, texto) de lo que se dijeron usuario y agente; sin llamadas ni resultados de herramientas."""
+    turns = []
+    for m in messages:
+        if getattr(m, "type", None) in ("human", "ai"):
+            text = _message_text(m)
+            if text:
+                turns.append((m.type, text))
+    return turns
 
 
-def _looks_like_monto_mas_plazo(text: str) -> bool:
-    """Concepto: 'X en 24/36/48' donde X es un monto (pie). Ej: '5m en 36', '8 millones en 24', '12 palos en 48', '8000000 en 24'."""
-    t = text.strip().lower()
-    if " en " not in t or len(t) > 50:
-        return False
-    parts = t.split(" en ", 1)
-    if len(parts) != 2 or parts[1].strip() not in ("24", "36", "48"):
-        return False
-    left = parts[0].strip().lower()
-    left = left.replace("millones", "").replace("millón", "").replace("millon", "").replace("palos", "").strip()
-    left_clean = left.replace(".", "").replace(",", "").replace(" ", "")
-    if left_clean.endswith("m"):
-        left_clean = left_clean[:-1]
-    if not left_clean.isdigit():
-        return False
-    return 1 <= len(left_clean) <= 10
+def _faq_lookup(user_message: str, context: str) -> tuple[int, str | None]:
+    """(generación del stock, respuesta en cache o None). Lee SQLite: va en el executor."""
+    generation = stock_generation()
+    return generation, _get_faq().get(user_message, context=context, stock_generation=generation)
 
 
-def _looks_like_plazo_only(text: str) -> bool:
-    """Frases cortas que solo preguntan por plazo: 'a 36', 'a 48', 'y a 24?', 'en 36 cuotas?' → no off-topic."""
-    t = text.strip().lower()
-    if not t or len(t) > 35:
-        return False
-    # Solo números de plazo con contexto mínimo: "a 36", "a 48", "y a 24?", "en 36", "en 48 cuotas?"
-    clean = t.replace("?", " ").replace(".", " ").replace("!", " ")
-    if "24" in clean or "36" in clean or "48" in clean:
-        rest = clean.replace("24", "").replace("36", "").replace("48", "")
-        rest = rest.replace("a", "").replace("en", "").replace("cuotas", "").replace("cuota", "").replace("y", "").replace(" ", "")
-        if len(rest) <= 2:  # casi solo conectores
-            return True
-    return False
+def _faq_store(user_message: str, answer: str, scope: str, context: str, generation: int | None) -> None:
+    _get_faq().set(user_message, answer, scope=scope, context=context, stock_generation=generation)
 
 
-def _looks_like_pie_percentage(text: str) -> bool:
-    """Respuesta en porcentaje de pie: '20%', '30 por ciento', '40% de pie' → no off-topic."""
-    t = text.strip().lower()
-    if not t or len(t) > 40:
-        return False
-    # "20%", "30 %", "40%"
-    if re.search(r"^\s*\d{1,3}\s*%", t) or re.search(r"\d{1,3}\s*%\s*$", t):
-        return True
-    if "%" in t and any(c.isdigit() for c in t):
-        return True
-    if "por ciento" in t or "porciento" in t:
-        return True
-    return False
+def _record_cached_turn(thread_id: str, user_message: str, answer: str) -> None:
+    """Agrega al checkpoint el turno respondido desde cache, para que la historia siga completa."""
+    _get_agent().update_state(
+        {"configurable": {"thread_id": thread_id}},
+        {"messages": [HumanMessage(content=user_message), AIMessage(content=answer)]},
+        as_node="agent",
+    )
 
 
-def _looks_like_financing_follow_up(text: str) -> bool:
-    """Cualquier seguimiento de financiamiento: palabras clave, plazo solo, porcentaje de pie, o patrón monto + en + plazo."""
-    t = text.strip().lower()
-    if not t or len(t) > 80:
-        return False
-    if _looks_like_pie_percentage(text):
-        return True
-    if _looks_like_plazo_only(text):
-        return True
-    financing_words = (
-        "cuota", "cara", "barata", "alta", "baja", "financiar", "financiamiento",
-        "pie", "plazo", "plazos", "mensual", "pagando", "pagar ",
+def _speculative_turn(thread_id: str, user_message: str, prior: list) -> list:
+    """Corre el turno sobre una copia del thread (checkpointer en memoria) y devuelve sus mensajes
+    sin tocar el checkpoint real; _commit_turn los escribe después.
+
+    Lo único que se descarta si el clasificador despide al cliente es la escritura en el checkpoint:
+    los efectos de las herramientas ya ejecutadas (ej. un lead guardado por register_lead) no se
+    deshacen, y el hilo del executor termina el turno aunque ya nadie lo espere.
+    """
+    scratch = _get_agent().copy(update={"checkpointer": MemorySaver()})
+    config = {"configurable": {"thread_id": thread_id}}
+    if prior:
+        scratch.update_state(config, {"messages": prior}, as_node="agent")
+    result = scratch.invoke({"messages": [HumanMessage(content=user_message)]}, config=config)
+    return (result.get("messages") or [])[len(prior):]
+
+
+def _commit_turn(thread_id: str, turn_messages: list) -> None:
+    """Escribe en el checkpoint del thread los mensajes de un turno especulativo (una sola escritura)."""
+    _get_agent().update_state(
+        {"configurable": {"thread_id": thread_id}},
+        {"messages": turn_messages},
+        as_node="agent",
     )
-    if any(w in t for w in financing_words):
-        return True
-    # Cualquier "X en 24/36/48" donde X parezca monto (pie)
-    if _looks_like_monto_mas_plazo(text):
-        return True
-    return False
 
 
-def _looks_like_financing_fragment(text: str) -> bool:
-    """Parece un fragmento de financiamiento (monto en millones, números, 'en 36') → aclaración en vez de genérico."""
-    t = text.strip().lower()
-    if not t or len(t) > 50:
+def _fast_turn(thread_id: str, intent: Intent, user_message: str) -> tuple[str | None, list]:
+    """Si el turno tiene forma fija (agent.fast_path), lo responde sin LLM y lo escribe en el
+    checkpoint. (respuesta o None, mensajes previos del thread)."""
+    prior = _thread_messages(thread_id)
+    reply = fast_reply(intent, user_message, prior)
+    if reply is None:
+        return None, prior
+    _commit_turn(thread_id, reply.messages)
+    return reply.answer, prior
+
+
+def _off_topic_goodbye(thread_id: str, related: bool) -> bool:
+    """Lleva la cuenta de off-topic seguidos del thread; True si toca despedirse (3ª vez)."""
+    if related:
+        _thread_off_topic_count[thread_id] = 0
         return False
-    if " en " in t and any(p in t for p in ("24", "36", "48")):
-        return True
-    # Cualquier forma de expresar millones (12m, 12 palos, 12 millones, 12mm)
-    if _expresses_millions(text):
-        return True
-    # Solo números que podrían ser pie o cuota (ej. 5000000, 300000)
-    clean = t.replace(".", "").replace(",", "").replace(" ", "").replace("m", "")
-    if clean.isdigit() and 5 <= len(clean) <= 10:
+    count = _thread_off_topic_count.get(thread_id, 0) + 1
+    _thread_off_topic_count[thread_id] = count
+    if count >= 3:
+        _thread_off_topic_count[thread_id] = 0
         return True
+    # 1ª o 2ª vez: no matar la conversación; enviar al agente para que entienda o pida aclaración.
     return False
 
 
-def _off_topic_clarification(user_message: str) -> str | None:
-    """Si el mensaje parece pie+plazo (ej. '5m en 36', '8 millones en 24'), devuelve aclaración con esos números."""
-    t = user_message.strip().lower()
-    if " en " in t:
-        parts = t.split(" en ", 1)
-        if len(parts) == 2:
-            plazo = parts[1].strip()
-            if plazo in ("24", "36", "48"):
-                left = parts[0].strip()
-                # "8 millones", "10 palos", "5m" → extraer número
-                left_norm = left.replace("millones", "").replace("millón", "").replace("millon", "").replace("palos", "").strip()
-                num_part = left_norm.replace(".", "").replace(",", "").replace(" ", "").lower()
-                if num_part.endswith("m"):
-                    num_part = num_part[:-1]
-                if num_part.isdigit():
-                    n = int(num_part)
-                    # 6+ dígitos = monto en pesos (ej. 8000000 → 8 millones)
-                    if len(num_part) >= 6 and n >= 1_000_000:
-                        mill = int(n / 1_000_000)
-                        return f"¿Te refieres a {mill} millones de pie en {plazo} cuotas?"
-                    # 1-5 dígitos = millones (8, 10, 5m, 8 millones)
-                    if 1 <= n <= 99999:
-                        return f"¿Te refieres a {n} millones de pie en {plazo} cuotas?"
-    # Solo número grande (posible pie)
-    clean = t.replace(".", "").replace(",", "").replace(" ", "")
-    if clean.isdigit() and 6 <= len(clean) <= 10:
-        val = int(clean)
-        if val >= 1_000_000:
-            mill = val / 1_000_000
-            return f"¿Te refieres a {int(mill)} millones de pie?"
-    return None
+def _cache_scope(user_message: str, history: list, turn_messages: list) -> str | None:
+    """Alcance con que se guarda la respuesta del turno: GLOBAL, CONTEXT o None (no se guarda).
+
+    Global solo si la pregunta no tiene contexto, no se usaron herramientas y el thread estaba vacío
+    (la respuesta no puede venir personalizada con algo dicho antes).
+    """
+    tools = {tc["name"] for m in turn_messages for tc in (getattr(m, "tool_calls", None) or [])}
+    if tools & _UNCACHEABLE_TOOLS:
+        return None
+    if not tools and not history and is_context_free(user_message):
+        return GLOBAL
+    return CONTEXT
 
 
 async def chat(
@@ -292,48 +197,120 @@ async def chat(
         return
 
     # No marcar como off-topic: saludos, presupuesto, opción, datos de lead, seguimiento financiamiento, o mensajes muy cortos
-    skip_off_topic = (
-        _looks_like_greeting_or_very_short(user_message)
-        or _looks_like_budget_or_short_reply(user_message)
-        or _looks_like_option_choice(user_message)
-        or _looks_like_lead_data_or_follow_up(user_message)
-        or _looks_like_financing_follow_up(user_message)
-    )
+    intent = classify_intent(user_message)
+    skip_off_topic = intent.skip_off_topic
     # Off-topic = claramente no tiene que ver con autos. Si no entendemos (ej. "20%"), NO es off-topic: va al agente para que aclare.
-    if check_off_topic and not skip_off_topic and not is_automotive_related(user_message):
-        global _thread_off_topic_count
-        count = _thread_off_topic_count.get(thread_id, 0) + 1
-        _thread_off_topic_count[thread_id] = count
-        if count >= 3:
-            _thread_off_topic_count[thread_id] = 0
-            yield OFF_TOPIC_GOODBYE
-            return
-        # 1ª o 2ª vez: no matar la conversación; enviar al agente para que entienda o pida aclaración.
-    else:
-        _thread_off_topic_count[thread_id] = 0
-
-    if use_faq_cache:
-        cached = _get_faq().get(user_message)
-        if cached:
-            yield cached
-            return
+    # Clasificador local primero; el LLM solo si queda en la banda incierta, y en un thread (no bloquea el event loop).
+    # En modo especulativo esa consulta corre en paralelo con el turno del agente (ver más abajo)
+    related: bool | None = True
+    verdict_task: asyncio.Task | None = None
+    if check_off_topic and not skip_off_topic:
+        related = local_verdict(user_message)
+        if related is None:
+            if SPECULATIVE_AGENT:
+                verdict_task = asyncio.create_task(asyncio.to_thread(llm_is_automotive, user_message))
+            else:
+                related = await asyncio.to_thread(llm_is_automotive, user_message)
+    if verdict_task is None and _off_topic_goodbye(thread_id, related):
+        yield OFF_TOPIC_GOODBYE
+        return
 
+    # Checkpointer SQLite (sync) en el executor para no bloquear el event loop
+    loop = asyncio.get_event_loop()
     agent = _get_agent()
     config = {"configurable": {"thread_id": thread_id}}
     inputs = {"messages": [{"role": "user", "content": user_message}]}
-
+    # Especulativo: el turno corre sobre una copia del thread y se escribe en el checkpoint
+    # solo si el clasificador no termina la conversación
+    speculative = verdict_task is not None
+
+    prior: list = []
+    history: list[tuple[str, str]] = []
+    context, generation = "", None
+    answer: str | None = None
+    commit = None
+    turn_task: asyncio.Future | None = None
     try:
-        import asyncio
-        # Ejecutar en executor para usar checkpointer SQLite (sync) sin bloquear el event loop
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            None,
-            lambda: agent.invoke(inputs, config=config),
-        )
-        messages = result.get("messages") or []
-        answer = _extract_answer(messages)
+        if FAST_PATH and is_fast_candidate(intent):
+            # Saludo, "gracias", "a 48?"...: plantilla o recálculo de cuotas, sin pasar por el agente
+            fast_answer, prior = await loop.run_in_executor(None, _fast_turn, thread_id, intent, user_message)
+            if fast_answer is not None:
+                yield fast_answer
+                return
+        elif use_faq_cache or speculative:
+            prior = await loop.run_in_executor(None, _thread_messages, thread_id)
+        if use_faq_cache:
+            # La clave lleva la conversación previa y la generación del stock (ver agent.faq_cache)
+            history = _conversation(prior)
+            context = context_digest(history)
+            generation, answer = await loop.run_in_executor(None, _faq_lookup, user_message, context)
+            if answer:
+                commit = partial(_record_cached_turn, thread_id, user_message, answer)
+
+        async def run_turn() -> tuple[str, str | None, str, list | None]:
+            """(respuesta, alcance con que quedó en cache o None, thread que la generó, mensajes del
+            turno si falta escribirlos en el checkpoint)."""
+            if speculative:
+                messages = await loop.run_in_executor(None, _speculative_turn, thread_id, user_message, prior)
+                turn = messages
+            else:
+                result = await loop.run_in_executor(
+                    None,
+                    lambda: agent.invoke(inputs, config=config),
+                )
+                messages = (result.get("messages") or [])[len(prior):]
+                turn = None
+            answer = _extract_answer(messages)
+            scope = None
+            if use_faq_cache and answer != _NO_ANSWER and len(answer) < 2000:
+                scope = _cache_scope(user_message, history, messages)
+                if scope is not None:
+                    await loop.run_in_executor(None, _faq_store, user_message, answer, scope, context, generation)
+            return answer, scope, thread_id, turn
+
+        async def produce() -> tuple[str, partial | None]:
+            """(respuesta, escritura pendiente en el checkpoint) del turno por el agente."""
+            # Con cache, la clave del turno es la del cache: mismo mensaje, misma historia y mismo stock
+            # (ej. el mismo saludo en muchos threads nuevos a la vez). Sin cache, solo reintentos del mismo thread
+            if use_faq_cache:
+                key = ("cache", normalize_question(user_message), context, generation)
+            else:
+                key = ("thread", thread_id, user_message)
+            (answer, scope, source_thread, turn), shared = await _flights.do(key, run_turn)
+            if not shared:
+                return answer, partial(_commit_turn, thread_id, turn) if turn is not None else None
+            if source_thread == thread_id:
+                return answer, None
+            # Respuesta calculada para otro thread: se agrega a esta historia como un acierto de cache,
+            # salvo que no sea cacheable (ej. registró un lead allá), y entonces este turno corre aparte
+            if scope is not None:
+                return answer, partial(_record_cached_turn, thread_id, user_message, answer)
+            answer, _, _, turn = await run_turn()
+            return answer, partial(_commit_turn, thread_id, turn) if turn is not None else None
+
+        goodbye: bool | None = None
+        if not answer:
+            turn_task = asyncio.ensure_future(produce())
+            if verdict_task is not None:
+                # Lo que llegue primero: si el clasificador despide al cliente no se espera el turno
+                await asyncio.wait((verdict_task, turn_task), return_when=asyncio.FIRST_COMPLETED)
+                if verdict_task.done():
+                    goodbye = _off_topic_goodbye(thread_id, verdict_task.result())
+            if not goodbye:
+                answer, commit = await turn_task
+        if verdict_task is not None and goodbye is None:
+            goodbye = _off_topic_goodbye(thread_id, await verdict_task)
+        if goodbye:
+            # El turno especulativo se descarta: nunca llega al checkpoint
+            yield OFF_TOPIC_GOODBYE
+            return
+        if commit is not None:
+            await loop.run_in_executor(None, commit)
         yield answer
-        if use_faq_cache and answer and len(answer) < 2000:
-            _get_faq().set(user_message, answer)
     except Exception as e:
         yield f"Disculpa, hubo un error: {e}"
+    finally:
+        # Turno abandonado por la despedida, error o cliente desconectado: no queda nada esperando
+        for task in (verdict_task, turn_task):
+            if task is not None and not task.done():
+                task.cancel()
@@ -0,0 +1,88 @@
+"""Formato de la salida de las herramientas: modo normal o compacto y tope de tokens por llamada.
+
+Todo lo que devuelve una herramienta queda en el historial (checkpointer) y se reenvía al LLM en
+cada turno siguiente, así que cada carácter se paga muchas veces. Con TOOL_OUTPUT_MODE=compact los
+vehículos van en una línea con códigos cortos de campo, los montos en M/k y el link se reduce a la
+patente (COMPACT_LEGEND, que va en el prompt, explica cómo leerlos). En cualquier modo una salida
+que pase TOOL_OUTPUT_MAX_TOKENS se corta por ítems completos y termina en "N más".
+"""
+from __future__ import annotations
+
+from config import TOOL_OUTPUT_MAX_TOKENS, TOOL_OUTPUT_MODE
+
+COMPACT = TOOL_OUTPUT_MODE == "compact"
+
+# Base de los links de fichas; en modo compacto el link es "#" + lo que sigue a esta base
+LINK_BASE = "www.pompeyo.cl/usados/"
+
+# Estimación conservadora para español con montos (el tokenizer real da ~3,5-4 caracteres por token)
+_CHARS_PER_TOKEN = 3
+
+COMPACT_LEGEND = """
+
+SALIDA COMPACTA DE HERRAMIENTAS: "N. MARCA MODELO AÑO PRECIO KM v:versión s:sucursal c:cuota/plazo pie:monto #PATENTE". 14.98M = $14.980.000 y 318k = $318.000 (al cliente, montos completos). #PATENTE es el link https://www.pompeyo.cl/usados/PATENTE: muéstralo completo, en su propia línea. "+N más" = ítems omitidos por tamaño."""
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+def pick(verbose: str, compact: str) -> str:
+    """El texto que corresponde al modo de salida configurado."""
+    return compact if COMPACT else verbose
+
+
+def money(value: float | None) -> str:
+    """Monto en pesos: $14,980,000 (normal) o 14.98M / 318k (compacto, exacto a la milésima)."""
+    if value is None:
+        return "N/A"
+    if not COMPACT or value % 1000:
+        return f"${value:,.0f}"
+    if abs(value) >= 1_000_000:
+        return f"{value / 1_000_000:.3f}".rstrip("0").rstrip(".") + "M"
+    return f"{value / 1000:.0f}k"
+
+
+def short_link(link: str) -> str:
+    """Link de ficha completo (normal) o #PATENTE (compacto); links con otra base quedan completos."""
+    link = link.strip()
+    if not link:
+        return ""
+    bare = link.split("://", 1)[-1]
+    if COMPACT and bare.startswith(LINK_BASE) and "/" not in bare[len(LINK_BASE):].strip("/"):
+        return "#" + bare[len(LINK_BASE):].strip("/")
+    return link if link.startswith("http") else f"https://{link}"
+
+
+def fitting(blocks: list[list[str]], reserved_tokens: int = 0, max_tokens: int | None = None) -> int:
+    """Cuántos bloques (un ítem = sus líneas) caben completos además de `reserved_tokens` (encabezado, pie).
+
+    Siempre cabe al menos uno: una salida sin ningún ítem no le sirve al agente.
+    """
+    budget = TOOL_OUTPUT_MAX_TOKENS if max_tokens is None else max_tokens
+    if budget <= 0:
+        return len(blocks)
+    # Reserva para el marcador "+N más"
+    used = reserved_tokens + 4
+    for n, block in enumerate(blocks):
+        used += estimate_tokens("\n".join(block)) + 1
+        if used > budget and n > 0:
+            return n
+    return len(blocks)
+
+
+def more_marker(omitted: int) -> str:
+    return pick(f"(y {omitted} más, omitidos por tamaño)", f"+{omitted} más")
+
+
+def render(header: str, blocks: list[list[str]], footer: str = "") -> str:
+    """header + bloques que quepan en el tope + "N más" si se cortó + footer."""
+    n = fitting(blocks, estimate_tokens(header) + estimate_tokens(footer))
+    lines = [header] if header else []
+    for block in blocks[:n]:
+        lines.extend(block)
+    if n < len(blocks):
+        lines.append(more_marker(len(blocks) - n))
+    if footer:
+        lines.append(footer)
+    return "\n".join(lines)
@@ -0,0 +1,54 @@
+"""Single-flight: pedidos idénticos simultáneos comparten una sola ejecución.
+
+El primero que llega con una clave lanza el cálculo como tarea propia (no atada a su request:
+si ese cliente se desconecta, los demás igual reciben el resultado); los que llegan mientras
+está en curso esperan esa misma tarea. Al terminar la clave se libera, así que un pedido
+posterior vuelve a calcular (o, en el chat, encuentra la respuesta en el cache).
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.flights = 0
+        self.followers = 0
+        self._follower_wait = 0.0
+        self._follower_wait_max = 0.0
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """(resultado, compartido): compartido=True si se esperó la ejecución de otro pedido."""
+        task = self._inflight.get(key)
+        if task is None:
+            self.flights += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            return await asyncio.shield(task), False
+        self.followers += 1
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.shield(task), True
+        finally:
+            waited = time.perf_counter() - t0
+            self._follower_wait += waited
+            self._follower_wait_max = max(self._follower_wait_max, waited)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        # Si nadie quedó esperando (clientes desconectados), que el error no quede como "never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "flights": self.flights,
+            "followers": self.followers,
+            "follower_wait_avg_ms": round(self._follower_wait / self.followers * 1000, 1) if self.followers else 0.0,
+            "follower_wait_max_ms": round(self._follower_wait_max * 1000, 1),
+        }
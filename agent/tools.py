@@ -1,22 +1,38 @@
 """Herramientas del agente: consulta de stock, cálculo de cuota y registro de leads."""
 from __future__ import annotations
 
+import base64
+import json
 import math
 from typing import Optional
 
+import numpy as np
 from langchain_core.tools import tool
 
 from config import (
     STOCK_DB_PATH,
+    STOCK_SEARCH_CACHE_SIZE,
+    STOCK_SEARCH_CACHE_TTL,
     FINANCIAMIENTO_TASA_MENSUAL,
     FINANCIAMIENTO_PIE_MIN,
     FINANCIAMIENTO_PIE_MAX,
     FINANCIAMIENTO_PLAZOS,
 )
+from stock.cache import SearchCache, canonical_search
+from stock.facets import FACETS
+from stock.financing import cuota_matrix, factor_cuota
+from stock.fulltext import fts_query
+from stock.normalize import fold
+from stock.relax import relax_search
 from stock.repository import StockRepository
+from stock.vehicle import Vehicle
 from agent import leads as leads_module
+from agent.output import COMPACT, estimate_tokens, fitting, money, more_marker, pick, render, short_link
 
 _repo: StockRepository | None = None
+# Lo que ocupa la línea del cursor de search_stock, reservado dentro del tope de tokens
+_CURSOR_TOKENS = 70
+_search_cache = SearchCache(maxsize=STOCK_SEARCH_CACHE_SIZE, ttl=STOCK_SEARCH_CACHE_TTL)
 
 
 def _get_repo() -> StockRepository:
@@ -27,6 +43,152 @@ def _get_repo() -> StockRepository:
     return _repo
 
 
+def set_repo(repo: StockRepository) -> None:
+    """Instala el repositorio que usan las herramientas (ej. uno cargado desde snapshot al arrancar)."""
+    global _repo
+    _repo = repo
+
+
+def _cached_search(repo: StockRepository, **params) -> list[Vehicle]:
+    """repo.search con cache; la clave lleva la versión del stock que sirve el repositorio."""
+    kwargs, key = canonical_search(**params)
+    key = (repo.db_path, repo.stock_version()) + key
+    results = _search_cache.get(key)
+    if results is None:
+        results = repo.search(**kwargs)
+        _search_cache.put(key, results)
+    return results
+
+
+def _encode_cursor(state: dict) -> str:
+    """Estado de la página siguiente -> token opaco (base64url de JSON compacto)."""
+    raw = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+# Filtros que puede traer un cursor (los parámetros de search_stock) y su tipo
+_CURSOR_FIELDS: dict[str, type] = {
+    "precio_min": float, "precio_max": float, "año_min": int, "año_max": int, "km_max": float,
+    "marca": str, "modelo": str, "segmento": str, "transmision": str, "combustible": str,
+    "exclude_marca": str, "exclude_modelo": str, "exclude_combustible": str, "texto": str,
+    "cuota_max": float, "pie": float, "plazo": int, "limit": int, "order_by_precio": str,
+}
+
+
+def _cursor_value(kind: type, value) -> float | int | str:
+    """Valor de un cursor con el tipo esperado; TypeError / ValueError si no lo es (ej. un cursor editado)."""
+    if kind is str:
+        if not isinstance(value, str):
+            raise TypeError(value)
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise TypeError(value)
+    if kind is int:
+        if value != int(value):
+            raise ValueError(value)
+        return int(value)
+    return float(value)
+
+
+def _decode_cursor(token: str) -> dict:
+    """Token de _encode_cursor -> {"q": filtros, "n": numeración, "o": offset, "a": (precio, id) o ausente}.
+
+    Solo acepta los filtros de search_stock con su tipo y una posición válida; cualquier otra cosa
+    (cursor truncado o editado) es ValueError("cursor inválido").
+    """
+    try:
+        token = token.strip()
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        state = json.loads(raw.decode("utf-8"))
+        if not isinstance(state, dict) or not isinstance(state.get("q"), dict):
+            raise ValueError(state)
+        decoded = {
+            "q": {k: _cursor_value(_CURSOR_FIELDS[k], v) for k, v in state["q"].items()},
+            "n": _cursor_value(int, state.get("n", 0)),
+            "o": _cursor_value(int, state.get("o", 0)),
+        }
+        if decoded["n"] < 0 or decoded["o"] < 0:
+            raise ValueError(state)
+        if "a" in state:
+            if not isinstance(state["a"], list) or len(state["a"]) != 2:
+                raise ValueError(state)
+            precio, row_id = state["a"]
+            decoded["a"] = (None if precio is None else _cursor_value(float, precio), _cursor_value(int, row_id))
+    except (KeyError, TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("cursor inválido") from e
+    return decoded
+
+
+def stock_generation() -> int:
+    """Generación (digest del contenido) del stock que están sirviendo las herramientas."""
+    return _get_repo().stock_generation()
+
+
+def stock_lexicon() -> frozenset[str]:
+    """Marcas y modelos del stock que se está sirviendo (para el clasificador de off-topic)."""
+    return _get_repo().lexicon()
+
+
+def vehicles_by_refs(refs: list[str]) -> list[Vehicle | None]:
+    """Vehículos del stock por patente o link (para recalcular cuotas de una lista ya mostrada)."""
+    return _get_repo().get_by_refs(refs, columns=("id_externo", "marca", "modelo", "año", "link"))
+
+
+def search_cache_stats() -> dict:
+    """Hits, misses y evictions del cache de search_stock (para dimensionar STOCK_SEARCH_CACHE_SIZE)."""
+    return _search_cache.stats()
+
+
+def _format_vehicle_compact(i: int, v: Vehicle) -> list[str]:
+    """Una sola línea con códigos cortos (ver output.COMPACT_LEGEND)."""
+    modelo_m = v.modelo or ""
+    parts = [f"{i}. {v.marca or 'N/A'} {modelo_m or 'N/A'} {v.año or 'N/A'} {money(v.precio)}"]
+    km = v.kilometraje
+    parts.append(f"{km:.0f}km" if km is not None else "km N/A")
+    version_val = (v.version or "").strip()
+    # La versión suele repetir el modelo ("208 1.2 ALLURE..."): solo lo que agrega
+    if modelo_m and fold(version_val).startswith(fold(modelo_m) + " "):
+        version_val = version_val[len(modelo_m):].strip()
+    if version_val:
+        parts.append(f"v:{version_val}")
+    if v.sucursal:
+        parts.append(f"s:{v.sucursal}")
+    if v.cuota is not None:
+        parts.append(f"c:{money(v.cuota)}/{v.plazo} pie:{money(v.pie_usado)}")
+    link = short_link(v.link or "")
+    if link.startswith("#"):
+        return [" ".join(parts + [link])]
+    return [" ".join(parts), link] if link else [" ".join(parts)]
+
+
+def _format_vehicle(i: int, v: Vehicle) -> list[str]:
+    """Línea numerada de un vehículo (más su link, si tiene) como la muestran las herramientas de stock."""
+    if COMPACT:
+        return _format_vehicle_compact(i, v)
+    marca_m = v.marca or "N/A"
+    modelo_m = v.modelo or "N/A"
+    version_val = (v.version or "").strip()
+    # Versión siempre visible: evita que el agente la omita o ponga N/A
+    version_s = f" | Versión: {version_val}" if version_val else ""
+    año = v.año or "N/A"
+    precio = v.precio
+    precio_s = f"${precio:,.0f}" if precio is not None else "N/A"
+    km = v.kilometraje
+    km_s = f"{km:,.0f} km" if km is not None else "N/A"
+    ubicacion = ""
+    if v.sucursal or v.comuna:
+        ubicacion = f" | Ubicación: {v.sucursal or ''} ({v.comuna or ''})".strip().rstrip("()")
+    link_raw = (v.link or "").strip()
+    if link_raw and not link_raw.startswith("http"):
+        link_raw = f"https://{link_raw}"
+    # Línea principal: Marca Modelo (Año) - Precio - Km [+ Versión: ...] [+ Ubicación]
+    cuota_s = ""
+    if v.cuota is not None:
+        cuota_s = f" | Cuota: ${v.cuota:,.0f}/mes a {v.plazo} meses (pie ${v.pie_usado:,.0f})"
+    linea = f"{i}. {marca_m} {modelo_m} ({año}) - {precio_s} - {km_s}{version_s}{ubicacion}{cuota_s}"
+    return [linea, link_raw] if link_raw else [linea]
+
+
 @tool
 def search_stock(
     precio_min: Optional[float] = None,
@@ -42,65 +204,129 @@ def search_stock(
     exclude_marca: Optional[str] = None,
     exclude_modelo: Optional[str] = None,
     exclude_combustible: Optional[str] = None,
+    texto: Optional[str] = None,
+    cuota_max: Optional[float] = None,
+    pie: Optional[float] = None,
+    plazo: Optional[int] = None,
     limit: int = 5,
     order_by_precio: str = "asc",
+    cursor: Optional[str] = None,
 ) -> str:
     """Busca vehículos usados en el stock real. precio_min y precio_max en PESOS (ej. 20000000). order_by_precio: "asc" o "desc". Para presupuesto (hasta 20/30/40M) usa order_by_precio=desc.
     Filtros por tipo de vehículo (usar cuando el cliente pida):
     - segmento: CityCar, Suv, Sedan, Camioneta, Furgon. Pickup o camioneta -> segmento="Camioneta" (NO Furgon; Furgon = van tipo Berlingo/Partner).
     - transmision: Automatico (AT, DCT, automático) o Mecanico (MT, mecánico)
     - combustible: Diesel, Gasolina, Hibrido, Electrico (ej. "diesel", "híbrido" -> combustible)
+    - texto: versión o equipamiento en palabras del cliente (ej. "1.2 puretech", "4x4", "allure pack", "awd"). Busca en marca, modelo y versión y ordena por relevancia; combínalo con precio, segmento, etc. Úsalo en UNA sola búsqueda en vez de varias búsquedas amplias para encontrar una versión.
     Excluir: "que no sea Nissan" -> exclude_marca="Nissan". "que no sea Navara" -> exclude_modelo="Navara". "no quiero eléctrico" / "no me gustan los eléctricos" -> exclude_combustible="Electrico". "no diesel" -> exclude_combustible="Diesel". Mantén el resto de filtros (segmento, combustible si lo pide, etc.).
-    IMPORTANTE: Solo puedes mostrar vehículos y links que devuelva esta herramienta; NUNCA inventes. Si devuelve vacío: no cierres con 'no hay'; aclara pie vs presupuesto, ofrece los más económicos (misma búsqueda con precio_max más alto o sin tope, order_by_precio=asc) o si piden un modelo que no está, ofrece alternativas del mismo tipo."""
+    Financiamiento en UNA llamada: "tengo 5 millones de pie y puedo pagar 300 mil al mes" -> pie=5000000, cuota_max=300000, order_by_precio="desc" (plazo=36 por defecto; 48 si la cuota le parece alta). Devuelve solo autos cuya cuota real cabe, con la cuota ya calculada en cada uno; no hace falta estimate_precio_max_for_cuota ni calculate_cuota. Con solo pie (sin cuota_max) también muestra la cuota de cada auto.
+    cursor: si el cliente pide ver más opciones de la misma búsqueda, pasa SOLO cursor="..." con el token que devolvió la búsqueda anterior (trae los mismos filtros y sigue desde donde quedó, sin repetir autos ni numeración).
+    Si nada calza exactamente, la herramienta ya relaja los filtros (tope de precio/cuota, km, año, modelo; nunca segmento ni combustible) y devuelve las alternativas más cercanas indicando qué relajó: muéstralas sin volver a buscar.
+    IMPORTANTE: Solo puedes mostrar vehículos y links que devuelva esta herramienta; NUNCA inventes. Si devuelve vacío: no cierres con 'no hay'; aclara pie vs presupuesto o, si piden un modelo que no está, ofrece alternativas del mismo tipo."""
     repo = _get_repo()
-    results = repo.search(
-        precio_min=precio_min,
-        precio_max=precio_max,
-        año_min=año_min,
-        año_max=año_max,
-        km_max=km_max,
-        marca=marca,
-        modelo=modelo,
-        segmento=segmento,
-        transmision=transmision,
-        combustible=combustible,
-        exclude_marca=exclude_marca,
-        exclude_modelo=exclude_modelo,
-        exclude_combustible=exclude_combustible,
-        limit=limit,
-        order_by_precio=order_by_precio or "asc",
-    )
+    start = 0
+    if cursor:
+        try:
+            state = _decode_cursor(cursor)
+        except ValueError:
+            return "El cursor no es válido. Repite la búsqueda con los mismos filtros (sin cursor)."
+        params = dict(state["q"])
+        if "a" in state:
+            params["after"] = state["a"]
+        params["offset"] = state["o"]
+        start = state["n"]
+    else:
+        params = dict(
+            precio_min=precio_min,
+            precio_max=precio_max,
+            año_min=año_min,
+            año_max=año_max,
+            km_max=km_max,
+            marca=marca,
+            modelo=modelo,
+            segmento=segmento,
+            transmision=transmision,
+            combustible=combustible,
+            exclude_marca=exclude_marca,
+            exclude_modelo=exclude_modelo,
+            exclude_combustible=exclude_combustible,
+            texto=texto,
+            cuota_max=cuota_max,
+            pie=pie,
+            plazo=plazo,
+            limit=limit,
+            order_by_precio=order_by_precio or "asc",
+        )
+    page_size = max(int(params.get("limit") or 5), 1)
+    # Una fila de más para saber si hay página siguiente
+    results = _cached_search(repo, **{**params, "limit": page_size + 1})
+    relaxed: list[str] = []
+    if not results and not cursor:
+        # Sin resultados: escalera de relajación en la misma llamada (segmento/combustible se mantienen)
+        results, relaxed_params, relaxed = relax_search(
+            lambda **p: _cached_search(repo, **p),
+            {**params, "limit": page_size + 1},
+            first_match=lambda rungs: repo.first_match([canonical_search(**p)[0] for p in rungs]),
+        )
+        if results:
+            params = {**relaxed_params, "limit": page_size}
+    has_more = len(results) > page_size
+    results = results[:page_size]
+    if not results and cursor:
+        return pick("No hay más opciones con esos criterios; ya se mostraron todas.", "Sin más opciones; ya se mostraron todas.")
+    if not results and params.get("cuota_max") is not None:
+        return pick(
+            "No hay vehículos con esa cuota y ese pie (con los demás filtros). "
+            "INSTRUCCIÓN: ofrece subir el plazo a 48 meses (search_stock con plazo=48 y los mismos filtros), "
+            "aumentar el pie, o muestra los más económicos (misma búsqueda sin cuota_max, con pie, order_by_precio='asc') indicando su cuota.",
+            "Sin autos con esa cuota y pie. Ofrece: plazo=48 (mismos filtros), más pie, o los más económicos (sin cuota_max, con pie, asc).",
+        )
+    if not results and not params.get("segmento") and (params.get("marca") or params.get("modelo")):
+        # Sin segmento no se ofrecen otras marcas: no hay un "mismo tipo" que respetar
+        return pick(
+            "No hay vehículos de esa marca/modelo con esos criterios, ni relajando precio, km o año. "
+            "INSTRUCCIÓN: díselo y pregunta qué tipo de auto busca (SUV, sedán, camioneta...) para ofrecerle alternativas de ese tipo.",
+            "Esa marca/modelo no está con esos criterios, ni relajando precio/km/año. Díselo y pregunta qué tipo de auto busca para ofrecer alternativas.",
+        )
     if not results:
-        return (
-            "No hay vehículos que coincidan con esos criterios. "
-            "INSTRUCCIÓN: No asumas que el monto del cliente era presupuesto; lo más probable es que sea PIE. (1) Confirma: '¿Esos X millones son para el pie o es tu presupuesto para el auto?' (2) Si era presupuesto y no hay nada hasta ese tope: llama de nuevo a search_stock con los MISMOS filtros (segmento, combustible) pero SIN precio_max (o precio_max=25000000) y order_by_precio='asc', limit=5; luego di al cliente que lo que tienen parte desde aproximadamente X millones y pregúntale si quiere que le muestre los más económicos. (3) Si era pie: busca con precio_min=2×pie y muestra opciones con calculate_cuota."
+        return pick(
+            "No hay vehículos que coincidan con esos criterios, ni relajando precio, km, año o modelo. "
+            "INSTRUCCIÓN: mantén el tipo de vehículo que pidió y pregunta si puede flexibilizar segmento, combustible o transmisión. "
+            "Si el monto que dio era PIE y no presupuesto, busca con pie=... (y precio_min=2×pie) en vez de precio_max.",
+            "Sin resultados ni relajando precio/km/año/modelo. Pregunta si flexibiliza segmento, combustible o transmisión; "
+            "si el monto era PIE, busca con pie=... y precio_min=2×pie.",
+        )
+    if relaxed:
+        header = pick(
+            f"No hay vehículos con exactamente esos criterios. Alternativas más cercanas; se relajó: {'; '.join(relaxed)}. "
+            "Díselo al cliente en una frase y muestra estas opciones:",
+            f"Sin coincidencia exacta; relajado: {'; '.join(relaxed)}. Díselo en una frase:",
         )
-    lines = []
-    for i, v in enumerate(results, 1):
-        marca_m = v.get("marca") or "N/A"
-        modelo_m = v.get("modelo") or "N/A"
-        version_val = (v.get("version") or "").strip()
-        # Versión siempre visible: evita que el agente la omita o ponga N/A
-        version_s = f" | Versión: {version_val}" if version_val else ""
-        año = v.get("año") or "N/A"
-        precio = v.get("precio")
-        precio_s = f"${precio:,.0f}" if precio is not None else "N/A"
-        km = v.get("kilometraje")
-        km_s = f"{km:,.0f} km" if km is not None else "N/A"
-        ubicacion = ""
-        if v.get("sucursal") or v.get("comuna"):
-            ubicacion = f" | Ubicación: {v.get('sucursal', '')} ({v.get('comuna', '')})".strip().rstrip("()")
-        link_raw = (v.get("link") or "").strip()
-        if link_raw and not link_raw.startswith("http"):
-            link_raw = f"https://{link_raw}"
-        # Línea principal: Marca Modelo (Año) - Precio - Km [+ Versión: ...] [+ Ubicación]
-        linea = f"{i}. {marca_m} {modelo_m} ({año}) - {precio_s} - {km_s}{version_s}{ubicacion}"
-        if link_raw:
-            lines.append(linea)
-            lines.append(link_raw)
+    else:
+        header = pick("Opciones encontradas:", "Opciones:")
+    blocks = [_format_vehicle(i, v) for i, v in enumerate(results, start + 1)]
+    # Tope de tokens: se cortan autos completos y el cursor sigue desde el último mostrado
+    shown = fitting(blocks, estimate_tokens(header) + _CURSOR_TOKENS)
+    if shown < len(blocks):
+        results = results[:shown]
+        has_more = True
+    lines = [line for block in blocks[:shown] for line in block]
+    if shown < len(blocks):
+        lines.append(more_marker(len(blocks) - shown))
+    text = header + "\n" + "\n".join(lines)
+    if has_more:
+        query = {k: v for k, v in params.items() if k not in ("after", "offset") and v is not None}
+        state = {"q": query, "n": start + len(results)}
+        if fts_query(params.get("texto")):
+            # Con texto el orden es por relevancia: la página siguiente va por posición
+            state["o"] = int(params.get("offset") or 0) + len(results)
         else:
-            lines.append(linea)
-    return "Opciones encontradas:\n" + "\n".join(lines)
+            state["a"] = [results[-1].precio, results[-1].id]
+        text += pick(
+            f'\nHay más opciones. Para mostrarlas sin repetir estas: search_stock(cursor="{_encode_cursor(state)}")',
+            f'\nMás: search_stock(cursor="{_encode_cursor(state)}")',
+        )
+    return text
 
 
 def _valor_cuota(monto_financiar: float, num_cuotas: int) -> float:
@@ -116,11 +342,7 @@ def _valor_cuota(monto_financiar: float, num_cuotas: int) -> float:
 
 def _factor_cuota(num_cuotas: int) -> float:
     """Factor para cuota: cuota = monto_financiar * factor. Para inverso: monto_max = cuota_deseada / factor."""
-    r = FINANCIAMIENTO_TASA_MENSUAL
-    n = num_cuotas
-    if r <= 0 or n <= 0:
-        return 0.0
-    return (r * (1 + r) ** n) / ((1 + r) ** n - 1)
+    return factor_cuota(num_cuotas)
 
 
 @tool
@@ -142,10 +364,53 @@ def calculate_cuota(
         return "El monto a financiar debe ser positivo. Ajusta el pie (entre 30% y 50% del precio)."
     cuota = _valor_cuota(monto_financiar, plazo)
     pie_pct = (pie_efectivo / precio_lista) * 100
-    return (
+    return pick(
         f"Precio: ${precio_lista:,.0f}. Pie usado en simulación: ${pie_efectivo:,.0f} ({pie_pct:.0f}%). "
-        f"Monto a financiar: ${monto_financiar:,.0f}. A {plazo} cuotas, valor cuota: ${cuota:,.0f}/mes."
+        f"Monto a financiar: ${monto_financiar:,.0f}. A {plazo} cuotas, valor cuota: ${cuota:,.0f}/mes.",
+        f"precio {money(precio_lista)} pie {money(pie_efectivo)} ({pie_pct:.0f}%) financia {money(monto_financiar)} "
+        f"c:{money(cuota)}/{plazo}",
+    )
+
+
+@tool
+def calculate_cuotas(
+    pie: float,
+    precios: Optional[list[float]] = None,
+    vehiculos: Optional[list[str]] = None,
+) -> str:
+    """Cuotas de VARIOS vehículos en todos los plazos (24, 36 y 48) en una sola llamada. Úsala en vez de llamar calculate_cuota una vez por auto: después de search_stock, pasa los vehículos de la lista y el pie del cliente.
+    pie en pesos (se ajusta a 30%-50% de cada precio, igual que calculate_cuota).
+    vehiculos: patentes de la lista (el código al final del link, ej. "TFDL48") — preferido, toma el precio del stock. O bien precios: precios de lista en pesos.
+    Devuelve una línea por vehículo con el pie usado y la cuota a cada plazo; con eso respondes 36 meses y, si la cuota le parece alta o baja, ya tienes 48 y 24 sin volver a calcular."""
+    labels: list[str] = []
+    valores: list[float] = []
+    missing: list[str] = []
+    if vehiculos:
+        for ref, v in zip(vehiculos, _get_repo().get_by_refs(vehiculos, columns=("id_externo", "marca", "modelo"))):
+            if v is None or not v.precio:
+                missing.append(str(ref))
+                continue
+            labels.append(f"{v.marca or ''} {v.modelo or ''} ({v.id_externo or ref})".strip())
+            valores.append(float(v.precio))
+    for precio in precios or []:
+        if precio and precio > 0:
+            labels.append(pick(f"Precio ${precio:,.0f}", f"precio {money(precio)}"))
+            valores.append(float(precio))
+    if not valores:
+        return "Indica los vehículos (patentes de la lista) o sus precios para calcular las cuotas."
+    pie_efectivo, cuotas = cuota_matrix(np.array(valores, dtype=np.float64), max(float(pie or 0), 0.0))
+    header = pick(
+        "Vehículo | Precio | Pie usado | " + " | ".join(f"{n} cuotas" for n in FINANCIAMIENTO_PLAZOS),
+        "vehículo|precio|pie|" + "|".join(f"c{n}" for n in FINANCIAMIENTO_PLAZOS),
     )
+    sep = pick(" | ", "|")
+    blocks = []
+    for i, label in enumerate(labels):
+        pct = pie_efectivo[i] / valores[i] * 100
+        row = sep.join(money(c) for c in cuotas[i])
+        blocks.append([f"{i + 1}. {label}{sep}{money(valores[i])}{sep}{money(pie_efectivo[i])} ({pct:.0f}%){sep}{row}"])
+    footer = f"No encontrados en stock: {', '.join(missing)}" if missing else ""
+    return render(header, blocks, footer)
 
 
 @tool
@@ -154,7 +419,7 @@ def estimate_precio_max_for_cuota(
     cuota_deseada: float,
     plazo: int = 36,
 ) -> str:
-    """Dado el PIE del cliente (en pesos) y la cuota mensual que quiere pagar (ej. 300000), devuelve el precio máximo de vehículo que podría pagar (pie + financiamiento) para que la cuota no supere ese monto. Usar cuando el cliente diga "tengo X de pie y puedo pagar Y al mes": con el precio_max devuelto, llama search_stock(precio_max=este_valor, order_by_precio=desc) y luego calculate_cuota para cada resultado."""
+    """Dado el PIE del cliente (en pesos) y la cuota mensual que quiere pagar (ej. 300000), devuelve el precio máximo de vehículo que podría pagar (pie + financiamiento) para que la cuota no supere ese monto. Usar cuando el cliente diga "tengo X de pie y puedo pagar Y al mes": con el precio_max devuelto, llama search_stock(precio_max=este_valor, order_by_precio=desc) y luego calculate_cuotas con los resultados."""
     if pie < 0 or cuota_deseada <= 0:
         return "Pie y cuota deseada deben ser positivos."
     if plazo not in FINANCIAMIENTO_PLAZOS:
@@ -164,28 +429,103 @@ def estimate_precio_max_for_cuota(
         return "No se pudo calcular."
     monto_financiar_max = cuota_deseada / factor
     precio_max = pie + monto_financiar_max
-    return (
+    return pick(
         f"Con pie ${pie:,.0f} y cuota deseada ${cuota_deseada:,.0f}/mes a {plazo} cuotas, "
         f"el precio máximo de vehículo es aproximadamente ${precio_max:,.0f}. "
-        f"Usa search_stock(precio_max={int(precio_max)}, order_by_precio=desc, limit=5) y luego calculate_cuota para cada vehículo."
+        f"Usa search_stock(precio_max={int(precio_max)}, order_by_precio=desc, limit=5) y luego calculate_cuotas con esos vehículos.",
+        f"precio_max≈{int(precio_max)} (pie {money(pie)}, c:{money(cuota_deseada)}/{plazo}). "
+        f"Sigue: search_stock(precio_max={int(precio_max)}, order_by_precio=desc) y calculate_cuotas.",
     )
 
 
+# Cómo puede pedir el modelo una faceta -> nombre en el resumen
+_FACET_ALIASES = {
+    "marcas": "marca", "segmentos": "segmento", "tipo": "segmento", "sucursales": "sucursal",
+    "combustibles": "combustible", "transmisiones": "transmision", "tramo": "precio", "precios": "precio",
+}
+
+
+def _format_facet(entries: list[dict]) -> str:
+    return ", ".join(f"{e['valor']} {e['total']}" for e in entries)
+
+
+def _facet_blocks(entries: list[dict]) -> list[list[str]]:
+    """Una línea por valor de la faceta, con cantidad y rango de precio."""
+    blocks = []
+    for e in entries:
+        rango = ""
+        if e["precio_min"] is not None:
+            rango = f" ({money(e['precio_min'])} - {money(e['precio_max'])})"
+        blocks.append([f"- {e['valor']}: {e['total']}{rango}"])
+    return blocks
+
+
 @tool
-def get_stock_summary() -> str:
-    """Resumen del stock: cantidad total y rangos de precios y años. Usar cuando pregunten cuántos autos hay o qué precios manejamos."""
+def get_stock_summary(facet: Optional[str] = None) -> str:
+    """Resumen del stock desde memoria (sin listar autos): total, rangos de precio y año, y cantidad por segmento y tramo de precio. Usar cuando pregunten qué tienen, cuántos autos hay o qué precios manejan, ANTES de hacer búsquedas amplias.
+    facet (opcional) para el detalle de una categoría con cantidad y rango de precio: "segmento", "marca", "combustible", "transmision", "sucursal" o "precio" (tramos). Ej. "¿qué marcas tienen?" -> facet="marca"."""
     repo = _get_repo()
     s = repo.get_summary()
     if s["total"] == 0:
         return "El stock está vacío."
+    facets = s.get("facets", {})
+    if facet:
+        name = fold(facet)
+        name = _FACET_ALIASES.get(name, name)
+        if name not in facets:
+            return f"Faceta no disponible. Usa una de: {', '.join(FACETS)}."
+        return render(pick(f"Stock por {name} (cantidad y rango de precio):", f"{name} (cantidad, precios):"), _facet_blocks(facets[name]))
     parts = [f"Total de vehículos: {s['total']}"]
     if s.get("precio_min") is not None:
-        parts.append(f"Precios: ${s['precio_min']:,.0f} - ${s['precio_max']:,.0f}")
+        parts.append(f"Precios: {money(s['precio_min'])} - {money(s['precio_max'])}")
     if s.get("año_min") is not None:
         parts.append(f"Años: {s['año_min']} - {s['año_max']}")
+    if facets.get("segmento"):
+        parts.append("Por segmento: " + _format_facet(facets["segmento"]))
+    if facets.get("precio"):
+        parts.append("Por tramo de precio: " + _format_facet(facets["precio"]))
     return "\n".join(parts)
 
 
+@tool
+def similar_vehicles(
+    vehiculo: Optional[str] = None,
+    modelo: Optional[str] = None,
+    precio: Optional[float] = None,
+    k: int = 5,
+) -> str:
+    """Vehículos del stock más parecidos (precio, año, km, segmento, transmisión, combustible y marca) a uno dado.
+    - vehiculo: patente o link de un auto que ya mostraste (ej. "TFDL48", el final del link) -> "¿tienen algo parecido a este?".
+    - modelo: modelo que el cliente nombra, esté o no en stock (ej. "Kia Morning", "Toyota Hilux") -> "busco algo tipo Morning". Si no lo tenemos, devuelve los más parecidos al perfil de ese modelo.
+    - precio (opcional, en PESOS): centra la búsqueda en ese precio (ej. presupuesto del cliente).
+    Úsala en vez de varias search_stock cuando piden "algo como X". Solo muestra lo que devuelva."""
+    if not vehiculo and not modelo:
+        return "Indica vehiculo (patente o link) o modelo."
+    repo = _get_repo()
+    results, info = repo.similar_vehicles(ref=vehiculo, modelo=modelo, precio=precio, k=max(int(k or 5), 1))
+    if not results:
+        if vehiculo:
+            return f"No encontré el vehículo {vehiculo} en el stock. Usa la patente o el link de un auto mostrado."
+        return (
+            f"No reconozco el modelo {modelo} para compararlo. "
+            "INSTRUCCIÓN: pregunta qué tipo de vehículo es (SUV, sedán, camioneta...) y usa search_stock con ese segmento."
+        )
+    ref = info["referencia"]
+    if ref is not None:
+        header = f"Más parecidos a {ref.marca or ''} {ref.modelo or ''} ({ref.año or 'N/A'}):"
+    elif info["modelo_en_stock"]:
+        header = pick(
+            f"{modelo} sí está en stock (muéstralo con search_stock modelo=...). Alternativas parecidas de otros modelos:",
+            f"{modelo} sí está en stock (search_stock modelo=...). Alternativas de otros modelos:",
+        )
+    else:
+        header = pick(
+            f"{modelo} no está en stock. Los más parecidos que tenemos (díselo al cliente en una frase):",
+            f"{modelo} no está en stock; lo más parecido (díselo en una frase):",
+        )
+    return render(header, [_format_vehicle(i, v) for i, v in enumerate(results, 1)])
+
+
 @tool
 def register_lead(
     nombre: str,
@@ -205,5 +545,8 @@ def register_lead(
         notas=notas,
     )
     if result["ok"]:
-        return "Lead registrado. Di al cliente: Sus datos han sido enviados a un ejecutivo de Pompeyo Carrasco Usados, quien lo contactará a la brevedad para coordinar su visita o prueba de manejo."
+        return pick(
+            "Lead registrado. Di al cliente: Sus datos han sido enviados a un ejecutivo de Pompeyo Carrasco Usados, quien lo contactará a la brevedad para coordinar su visita o prueba de manejo.",
+            "Lead registrado. Dile que un ejecutivo de Pompeyo Carrasco Usados lo contactará a la brevedad para coordinar visita o prueba de manejo.",
+        )
     return f"Error al registrar: {result['message']}. Pide al cliente que verifique los datos."
@@ -0,0 +1,119 @@
+"""Clasificador local autos / otro tema: modelo lineal (regresión logística) sobre n-gramas hasheados.
+
+Features de un mensaje normalizado (agent.faq_cache.normalize_question): palabras, pares de
+palabras, trigramas de caracteres de cada palabra, una marca "lex" si nombra una marca o un
+modelo (del stock o de MODEL_HINTS) y otra "dom" si usa términos del rubro (DOMAIN_TERMS). Cada
+feature se hashea (crc32) a una de _DIM posiciones: no hay vocabulario que mantener y un mensaje
+se puntúa sumando unas decenas de pesos.
+
+Se entrena al primer uso con agent/off_topic_corpus.tsv (unos cientos de mensajes, ~50 ms).
+"""
+from __future__ import annotations
+
+import math
+import random
+import zlib
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from agent.faq_cache import normalize_question
+from stock.similar import MODEL_HINTS
+
+CORPUS_PATH = Path(__file__).with_name("off_topic_corpus.tsv")
+
+_DIM = 1 << 18
+_EPOCHS = 10
+_LEARNING_RATE = 0.2
+_L2 = 1e-3
+
+# Palabras de nombres de modelo que también son palabras comunes: no cuentan como mención de un auto
+_LEXICON_STOP = {"nuevo", "new", "all", "grand", "plus", "sport", "pro", "max", "city", "rio", "gol"}
+STATIC_LEXICON = frozenset(
+    {name for name in MODEL_HINTS if name not in _LEXICON_STOP}
+    | {marca for marca, _ in MODEL_HINTS.values()}
+)
+
+# Vocabulario del rubro (texto normalizado): autos, financiamiento, trámites y equipamiento
+DOMAIN_TERMS = frozenset({
+    "auto", "autos", "vehiculo", "vehiculos", "carro", "camioneta", "camionetas", "suv", "sedan", "citycar",
+    "hatchback", "van", "furgon", "pickup", "jeep", "4x4", "4x2", "automotora", "automotriz", "concesionario",
+    "automatico", "mecanico", "bencina", "diesel", "hibrido", "electrico", "motor", "km", "kilometraje",
+    "kilometros", "odometro", "cuota", "cuotas", "pie", "financiar", "financiamiento", "credito", "leasing",
+    "contado", "tasacion", "tasar", "retoma", "transferencia", "patente", "permiso", "circulacion",
+    "revision", "tecnica", "autofact", "prenda", "dueños", "mantencion", "mantenciones", "neumaticos",
+    "repuestos", "aceite", "airbags", "asientos", "pasajeros", "maletero", "traccion", "turbo", "consumo",
+    "convertible", "manejar", "test", "drive", "usado", "usados", "uber", "stock", "puertas", "reventa",
+    "marcas", "modelos", "cilindrada", "caja", "frenos", "llantas",
+})
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode()) & (_DIM - 1)
+
+
+def features(text: str, lexicon: Iterable[str] | frozenset[str] = STATIC_LEXICON) -> np.ndarray:
+    """Posiciones (sin repetir) de las features del mensaje."""
+    words = normalize_question(text).split()
+    feats = {f"w:{w}" for w in words}
+    bigrams = [f"{a} {b}" for a, b in zip(words, words[1:])]
+    feats.update(f"b:{b}" for b in bigrams)
+    for w in words:
+        padded = f"<{w}>"
+        feats.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    if any(w in lexicon and w not in _LEXICON_STOP for w in words) or any(b in lexicon for b in bigrams):
+        feats.add("lex")
+    domain = sum(w in DOMAIN_TERMS for w in words)
+    if domain:
+        feats.add("dom" if domain == 1 else "dom2")
+    return np.fromiter({_hash(f) for f in feats}, dtype=np.int64)
+
+
+def load_corpus(path: Path = CORPUS_PATH) -> list[tuple[str, bool]]:
+    """(mensaje, es_de_autos) del corpus etiquetado."""
+    examples = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        label, text = line.split("\t", 1)
+        examples.append((text, label == "AUTOS"))
+    return examples
+
+
+class TopicModel:
+    def __init__(self, weights: np.ndarray, bias: float):
+        self.weights = weights
+        self.bias = bias
+
+    @classmethod
+    def train(cls, examples: list[tuple[str, bool]], lexicon: frozenset[str] = STATIC_LEXICON) -> TopicModel:
+        """Regresión logística por SGD (orden de los ejemplos fijo: el modelo es reproducible)."""
+        data = [(features(text, lexicon), 1.0 if label else 0.0) for text, label in examples]
+        weights = np.zeros(_DIM)
+        bias = 0.0
+        rng = random.Random(0)
+        for epoch in range(_EPOCHS):
+            rng.shuffle(data)
+            rate = _LEARNING_RATE / (1 + epoch * 0.5)
+            for idx, y in data:
+                z = weights[idx].sum() + bias
+                grad = 1.0 / (1.0 + math.exp(-z)) - y
+                weights[idx] -= rate * (grad + _L2 * weights[idx])
+                bias -= rate * grad
+        return cls(weights, bias)
+
+    def probability(self, text: str, lexicon: frozenset[str] = STATIC_LEXICON) -> float:
+        """Probabilidad de que el mensaje sea sobre autos."""
+        z = float(self.weights[features(text, lexicon)].sum()) + self.bias
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+
+_model: TopicModel | None = None
+
+
+def get_model() -> TopicModel:
+    global _model
+    if _model is None:
+        _model = TopicModel.train(load_corpus())
+    return _model
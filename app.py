@@ -4,6 +4,7 @@ Expone /health, /chat y preparado para webhook de WhatsApp.
 """
 from __future__ import annotations
 
+import asyncio
 import traceback
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
@@ -13,8 +14,17 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-from config import STOCK_FILE, STOCK_DB_PATH
+from config import (
+    ADMIN_TOKEN,
+    STOCK_DB_PATH,
+    STOCK_FILE,
+    STOCK_RELOAD_INTERVAL,
+    STOCK_RELOAD_MAX_DROP,
+    STOCK_SNAPSHOT_DIR,
+)
+from stock.reload import StockReloader, StockReloadError
 from stock.repository import StockRepository
+from stock.snapshot import load_snapshot
 
 # Cabeceras CORS para respuestas (incluidas errores), así el navegador no bloquea por CORS
 CORS_HEADERS = {
@@ -25,18 +35,60 @@ CORS_HEADERS = {
 }
 
 
+_reloader: StockReloader | None = None
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Al arrancar, carga el stock desde el CSV si existe (entorno efímero en Railway)."""
+    """Al arrancar, carga el stock: desde el snapshot si corresponde al CSV, si no parseando el CSV (Railway es efímero).
+
+    Después queda vigilando STOCK_FILE para recargarlo en caliente (ver stock/reload.py).
+    """
+    global _reloader
+    from agent.off_topic import warm_up
+    from agent.tools import _get_repo, set_repo
+
+    def publish(repo: StockRepository) -> None:
+        set_repo(repo)
+        warm_up()
+
+    snapshot_repo = None
     try:
-        repo = StockRepository(STOCK_DB_PATH)
-        repo.init_schema()
-        n = repo.update_from_file(STOCK_FILE)
-        if n > 0:
-            print(f"[Startup] Stock cargado: {n} vehículos")
+        snapshot_repo = load_snapshot(STOCK_SNAPSHOT_DIR, STOCK_FILE, STOCK_DB_PATH)
     except Exception as e:
-        print(f"[Startup] Stock opcional: {e}")
-    yield
+        print(f"[Startup] Snapshot no utilizable: {e}")
+    if snapshot_repo is not None:
+        set_repo(snapshot_repo)
+        print(f"[Startup] Stock desde snapshot: {len(snapshot_repo.get_index())} vehículos")
+    else:
+        try:
+            repo = StockRepository(STOCK_DB_PATH)
+            repo.init_schema()
+            diff = repo.sync_from_file(STOCK_FILE)
+            if diff["total"] > 0:
+                print(
+                    f"[Startup] Stock cargado: {diff['total']} vehículos "
+                    f"(+{diff['inserted']} ~{diff['updated']} -{diff['deleted']})"
+                )
+        except Exception as e:
+            print(f"[Startup] Stock opcional: {e}")
+    # Clasificador de off-topic y léxico del stock listos antes del primer mensaje
+    warm_up()
+    _reloader = StockReloader(
+        STOCK_FILE,
+        _get_repo,
+        publish,
+        interval=STOCK_RELOAD_INTERVAL,
+        max_drop=STOCK_RELOAD_MAX_DROP,
+    )
+    _reloader.start()
+    try:
+        yield
+    finally:
+        _reloader.stop()
+        from agent.orchestrator import flush_faq_cache
+
+        flush_faq_cache()
 
 
 app = FastAPI(title="Agente Pompeyo Carrasco Usados", lifespan=lifespan)
@@ -138,6 +190,40 @@ async def api_chat(request: Request):
         )
 
 
+@app.post("/admin/stock/reload")
+async def admin_stock_reload(request: Request):
+    """Recarga el stock desde STOCK_FILE sin reiniciar. Header X-Admin-Token = ADMIN_TOKEN."""
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return JSONResponse({"error": "Forbidden"}, status_code=403)
+    if _reloader is None:
+        return JSONResponse({"error": "Recarga no disponible"}, status_code=503)
+    try:
+        result = await asyncio.to_thread(_reloader.reload, force=True)
+    except StockReloadError as e:
+        return JSONResponse({"status": "rejected", "error": str(e)}, status_code=409)
+    return result
+
+
+@app.get("/admin/stats")
+async def admin_stats(request: Request):
+    """Métricas internas (cache de búsquedas, cache FAQ, single-flight del chat, off-topic local/LLM, turnos sin LLM, última recarga de stock). Header X-Admin-Token = ADMIN_TOKEN."""
+    from agent.fast_path import fast_path_stats
+    from agent.off_topic import off_topic_stats
+    from agent.orchestrator import faq_cache_stats, single_flight_stats
+    from agent.tools import search_cache_stats
+
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return JSONResponse({"error": "Forbidden"}, status_code=403)
+    return {
+        "search_cache": search_cache_stats(),
+        "faq_cache": faq_cache_stats(),
+        "single_flight": single_flight_stats(),
+        "off_topic": off_topic_stats(),
+        "fast_path": fast_path_stats(),
+        "stock_reload": _reloader.last_result if _reloader else None,
+    }
+
+
 # Para verificación de webhook de WhatsApp (Meta)
 @app.get("/webhook")
 async def webhook_verify(request: Request):
@@ -13,6 +13,15 @@ DATA_DIR = BASE_DIR / "data"
 # OpenAI (obligatorio para el agente)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Clasificador local de off-topic: decide solo fuera de esta banda de probabilidad de "autos";
+# dentro (incierto) se consulta al LLM
+OFF_TOPIC_LOCAL_LOW = float(os.getenv("OFF_TOPIC_LOCAL_LOW", "0.1"))
+OFF_TOPIC_LOCAL_HIGH = float(os.getenv("OFF_TOPIC_LOCAL_HIGH", "0.8"))
+# Con la consulta de off-topic al LLM pendiente, correr el turno del agente en paralelo (sin escribir
+# el checkpoint hasta tener el veredicto)
+SPECULATIVE_AGENT = os.getenv("SPECULATIVE_AGENT", "1").lower() in ("1", "true", "yes")
+# Responder sin LLM saludos, agradecimientos y cambios de plazo/pie sobre la última lista (agent.fast_path)
+FAST_PATH = os.getenv("FAST_PATH", "1").lower() in ("1", "true", "yes")
 
 # WhatsApp Business (Meta Cloud API) - los clientes hablan por WhatsApp
 WHATSAPP_ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN", "")
@@ -23,9 +32,34 @@ WHATSAPP_WEBHOOK_VERIFY_TOKEN = os.getenv("WHATSAPP_WEBHOOK_VERIFY_TOKEN", "")
 # Stock (por defecto stockfinal.csv con columnas Segmento, Transmisión, Combustible)
 STOCK_FILE = os.getenv("STOCK_FILE") or str(DATA_DIR / "stockfinal.csv")
 STOCK_DB_PATH = os.getenv("STOCK_DB_PATH") or str(DATA_DIR / "stock.db")
+# Snapshot precompilado (scripts/update_stock.py --snapshot): si coincide con STOCK_FILE se arranca sin parsear
+STOCK_SNAPSHOT_DIR = os.getenv("STOCK_SNAPSHOT_DIR") or str(DATA_DIR / "stock_snapshot")
+# Recarga en caliente: cada cuántos segundos se revisa STOCK_FILE (0 = solo por /admin/stock/reload)
+STOCK_RELOAD_INTERVAL = float(os.getenv("STOCK_RELOAD_INTERVAL", "30"))
+# Se rechaza una recarga que elimine más de esta fracción del stock (archivo truncado o a medio subir)
+STOCK_RELOAD_MAX_DROP = float(os.getenv("STOCK_RELOAD_MAX_DROP", "0.5"))
+# Cache de resultados de search_stock (LRU por versión del stock): entradas máximas y TTL en segundos
+STOCK_SEARCH_CACHE_SIZE = int(os.getenv("STOCK_SEARCH_CACHE_SIZE", "512"))
+STOCK_SEARCH_CACHE_TTL = float(os.getenv("STOCK_SEARCH_CACHE_TTL", "600"))
+# Salida de las herramientas del agente: "verbose" (líneas completas con link) o "compact" (códigos
+# cortos y patente en vez de link); y tope aproximado de tokens por llamada (0 = sin tope)
+TOOL_OUTPUT_MODE = os.getenv("TOOL_OUTPUT_MODE", "verbose").strip().lower()
+TOOL_OUTPUT_MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "600"))
+# Token para los endpoints /admin (header X-Admin-Token); vacío = deshabilitados
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 FAQ_CACHE_PATH = os.getenv("FAQ_CACHE_PATH") or str(DATA_DIR / "faq_cache.db")
+# Cache FAQ: L1 en memoria (entradas y TTL en segundos) delante de SQLite, que se acota por filas y antigüedad
+FAQ_CACHE_L1_SIZE = int(os.getenv("FAQ_CACHE_L1_SIZE", "1024"))
+FAQ_CACHE_L1_TTL = float(os.getenv("FAQ_CACHE_L1_TTL", "300"))
+FAQ_CACHE_MAX_ROWS = int(os.getenv("FAQ_CACHE_MAX_ROWS", "5000"))
+FAQ_CACHE_MAX_AGE_DAYS = float(os.getenv("FAQ_CACHE_MAX_AGE_DAYS", "30"))
+# Similitud mínima (Jaccard de trigramas, 0-1) para servir una respuesta global a una pregunta casi igual; 0 desactiva
+FAQ_CACHE_SIMILARITY = float(os.getenv("FAQ_CACHE_SIMILARITY", "0.75"))
 LEADS_DB_PATH = os.getenv("LEADS_DB_PATH") or str(DATA_DIR / "leads.db")
 CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH") or str(DATA_DIR / "checkpoints.db")
+# SQLite compartido (stock, FAQ, leads): mmap y cache de sentencias preparadas por conexión
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
 # En Railway: usa Postgres para memoria (el disco es efímero). Variable típica: DATABASE_URL
 CHECKPOINT_POSTGRES_URI = os.getenv("CHECKPOINT_POSTGRES_URI") or os.getenv("DATABASE_URL") or ""
 
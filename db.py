@@ -0,0 +1,68 @@
+"""Conexiones SQLite compartidas: una conexión larga por hilo y por archivo.
+
+Stock, cache FAQ y leads piden su conexión aquí en vez de abrir una nueva en
+cada operación. Cada conexión se abre una sola vez por hilo con WAL,
+synchronous=NORMAL, mmap y cache de sentencias preparadas; el esquema (DDL y
+migraciones) se ejecuta una sola vez por proceso y archivo.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable
+
+from config import SQLITE_CACHED_STATEMENTS, SQLITE_MMAP_SIZE
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready: set[tuple[str, str]] = set()
+
+
+def _open(db_path: str) -> sqlite3.Connection:
+    if db_path != ":memory:":
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, cached_statements=SQLITE_CACHED_STATEMENTS)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Escrituras concurrentes (varios workers) esperan en vez de fallar con "database is locked"
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def get_conn(db_path: str) -> sqlite3.Connection:
+    """Conexión reutilizable del hilo actual para db_path. Usar `with conn:` para transacciones; no cerrarla."""
+    conns: dict[str, sqlite3.Connection] | None = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = _open(db_path)
+    return conn
+
+
+def ensure_schema(db_path: str, name: str, setup: Callable[[sqlite3.Connection], None]) -> sqlite3.Connection:
+    """Ejecuta `setup` (DDL/migraciones) una vez por proceso para (db_path, name) y devuelve la conexión del hilo."""
+    conn = get_conn(db_path)
+    key = (db_path, name)
+    # :memory: es una base distinta por conexión, así que no se puede marcar como lista
+    if db_path == ":memory:" or key not in _schema_ready:
+        with _schema_lock:
+            if db_path == ":memory:" or key not in _schema_ready:
+                with conn:
+                    setup(conn)
+                if db_path != ":memory:":
+                    _schema_ready.add(key)
+    return conn
+
+
+def close_thread_connections(db_path: str | None = None) -> None:
+    """Cierra las conexiones del hilo actual (todas o solo la de db_path)."""
+    conns: dict[str, sqlite3.Connection] = getattr(_local, "conns", {})
+    for path in [db_path] if db_path else list(conns):
+        conn = conns.pop(path, None)
+        if conn is not None:
+            conn.close()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Mide el match aproximado de preguntas del cache de respuestas (QuestionIndex.best y FAQCache.get).
+
+Uso: python scripts/bench_faq_match.py [N]   (por defecto 5000 preguntas globales indexadas)
+Arma N preguntas sin contexto combinando temas y sucursales, y consulta variantes con tildes,
+puntuación, emoji y abreviaciones (deben encontrar su original) y preguntas ajenas (no deben).
+"""
+from __future__ import annotations
+
+import itertools
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Presupuesto por consulta (ms), p99
+BUDGET_MS = 1.0
+
+_TOPICS = (
+    "cual es el horario de la sucursal {}", "donde queda la sucursal {}", "que documentos piden en {}",
+    "hacen test drive en la sucursal {}", "reciben parte de pago en {}", "que garantia tienen los autos de {}",
+    "cuales son los requisitos para financiar en {}", "atienden los domingos en {}",
+)
+_PLACES = (
+    "las condes", "providencia", "maipu", "la florida", "puente alto", "nunoa", "vitacura", "quilicura",
+    "san bernardo", "rancagua", "vina del mar", "concepcion", "temuco", "la serena", "antofagasta",
+)
+_VARIANTS = (
+    ("¿Cuál es el horario de la sucursal Las Condes? 🙏", "cual es el horario de la sucursal las condes"),
+    ("hola, dnd queda la sucursal providencia??", "donde queda la sucursal providencia"),
+    ("Buenas! ¿qué documentos piden en Maipú?", "que documentos piden en maipu"),
+    ("¿Hacen test drive en sucursal La Florida?", "hacen test drive en la sucursal la florida"),
+    ("reciben parte d pago en puente alto", "reciben parte de pago en puente alto"),
+)
+# Para variar las preguntas indexadas (las globales no llevan números)
+_EXTRAS = (
+    "sabado", "domingo", "feriado", "manana", "tarde", "semana", "mes", "verano", "invierno", "ahora",
+    "suv", "sedan", "camioneta", "citycar", "hatchback", "furgon", "diesel", "bencina", "hibrido", "electrico",
+    "kia", "toyota", "chevrolet", "nissan", "hyundai", "suzuki", "mazda", "peugeot", "ford", "renault",
+    "credito", "contado", "transferencia", "cheque", "tarjeta", "pie", "leasing", "empresa", "persona", "extranjero",
+)
+_MISSES = ("tienen camionetas diesel", "cuanto sale el seguro", "me gusta el color rojo", "hola")
+
+
+def _questions(n: int) -> list[str]:
+    base = [topic.format(place) for topic, place in itertools.product(_TOPICS, _PLACES)]
+    rng = random.Random(0)
+    out = list(base[:n])
+    while len(out) < n:
+        out.append(f"{rng.choice(base)} {' '.join(rng.sample(_EXTRAS, 3))}")
+    return list(dict.fromkeys(out))
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+def main() -> int:
+    from agent.faq_cache import GLOBAL, FAQCache, normalize_question
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FAQCache(str(Path(tmp) / "faq.db"), l1_size=16)
+        for q in _questions(n):
+            cache.set(q, f"respuesta: {q}", scope=GLOBAL)
+        cache.get("cual es el horario")  # arma el índice
+        index = cache._near_index()
+        print(f"preguntas indexadas: {len(index)}  umbral: {index.threshold}")
+
+        bad = 0
+        for variant, expected in _VARIANTS:
+            match = index.best(normalize_question(variant))
+            ok = match is not None and match[0] == expected
+            bad += not ok
+            print(f"  {'ok ' if ok else 'MAL'} {variant!r} -> {match}")
+        for miss in _MISSES:
+            match = index.best(normalize_question(miss))
+            bad += match is not None
+            print(f"  {'ok ' if match is None else 'MAL'} {miss!r} -> {match}")
+
+        queries = [normalize_question(v) for v, _ in _VARIANTS] + [normalize_question(m) for m in _MISSES]
+        samples = []
+        for _ in range(200):
+            for q in queries:
+                t0 = time.perf_counter()
+                index.best(q)
+                samples.append(time.perf_counter() - t0)
+        p50, p99 = _percentiles(samples)
+        print(f"QuestionIndex.best  p50 {p50:.3f} ms  p99 {p99:.3f} ms")
+
+        # get() completo con L1 chico: L1, SQLite y el índice
+        samples = []
+        for _ in range(50):
+            for variant, _ in _VARIANTS:
+                t0 = time.perf_counter()
+                cache.get(variant + " ")
+                samples.append(time.perf_counter() - t0)
+        gp50, gp99 = _percentiles(samples)
+        print(f"FAQCache.get        p50 {gp50:.3f} ms  p99 {gp99:.3f} ms")
+        print(f"bad {bad}")
+    return 0 if bad == 0 and p99 <= BUDGET_MS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
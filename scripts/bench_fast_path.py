@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Turnos respondidos sin LLM (agent.fast_path) y llamadas al LLM ahorradas por conversación.
+
+Uso: python scripts/bench_fast_path.py [--rounds N]
+Reproduce conversaciones típicas de WhatsApp sobre STOCK_FILE cargado en una base temporal. Los
+turnos que van al agente se simulan con sus llamadas reales a las herramientas y una respuesta
+fija; cada uno cuesta una llamada al LLM más una por ronda de herramientas. Los que responde el
+atajo se escriben en la historia tal como lo hace el orquestador. Informa, por conversación, las
+llamadas al LLM sin y con el atajo, y la latencia del atajo (clasificar + responder; sin la lectura
+y escritura del checkpoint).
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# (mensaje del cliente, [(herramienta, argumentos)], respuesta del agente) por turno. La respuesta
+# solo se usa si el turno va al agente.
+CONVERSATIONS: dict[str, list[tuple[str, list[tuple[str, dict]], str]]] = {
+    "suv_financiamiento": [
+        ("hola", [], "¡Hola! ¿Qué auto buscas?"),
+        ("busco un suv hasta 15 millones", [
+            ("search_stock", {"segmento": "Suv", "precio_max": 15_000_000, "order_by_precio": "desc"}),
+        ], "Estas son las opciones. ¿Te gusta alguna?"),
+        ("tengo 4 millones de pie", [("calculate_cuotas", {"pie": 4_000_000, "vehiculos": "$PATENTES"})],
+         "Con ese pie, tu cuota sería $478.000 en un plazo de 36 meses. ¿Qué te parece?"),
+        ("a 48?", [("calculate_cuotas", {"pie": 4_000_000, "vehiculos": "$PATENTES"})], "A 48 meses queda en..."),
+        ("5m en 36", [("calculate_cuotas", {"pie": 5_000_000, "vehiculos": "$PATENTES"})], "Con 5 millones..."),
+        ("gracias", [], "¡De nada!"),
+    ],
+    "camioneta_porcentaje": [
+        ("buenas tardes", [], "¡Buenas tardes! ¿Qué auto buscas?"),
+        ("tienen camionetas diesel?", [
+            ("search_stock", {"segmento": "Camioneta", "combustible": "Diesel", "pie": 8_000_000}),
+        ], "Tenemos estas camionetas, con la cuota a 36 meses. ¿Alguna te interesa?"),
+        ("con 30% de pie", [("calculate_cuotas", {"pie": 8_000_000, "vehiculos": "$PATENTES"})], "Con 30%..."),
+        ("a 48", [("calculate_cuotas", {"pie": 8_000_000, "vehiculos": "$PATENTES"})], "A 48 meses..."),
+        ("la 2 me gusta", [], "Excelente elección. ¿Quieres agendar una visita?"),
+        ("ok", [], "Perfecto, ¿me das tu nombre y correo?"),
+    ],
+    "citycar_plazo": [
+        ("hola, busco un citycar", [("search_stock", {"segmento": "CityCar"})], "Estos son los citycar. ¿Para el pie cuánto tienes?"),
+        ("tengo 3m de pie", [("calculate_cuotas", {"pie": 3_000_000, "vehiculos": "$PATENTES"})],
+         "Tu cuota sería $250.000 en un plazo de 36 meses. ¿Qué te parece?"),
+        ("y a 24?", [("calculate_cuotas", {"pie": 3_000_000, "vehiculos": "$PATENTES"})], "A 24 meses..."),
+        ("muchas gracias", [], "¡De nada!"),
+    ],
+    "consulta_general": [
+        ("Hola", [], "¡Hola! ¿En qué te ayudo?"),
+        ("cuanto cuesta la transferencia?", [], "La transferencia cuesta alrededor de 1,5% del valor del auto."),
+        ("ok", [], "¿Algo más?"),
+        ("gracias", [], "¡De nada!"),
+    ],
+}
+
+
+def _resolve(args: dict, patentes: list[str]) -> dict:
+    return {k: (patentes[:5] if v == "$PATENTES" else v) for k, v in args.items()}
+
+
+def _run(rounds: int) -> int:
+    import re
+
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+    from agent import tools
+    from agent.fast_path import fast_reply
+    from agent.intent import classify
+
+    by_name = {t.name: t for t in (tools.search_stock, tools.calculate_cuotas)}
+    samples: list[float] = []
+    print(f"{'conversación':<24}{'turnos':>7}{'atajo':>7}{'LLM sin':>9}{'LLM con':>9}")
+    totals = [0, 0, 0, 0]
+    for round_ in range(rounds):
+        for name, turns in CONVERSATIONS.items():
+            messages: list = []
+            patentes: list[str] = []
+            fast = calls_without = calls_with = 0
+            for i, (user, tool_calls, answer) in enumerate(turns):
+                t0 = time.perf_counter()
+                reply = fast_reply(classify(user), user, messages)
+                elapsed = time.perf_counter() - t0
+                # Sin el atajo: una llamada más una por ronda de herramientas
+                calls_without += 1 + bool(tool_calls)
+                if reply is not None:
+                    samples.append(elapsed)
+                    fast += 1
+                    messages.extend(reply.messages)
+                    continue
+                calls_with += 1 + bool(tool_calls)
+                messages.append(HumanMessage(content=user))
+                if tool_calls:
+                    call_msgs, results = [], []
+                    for j, (tool_name, args) in enumerate(tool_calls):
+                        args = _resolve(args, patentes)
+                        call_id = f"call_{name}_{i}_{j}"
+                        call_msgs.append({"name": tool_name, "args": args, "id": call_id})
+                        output = by_name[tool_name].invoke(args)
+                        results.append(ToolMessage(content=output, name=tool_name, tool_call_id=call_id))
+                        found = re.findall(r"(?:usados/|#)([A-Z0-9]{4,8})\b", output)
+                        if found and tool_name == "search_stock":
+                            patentes = found
+                    messages.append(AIMessage(content="", tool_calls=call_msgs))
+                    messages.extend(results)
+                messages.append(AIMessage(content=answer))
+            if round_ == 0:
+                print(f"{name:<24}{len(turns):>7}{fast:>7}{calls_without:>9}{calls_with:>9}")
+                for k, v in enumerate((len(turns), fast, calls_without, calls_with)):
+                    totals[k] += v
+    n = len(CONVERSATIONS)
+    print(f"{'total':<24}{totals[0]:>7}{totals[1]:>7}{totals[2]:>9}{totals[3]:>9}")
+    print(
+        f"LLM por conversación: {totals[2] / n:.1f} -> {totals[3] / n:.1f} "
+        f"({1 - totals[3] / totals[2]:.0%} menos)"
+    )
+    if not samples:
+        print("Ningún turno respondido por el atajo")
+        return 1
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[int(len(samples) * 0.99)] * 1000
+    print(f"latencia del atajo ({len(samples)} turnos): p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    from config import STOCK_FILE
+    from stock.repository import StockRepository
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from agent import tools
+
+        repo = StockRepository(str(Path(tmp) / "stock.db"))
+        repo.update_from_file(STOCK_FILE)
+        tools.set_repo(repo)
+        return _run(args.rounds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Latencia de agent.intent.classify sobre los mensajes del corpus dorado.
+
+Uso: python scripts/bench_intent.py [--rounds N]
+Informa p50/p99 por mensaje (µs) y el reparto por intención.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+GOLDEN = Path(__file__).with_name("intent_golden.jsonl")
+# Presupuesto por mensaje (µs), p99
+BUDGET_US = 50.0
+
+
+def main() -> int:
+    from agent.intent import classify
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    messages = [json.loads(line)["message"] for line in GOLDEN.read_text(encoding="utf-8").splitlines() if line.strip()]
+    samples = []
+    for _ in range(args.rounds):
+        for text in messages:
+            t0 = time.perf_counter()
+            classify(text)
+            samples.append(time.perf_counter() - t0)
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[int(len(samples) * 0.99)] * 1e6
+    kinds = Counter(classify(text).kind for text in messages)
+    print(f"{len(messages)} mensajes x {args.rounds}: p50 {p50:.1f} µs  p99 {p99:.1f} µs")
+    print("intenciones: " + ", ".join(f"{k} {n}" for k, n in kinds.most_common()))
+    return 0 if p99 <= BUDGET_US else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
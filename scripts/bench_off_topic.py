@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Precisión y latencia del clasificador local de off-topic (agent.topic_model) contra el LLM.
+
+Uso: python scripts/bench_off_topic.py [--llm] [--limit N]
+Validación cruzada (5 partes) sobre agent/off_topic_corpus.tsv: cada mensaje se puntúa con un
+modelo que no lo vio al entrenar. Informa precisión a 0.5, cobertura y precisión dentro de la
+banda configurada (lo que decide solo) y latencia por mensaje. Con --llm (requiere
+OPENAI_API_KEY) clasifica los mismos mensajes con el LLM actual y con el flujo combinado
+(local + LLM en la banda incierta).
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FOLDS = 5
+# Presupuesto del clasificador local por mensaje (ms), p99
+BUDGET_MS = 0.2
+
+
+def _percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[int(len(samples) * 0.99)] * 1000
+    return f"p50 {p50:.3f} ms  p99 {p99:.3f} ms"
+
+
+def main() -> int:
+    from agent.topic_model import TopicModel, get_model, load_corpus
+    from config import OFF_TOPIC_LOCAL_HIGH, OFF_TOPIC_LOCAL_LOW, OPENAI_API_KEY
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true", help="comparar con el clasificador LLM")
+    parser.add_argument("--limit", type=int, default=0, help="máximo de mensajes para --llm")
+    args = parser.parse_args()
+
+    examples = load_corpus()
+    random.Random(1).shuffle(examples)
+    scored: list[tuple[float, bool, str]] = []
+    for fold in range(FOLDS):
+        model = TopicModel.train([e for i, e in enumerate(examples) if i % FOLDS != fold])
+        scored += [(model.probability(text), label, text) for text, label in examples[fold::FOLDS]]
+
+    n = len(scored)
+    acc = sum((p >= 0.5) == label for p, label, _ in scored) / n
+    decided = [(p >= OFF_TOPIC_LOCAL_HIGH, label) for p, label, _ in scored if p >= OFF_TOPIC_LOCAL_HIGH or p <= OFF_TOPIC_LOCAL_LOW]
+    band_acc = sum(a == b for a, b in decided) / len(decided) if decided else 0.0
+    false_off = sum(1 for p, label, _ in scored if label and p <= OFF_TOPIC_LOCAL_LOW)
+    print(f"corpus: {n} mensajes ({sum(l for _, l, _ in scored)} autos), validación cruzada {FOLDS} partes")
+    print(f"local a 0.5:           precisión {acc:.3f}")
+    print(
+        f"local banda {OFF_TOPIC_LOCAL_LOW}-{OFF_TOPIC_LOCAL_HIGH}: decide {len(decided) / n:.1%}, precisión {band_acc:.3f}, "
+        f"autos marcados off-topic {false_off}"
+    )
+
+    model = get_model()
+    texts = [text for text, _ in examples]
+    samples = []
+    for _ in range(20):
+        for text in texts:
+            t0 = time.perf_counter()
+            model.probability(text)
+            samples.append(time.perf_counter() - t0)
+    print(f"latencia local:        {_percentiles(samples)}")
+    p99_ms = sorted(samples)[int(len(samples) * 0.99)] * 1000
+
+    if args.llm:
+        if not OPENAI_API_KEY:
+            print("--llm: falta OPENAI_API_KEY, se omite la comparación")
+        else:
+            from agent.off_topic import llm_is_automotive
+
+            subset = scored[: args.limit] if args.limit else scored
+            llm_ok = combined_ok = llm_calls = 0
+            llm_samples, combined_samples = [], []
+            for p, label, text in subset:
+                t0 = time.perf_counter()
+                verdict = llm_is_automotive(text)
+                llm_samples.append(time.perf_counter() - t0)
+                llm_ok += verdict == label
+                # Flujo combinado: el LLM solo en la banda incierta (su latencia ya medida arriba)
+                if p >= OFF_TOPIC_LOCAL_HIGH or p <= OFF_TOPIC_LOCAL_LOW:
+                    combined_ok += (p >= OFF_TOPIC_LOCAL_HIGH) == label
+                    combined_samples.append(0.0)
+                else:
+                    llm_calls += 1
+                    combined_ok += verdict == label
+                    combined_samples.append(llm_samples[-1])
+            m = len(subset)
+            print(f"LLM:                   precisión {llm_ok / m:.3f}  {_percentiles(llm_samples)}")
+            print(
+                f"local + LLM:           precisión {combined_ok / m:.3f}  {_percentiles(combined_samples)}  "
+                f"llamadas al LLM {llm_calls}/{m}"
+            )
+    return 0 if p99_ms <= BUDGET_MS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
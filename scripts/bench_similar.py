@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Mide el k-NN de vehículos similares (SimilarityIndex.nearest) con un stock de N filas.
+
+Uso: python scripts/bench_similar.py [N]   (por defecto 50000)
+Carga STOCK_FILE en una base temporal y replica sus filas hasta N (precio y km con ruido,
+ids nuevos): mismas marcas, segmentos, etc. que el stock real, con el volumen pedido.
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Presupuesto por consulta (ms), p99
+BUDGET_MS = 1.0
+
+
+def _replicate(index, n: int):
+    from stock.index import StockIndex, _EncodedColumn, _NumericColumn
+
+    rng = np.random.default_rng(0)
+    take = np.resize(np.arange(len(index)), n)
+    data = {}
+    for name, column in index.data.items():
+        if isinstance(column, _EncodedColumn):
+            data[name] = _EncodedColumn(np.asarray(column.codes)[take], column.values)
+        else:
+            array = np.asarray(column.array, dtype=np.float64)[take]
+            if name in ("precio", "kilometraje"):
+                array = array * rng.uniform(0.9, 1.1, n)
+            data[name] = _NumericColumn(array, integer=False)
+    data["id"] = _NumericColumn(np.arange(1, n + 1, dtype=np.float64), integer=True)
+    return StockIndex(data)
+
+
+def main() -> int:
+    from config import STOCK_FILE
+    from stock.repository import StockRepository
+    from stock.similar import SimilarityIndex
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = StockRepository(str(Path(tmp) / "stock.db"))
+        repo.update_from_file(STOCK_FILE)
+        index = repo.get_index()
+    similarity = SimilarityIndex(_replicate(index, n))
+    print(f"Matriz: {similarity.matrix.shape[0]} filas x {similarity.matrix.shape[1]} columnas (float32)")
+
+    rng = np.random.default_rng(0)
+    queries = similarity.matrix[rng.integers(0, n, 2000)].astype(np.float64)
+    for q in queries[:50]:
+        similarity.nearest(q, 5)
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        similarity.nearest(q, 5)
+        times.append((time.perf_counter() - t0) * 1000)
+    p50, p99 = np.percentile(times, [50, 99])
+    ok = p99 < BUDGET_MS
+    print(f"k=5: p50 {p50:.3f} ms, p99 {p99:.3f} ms ({'OK' if ok else 'FALLA'}: presupuesto {BUDGET_MS} ms)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Tokens de prompt por conversación con la salida de herramientas en modo normal vs compacto.
+
+Uso: python scripts/bench_tool_tokens.py
+Reproduce conversaciones típicas (llamadas reales a las herramientas sobre STOCK_FILE cargado en
+una base temporal) en cada modo (TOOL_OUTPUT_MODE=verbose / compact, un subproceso por modo) y
+suma lo que el LLM recibe en cada llamada: prompt del agente + historial completo, que es lo que
+el checkpointer reenvía en cada turno ("historial" es lo mismo sin el prompt del agente, la parte
+que depende de la salida de las herramientas). La respuesta del agente al cliente se aproxima con la
+salida en modo normal (igual en ambos modos). Cuenta con tiktoken si tiene el encoding del modelo
+disponible; si no, con la estimación de agent.output (~3 caracteres por token).
+"""
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# (mensaje del cliente, [(herramienta, argumentos)]) por turno
+CONVERSATIONS: dict[str, list[tuple[str, list[tuple[str, dict]]]]] = {
+    "suv_financiamiento": [
+        ("Hola, ¿qué autos tienen?", [("get_stock_summary", {})]),
+        ("Busco un SUV automático hasta 20 millones", [
+            ("search_stock", {"segmento": "Suv", "transmision": "Automatico", "precio_max": 20_000_000, "order_by_precio": "desc"}),
+        ]),
+        ("¿Y las cuotas con 5 millones de pie?", [("calculate_cuotas", {"pie": 5_000_000, "vehiculos": "$PATENTES"})]),
+        ("Muéstrame más", [("search_stock", {"cursor": "$CURSOR"})]),
+    ],
+    "pie_y_cuota": [
+        ("Tengo 4 millones de pie y puedo pagar 300 mil al mes", [
+            ("search_stock", {"pie": 4_000_000, "cuota_max": 300_000, "order_by_precio": "desc"}),
+        ]),
+        ("¿Algo parecido al primero?", [("similar_vehicles", {"vehiculo": "$PATENTE"})]),
+        ("Ok, me interesa. Soy Ana Pérez, ana@correo.cl", [("register_lead", {"nombre": "Ana Pérez", "correo": "ana@correo.cl", "notas": "bench"})]),
+    ],
+    "modelo_sin_stock": [
+        ("¿Tienen un Toyota Hilux?", [("search_stock", {"marca": "Toyota", "modelo": "Hilux"})]),
+        ("¿Y algo parecido?", [("similar_vehicles", {"modelo": "Toyota Hilux"})]),
+        ("¿Y camionetas diesel bajo 15 millones?", [
+            ("search_stock", {"segmento": "Camioneta", "combustible": "Diesel", "precio_max": 15_000_000, "order_by_precio": "desc", "limit": 8}),
+        ]),
+        ("¿Qué marcas hay?", [("get_stock_summary", {"facet": "marca"})]),
+    ],
+}
+
+
+def _resolve(args: dict, last: dict) -> dict:
+    out = {}
+    for key, value in args.items():
+        if value == "$PATENTES":
+            value = last.get("patentes", [])[:3]
+        elif value == "$PATENTE":
+            value = (last.get("patentes") or [""])[0]
+        elif value == "$CURSOR":
+            value = last.get("cursor", "")
+        out[key] = value
+    return out
+
+
+def run_mode() -> None:
+    """Subproceso: ejecuta las conversaciones y escribe (JSON en stdout) los mensajes de cada una."""
+    import re
+
+    from config import LEADS_DB_PATH, STOCK_FILE
+    from stock.repository import StockRepository
+
+    # register_lead escribe en LEADS_DB_PATH: solo una base temporal que puso main, nunca la real
+    if Path(tempfile.gettempdir()).resolve() not in Path(LEADS_DB_PATH).resolve().parents:
+        raise SystemExit(f"LEADS_DB_PATH={LEADS_DB_PATH} no es temporal; ejecuta el benchmark sin --run")
+    with tempfile.TemporaryDirectory() as tmp:
+        from agent import tools
+        from agent.builder import AGENT_PROMPT
+
+        repo = StockRepository(str(Path(tmp) / "stock.db"))
+        repo.update_from_file(STOCK_FILE)
+        tools.set_repo(repo)
+        by_name = {t.name: t for t in (
+            tools.search_stock, tools.get_stock_summary, tools.similar_vehicles,
+            tools.calculate_cuotas, tools.register_lead,
+        )}
+        result = {"prompt": AGENT_PROMPT, "conversations": {}}
+        for name, turns in CONVERSATIONS.items():
+            messages = []
+            last: dict = {}
+            for user, calls in turns:
+                messages.append(("user", user))
+                for tool_name, args in calls:
+                    args = _resolve(args, last)
+                    messages.append(("tool_call", json.dumps({"name": tool_name, "args": args}, ensure_ascii=False)))
+                    output = by_name[tool_name].invoke(args)
+                    messages.append(("tool", output))
+                    patentes = re.findall(r"(?:usados/|#)([A-Z0-9]{4,8})\b", output)
+                    if patentes:
+                        last["patentes"] = patentes
+                    cursor = re.search(r'cursor="([^"]+)"', output)
+                    if cursor:
+                        last["cursor"] = cursor.group(1)
+            result["conversations"][name] = messages
+        print(json.dumps(result, ensure_ascii=False))
+
+
+def _counter():
+    try:
+        import tiktoken
+
+        from config import OPENAI_MODEL
+
+        encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+        encoding.encode("prueba")
+        return (lambda text: len(encoding.encode(text))), f"tiktoken ({encoding.name})"
+    except Exception:
+        from agent.output import estimate_tokens
+
+        return estimate_tokens, "estimación ~3 caracteres/token (tiktoken sin encoding disponible)"
+
+
+def _prompt_tokens(count, prompt: str, messages: list[tuple[str, str]], replies: list[str]) -> tuple[int, int]:
+    """(tokens de prompt sumando cada llamada al LLM, los mismos sin el prompt del agente)."""
+    total = 0
+    calls = 0
+    prompt_tokens = count(prompt)
+    history = prompt_tokens
+    reply_iter = iter(replies)
+    for role, text in messages:
+        n = count(text) + 4  # + formato de mensaje
+        history += n
+        if role in ("user", "tool"):
+            # Una llamada al LLM por mensaje de cliente y por resultado de herramienta
+            total += history
+            calls += 1
+        if role == "tool":
+            # Respuesta del agente al cliente (aprox.: la salida en formato normal), entra al historial
+            history += count(next(reply_iter, "")) + 4
+    return total, total - calls * prompt_tokens
+
+
+def _print_row(name: str, verbose, compact) -> None:
+    history = f"{verbose[1]:,}/{compact[1]:,}"
+    print(
+        f"{name:<22}{verbose[0]:>10,}{compact[0]:>10,}{1 - compact[0] / verbose[0]:>8.0%}"
+        f"   {history:>26}{1 - compact[1] / verbose[1]:>8.0%}"
+    )
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run_mode()
+        return 0
+    runs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("verbose", "compact"):
+            # Los leads de prueba van a una base temporal: config la lee al importarse en el subproceso
+            env = {**os.environ, "TOOL_OUTPUT_MODE": mode, "LEADS_DB_PATH": str(Path(tmp) / f"leads-{mode}.db")}
+            out = subprocess.run([sys.executable, __file__, "--run"], env=env, capture_output=True, text=True, check=True)
+            runs[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+    count, how = _counter()
+    print(f"Conteo: {how}")
+    print(
+        f"Prompt del agente: normal {count(runs['verbose']['prompt']):,}, "
+        f"compacto {count(runs['compact']['prompt']):,} (incluye la leyenda del formato)\n"
+    )
+    print(f"{'conversación':<22}{'normal':>10}{'compacto':>10}{'ahorro':>8}   {'historial normal/compacto':>26}{'ahorro':>8}")
+    totals = {"verbose": [0, 0], "compact": [0, 0]}
+    for name in CONVERSATIONS:
+        replies = [text for role, text in runs["verbose"]["conversations"][name] if role == "tool"]
+        row = {}
+        for mode, run in runs.items():
+            row[mode] = _prompt_tokens(count, run["prompt"], run["conversations"][name], replies)
+            totals[mode][0] += row[mode][0]
+            totals[mode][1] += row[mode][1]
+        _print_row(name, row["verbose"], row["compact"])
+    _print_row("total", totals["verbose"], totals["compact"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,32 @@
 #!/usr/bin/env python3
-"""Actualiza el stock desde el archivo configurado (CSV/Excel)."""
+"""Actualiza el stock desde el archivo configurado (CSV/Excel).
+
+Con --snapshot además genera el snapshot binario (STOCK_SNAPSHOT_DIR) que usa el arranque en frío.
+"""
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from config import STOCK_FILE, STOCK_DB_PATH
+from config import STOCK_FILE, STOCK_DB_PATH, STOCK_SNAPSHOT_DIR
 from stock.repository import StockRepository
 
 
 def main() -> int:
     repo = StockRepository(STOCK_DB_PATH)
     repo.init_schema()
-    n = repo.update_from_file(STOCK_FILE)
-    print(f"Stock actualizado: {n} vehículos desde {STOCK_FILE}")
-    return 0 if n >= 0 else 1
+    diff = repo.sync_from_file(STOCK_FILE)
+    print(
+        f"Stock actualizado: {diff['total']} vehículos desde {STOCK_FILE} "
+        f"(nuevos {diff['inserted']}, modificados {diff['updated']}, "
+        f"eliminados {diff['deleted']}, sin cambios {diff['unchanged']})"
+    )
+    if "--snapshot" in sys.argv[1:]:
+        from stock.snapshot import build_snapshot
+
+        manifest = build_snapshot(STOCK_FILE, STOCK_SNAPSHOT_DIR)
+        print(f"Snapshot generado en {STOCK_SNAPSHOT_DIR}: {manifest['rows']} vehículos (formato v{manifest['format_version']})")
+    return 0 if diff["total"] >= 0 else 1
 
 
 if __name__ == "__main__":
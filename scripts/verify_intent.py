@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Verifica agent.intent.classify contra el corpus dorado scripts/intent_golden.jsonl.
+
+Cada línea: {"message": ..., "kind": ..., y los campos extraídos que no son None ni False}. Un
+campo ausente en la línea debe salir None (o False). Sale con código 1 si algún mensaje no coincide.
+"""
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+# Permitir importar desde la raíz del proyecto
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+GOLDEN = Path(__file__).with_name("intent_golden.jsonl")
+FIELDS = ("millions", "pie", "pie_pct", "plazo", "option", "rut", "email", "terms_only")
+
+
+def main() -> int:
+    from agent.intent import classify
+
+    bad = 0
+    lines = [json.loads(line) for line in GOLDEN.read_text(encoding="utf-8").splitlines() if line.strip()]
+    for case in lines:
+        intent = classify(case["message"])
+        expected = {"kind": case["kind"], **{f: case[f] for f in FIELDS if f in case}}
+        got = {"kind": intent.kind, **{f: getattr(intent, f) for f in FIELDS if getattr(intent, f) not in (None, False)}}
+        if got != expected:
+            bad += 1
+            diff = {k: (expected.get(k), got.get(k)) for k in expected.keys() | got.keys() if expected.get(k) != got.get(k)}
+            print(f"  {case['message']!r}: esperado/obtenido {diff}")
+    print(f"{len(lines)} mensajes, bad {bad}")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
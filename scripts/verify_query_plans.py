@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Verifica con EXPLAIN QUERY PLAN que las búsquedas SQL de stock usan índices (sin SCAN de tabla completa).
+
+Los casos de una sola clave por filtro además deben salir ya ordenados por el índice (sin TEMP B-TREE);
+marca y modelo buscan por subcadena: si el modelo calza varias claves ("208" -> 208, NUEVO 208) SQLite
+recorre el índice de la marca en orden de precio y filtra el modelo.
+
+Uso: python scripts/verify_query_plans.py
+Carga STOCK_FILE en una base temporal, así no toca la base real.
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# (filtros de search, índice que debe usar el plan, ¿sin TEMP B-TREE?)
+CASES = [
+    ({"segmento": "Suv", "precio_max": 20_000_000, "order_by_precio": "desc"}, "idx_vehiculos_segmento_precio", True),
+    ({"segmento": "pickup"}, "idx_vehiculos_segmento_precio", True),
+    ({"combustible": "Diesel", "precio_max": 15_000_000}, "idx_vehiculos_combustible_precio", True),
+    ({"segmento": "suv", "transmision": "AT", "precio_max": 20_000_000}, "idx_vehiculos_segmento_transmision_precio", True),
+    ({"transmision": "mecánico"}, "idx_vehiculos_transmision_precio", True),
+    ({"marca": "Peugeot"}, "idx_vehiculos_marca_precio", True),
+    ({"marca": "Peugeot", "modelo": "3008"}, "idx_vehiculos_marca_modelo_precio", True),
+    ({"marca": "Peugeot", "modelo": "208"}, "idx_vehiculos_marca_precio", True),
+    ({"modelo": "zs"}, "idx_vehiculos_modelo_precio", True),
+    ({"precio_min": 10_000_000, "precio_max": 20_000_000}, "idx_vehiculos_precio", True),
+]
+
+
+def main() -> int:
+    from config import STOCK_FILE
+    from stock.repository import StockRepository
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = StockRepository(str(Path(tmp) / "stock.db"), use_index=False)
+        n = repo.update_from_file(STOCK_FILE)
+        print(f"Stock de prueba: {n} vehículos desde {STOCK_FILE}\n")
+        for filters, expected, ordered in CASES:
+            plan = repo.explain_search(**filters)
+            ok = any(f"USING INDEX {expected} " in step or step.endswith(f"USING INDEX {expected}") for step in plan)
+            ok = ok and not any(step.startswith("SCAN vehiculos") and "INDEX" not in step for step in plan)
+            ok = ok and not (ordered and any("TEMP B-TREE" in step for step in plan))
+            failures += not ok
+            print(f"{'OK   ' if ok else 'FALLA'} {filters}")
+            for step in plan:
+                print(f"        {step}")
+    print(f"\n{len(CASES) - failures}/{len(CASES)} consultas usan el índice esperado.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
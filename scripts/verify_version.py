@@ -42,10 +42,10 @@ def main() -> None:
     n = repo.update_from_file(STOCK_FILE)
     print(f"Registros cargados en DB: {n}")
     rows = repo.search(limit=5)
-    with_ver_db = sum(1 for r in rows if (r.get("version") or "").strip())
+    with_ver_db = sum(1 for r in rows if (r.version or "").strip())
     print(f"De los primeros 5 en búsqueda, con 'version' no vacía: {with_ver_db}/5")
     for i, r in enumerate(rows[:3], 1):
-        print(f"  Fila {i}: version = {repr(r.get('version'))} | {r.get('marca')} {r.get('modelo')}")
+        print(f"  Fila {i}: version = {r.version!r} | {r.marca} {r.modelo}")
     # Conteo global en DB
     with repo._conn() as conn:
         total = conn.execute("SELECT COUNT(*) FROM vehiculos").fetchone()[0]
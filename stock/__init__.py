@@ -1,5 +1,8 @@
 """Módulo de gestión de stock de vehículos."""
+from stock.cache import SearchCache
+from stock.index import StockIndex
 from stock.parser import parse_stock_file
 from stock.repository import StockRepository
+from stock.vehicle import Vehicle
 
-__all__ = ["parse_stock_file", "StockRepository"]
+__all__ = ["parse_stock_file", "SearchCache", "StockIndex", "StockRepository", "Vehicle"]
@@ -0,0 +1,151 @@
+"""Cache de resultados de búsqueda de stock (LRU + TTL), invalidado por versión del stock.
+
+Las conversaciones repiten las mismas búsquedas ("SUV automático hasta 20 millones" al pedir
+financiamiento, "muéstrame de nuevo", o distintos clientes con el mismo presupuesto). La clave es
+la búsqueda canónica (claves normalizadas, números como float, limit y orden) más la
+versión del stock: cuando un sync cambia datos la versión sube y las entradas viejas dejan de
+calzar y salen por LRU, sin barridos.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from stock.financing import normalize_plazo
+from stock.fulltext import fts_query
+from stock.normalize import fold, normalize_key
+from stock.vehicle import projection
+
+# Topes numéricos y pie: van tal cual a la consulta y a la clave. Redondear un tope a un tramo
+# cambia el resultado (el kilometraje del stock no viene en miles), y un tramo más amplio filtrado
+# después no sirve con limit: el top-k del tramo no contiene el del tope exacto. El pie cambia las cuotas.
+_EXACT_FLOATS = ("precio_min", "precio_max", "km_max", "pie")
+
+# Columna cuya normalización usa cada filtro de texto
+_KEY_FILTERS = {
+    "marca": "marca",
+    "modelo": "modelo",
+    "segmento": "segmento",
+    "transmision": "transmision",
+    "combustible": "combustible",
+    "exclude_marca": "marca",
+    "exclude_modelo": "modelo",
+    "exclude_combustible": "combustible",
+}
+
+
+def canonical_search(**params: Any) -> tuple[dict[str, Any], tuple]:
+    """Parámetros de search canonizados y la clave de cache que les corresponde (sin la versión).
+
+    Devuelve (kwargs para StockRepository.search, clave). Filtros vacíos se descartan; el texto
+    libre entra a la clave como su expresión FTS, que es lo único que usa la búsqueda.
+    """
+    kwargs: dict[str, Any] = {}
+    key: list[tuple[str, Any]] = []
+    for name, value in params.items():
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if name in _KEY_FILTERS:
+            value = normalize_key(_KEY_FILTERS[name], value)
+            if not value:
+                continue
+            kwargs[name] = value
+            key.append((name, value))
+        elif name == "texto":
+            kwargs[name] = value
+            key.append((name, fts_query(value)))
+        elif name == "order_by_precio":
+            value = "desc" if fold(value) == "desc" else "asc"
+            kwargs[name] = value
+            key.append((name, value))
+        elif name == "after":
+            precio, row_id = value
+            value = (None if precio is None else float(precio), int(row_id))
+            kwargs[name] = value
+            key.append((name, value))
+        elif name == "columns":
+            value = projection(value)
+            kwargs[name] = value
+            key.append((name, value))
+        elif name == "cuota_max":
+            # Las cuotas van redondeadas a la milésima: cuota <= C equivale a cuota <= piso(C)
+            value = int(float(value) // 1000) * 1000
+            kwargs[name] = value
+            key.append((name, value))
+        elif name == "plazo":
+            value = normalize_plazo(int(value))
+            kwargs[name] = value
+            key.append((name, value))
+        elif name in _EXACT_FLOATS:
+            value = float(value)
+            kwargs[name] = value
+            key.append((name, value))
+        else:
+            value = int(value)
+            kwargs[name] = value
+            key.append((name, value))
+    return kwargs, tuple(sorted(key))
+
+
+class SearchCache:
+    """LRU acotado con TTL y contadores (hits, misses, evictions, expired) para dimensionarlo."""
+
+    def __init__(self, maxsize: int = 512, ttl: float = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Guarda `value`; `ttl` propio para esta entrada (por defecto el del cache)."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
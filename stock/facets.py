@@ -0,0 +1,104 @@
+"""Resumen materializado del stock: totales y conteos por faceta (segmento, marca, combustible, etc.).
+
+Se calcula una vez por índice (es decir, una vez por carga o sync del stock) con operaciones
+vectorizadas sobre los códigos del StockIndex, y se sirve desde memoria a get_stock_summary.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+from stock.index import StockIndex
+
+# Facetas de texto: nombre -> (columna de agrupación, columna con la etiqueta a mostrar)
+_TEXT_FACETS = {
+    "segmento": ("segmento_key", "segmento"),
+    "marca": ("marca_key", "marca"),
+    "combustible": ("combustible_key", "combustible"),
+    "transmision": ("transmision_key", "transmision"),
+    "sucursal": ("sucursal", "sucursal"),
+}
+
+# Cortes de los tramos de precio en pesos ("hasta 8M", "8M - 12M", ..., "más de 40M")
+PRICE_BANDS = (8_000_000, 12_000_000, 16_000_000, 20_000_000, 25_000_000, 30_000_000, 40_000_000)
+
+FACETS = tuple(_TEXT_FACETS) + ("precio",)
+
+
+def _millions(value: float) -> str:
+    return f"${value / 1_000_000:g}M"
+
+
+def _band_labels() -> list[str]:
+    labels = [f"Hasta {_millions(PRICE_BANDS[0])}"]
+    labels += [f"{_millions(lo)} - {_millions(hi)}" for lo, hi in zip(PRICE_BANDS, PRICE_BANDS[1:])]
+    labels.append(f"Más de {_millions(PRICE_BANDS[-1])}")
+    return labels
+
+
+def _group(codes: np.ndarray, n_groups: int, precio: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Conteo y precio mínimo/máximo por código (los NULL de precio no cuentan para min/max)."""
+    counts = np.bincount(codes, minlength=n_groups)
+    low = np.full(n_groups, np.inf)
+    high = np.full(n_groups, -np.inf)
+    np.fmin.at(low, codes, precio)
+    np.fmax.at(high, codes, precio)
+    return counts, low, high
+
+
+def _entry(label: str, total: int, low: float, high: float) -> dict[str, Any]:
+    finite = np.isfinite(low)
+    return {
+        "valor": label,
+        "total": int(total),
+        "precio_min": float(low) if finite else None,
+        "precio_max": float(high) if finite else None,
+    }
+
+
+def compute_summary(index: StockIndex) -> dict[str, Any]:
+    """{total, precio_min, precio_max, año_min, año_max, facets: {faceta: [{valor, total, precio_min, precio_max}]}}."""
+    total = len(index)
+    if total == 0:
+        return {"total": 0, "precio_min": None, "precio_max": None, "año_min": None, "año_max": None, "facets": {}}
+    precio = np.asarray(index.precio)
+    año = np.asarray(index.año)
+    has_precio = ~np.isnan(precio)
+    has_año = ~np.isnan(año)
+    summary: dict[str, Any] = {
+        "total": total,
+        "precio_min": float(precio[has_precio].min()) if has_precio.any() else None,
+        "precio_max": float(precio[has_precio].max()) if has_precio.any() else None,
+        "año_min": int(año[has_año].min()) if has_año.any() else None,
+        "año_max": int(año[has_año].max()) if has_año.any() else None,
+    }
+
+    facets: dict[str, list[dict[str, Any]]] = {}
+    positions = np.arange(total)
+    for name, (group_column, label_column) in _TEXT_FACETS.items():
+        group = index.data.get(group_column)
+        labels = index.data.get(label_column)
+        if group is None or labels is None:
+            continue
+        codes = np.asarray(group.codes)
+        counts, low, high = _group(codes, len(group.values), precio)
+        # Etiqueta: el valor original de la primera fila de cada grupo (ej. "Suv" para la clave "suv")
+        first = np.full(len(group.values), total)
+        np.minimum.at(first, codes, positions)
+        entries = []
+        for code, key in enumerate(group.values):
+            if not counts[code] or not (key or "").strip():
+                continue
+            label = (labels.value(int(first[code])) or key).strip()
+            entries.append(_entry(label, counts[code], low[code], high[code]))
+        entries.sort(key=lambda e: (-e["total"], e["valor"]))
+        facets[name] = entries
+
+    bands = np.searchsorted(np.asarray(PRICE_BANDS, dtype=np.float64), precio[has_precio], side="left")
+    counts, low, high = _group(bands, len(PRICE_BANDS) + 1, precio[has_precio])
+    facets["precio"] = [
+        _entry(label, counts[i], low[i], high[i]) for i, label in enumerate(_band_labels()) if counts[i]
+    ]
+    summary["facets"] = facets
+    return summary
@@ -0,0 +1,73 @@
+"""Cálculo de cuotas sobre el stock (mismas reglas que las herramientas de financiamiento del agente).
+
+Cuota = (precio - pie usado) × factor(plazo), redondeada hacia abajo a la milésima, con el pie
+acotado entre 30% y 50% del precio. Para un pie fijo la cuota crece con el precio, así que
+"cuota <= cuota_max" equivale a "precio < tope": el filtro por cuota se resuelve como un tope
+de precio que aprovecha los mismos índices (en SQLite y en StockIndex) que precio_max.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from config import (
+    FINANCIAMIENTO_PIE_MAX,
+    FINANCIAMIENTO_PIE_MIN,
+    FINANCIAMIENTO_PLAZOS,
+    FINANCIAMIENTO_TASA_MENSUAL,
+)
+
+DEFAULT_PLAZO = 36
+
+
+def factor_cuota(num_cuotas: int) -> float:
+    """Factor para cuota: cuota = monto_financiar * factor. Para inverso: monto_max = cuota_deseada / factor."""
+    r = FINANCIAMIENTO_TASA_MENSUAL
+    n = num_cuotas
+    if r <= 0 or n <= 0:
+        return 0.0
+    return (r * (1 + r) ** n) / ((1 + r) ** n - 1)
+
+
+# Factores por plazo (mismo orden que FINANCIAMIENTO_PLAZOS), calculados una vez
+FACTORES = np.array([factor_cuota(n) for n in FINANCIAMIENTO_PLAZOS], dtype=np.float64)
+_FACTOR_BY_PLAZO = dict(zip(FINANCIAMIENTO_PLAZOS, FACTORES.tolist()))
+
+
+def normalize_plazo(plazo: int | None) -> int:
+    return plazo if plazo in _FACTOR_BY_PLAZO else DEFAULT_PLAZO
+
+
+def pie_usado(precios: np.ndarray, pie: float) -> np.ndarray:
+    """Pie de la simulación por vehículo: el del cliente acotado a 30%-50% del precio."""
+    return np.clip(pie, precios * FINANCIAMIENTO_PIE_MIN, precios * FINANCIAMIENTO_PIE_MAX)
+
+
+def cuota_matrix(precios: np.ndarray, pie: float) -> tuple[np.ndarray, np.ndarray]:
+    """(pie usado, cuotas) con cuotas[i, j] = cuota del precio i en FINANCIAMIENTO_PLAZOS[j]."""
+    pie_efectivo = pie_usado(precios, pie)
+    monto = precios - pie_efectivo
+    cuotas = np.floor(monto[:, None] * FACTORES[None, :] / 1000) * 1000
+    return pie_efectivo, cuotas
+
+
+def cuotas(precios: np.ndarray, pie: float, plazo: int) -> tuple[np.ndarray, np.ndarray]:
+    """(pie usado, cuota) por vehículo para un plazo."""
+    pie_efectivo = pie_usado(precios, pie)
+    cuota = np.floor((precios - pie_efectivo) * _FACTOR_BY_PLAZO[normalize_plazo(plazo)] / 1000) * 1000
+    return pie_efectivo, cuota
+
+
+def precio_tope_for_cuota(cuota_max: float, pie: float, plazo: int) -> float:
+    """Precio p* tal que cuota(p) <= cuota_max exactamente cuando p < p* (cuota redondeada a la milésima)."""
+    factor = _FACTOR_BY_PLAZO[normalize_plazo(plazo)]
+    pie = max(float(pie or 0), 0.0)
+    # cuota <= C  <=>  monto * factor < 1000 * (floor(C / 1000) + 1)
+    monto_tope = 1000 * (np.floor(cuota_max / 1000) + 1) / factor
+    # monto(p) por tramos según dónde cae el pie: 50% (pie alto), p - pie, o 70% (pie bajo)
+    p = monto_tope / (1 - FINANCIAMIENTO_PIE_MAX)
+    if pie >= p * FINANCIAMIENTO_PIE_MAX:
+        return float(p)
+    p = monto_tope + pie
+    if pie >= p * FINANCIAMIENTO_PIE_MIN:
+        return float(p)
+    return float(monto_tope / (1 - FINANCIAMIENTO_PIE_MIN))
@@ -0,0 +1,83 @@
+"""Búsqueda de texto libre (FTS5) sobre marca, modelo y versión del stock.
+
+La versión trae el detalle que piden los clientes ("1.2 puretech", "4x4", "AT") y
+no tiene columna propia. vehiculos_fts es una tabla FTS5 de contenido externo
+(content=vehiculos) que se mantiene sola con triggers, así que la sincronización
+incremental de StockRepository la deja al día sin pasos extra.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+
+from stock.normalize import fold
+
+# unicode61 sin tildes ("automático" = "automatico"); "." une "1.2" en un solo token.
+# Índices de prefijo de 2 y 3 caracteres para consultas "pure*" sin recorrer todo el vocabulario.
+_FTS_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS vehiculos_fts USING fts5(
+        marca, modelo, version,
+        content='vehiculos', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2 tokenchars '.'",
+        prefix='2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS vehiculos_fts_ai AFTER INSERT ON vehiculos BEGIN
+        INSERT INTO vehiculos_fts(rowid, marca, modelo, version)
+        VALUES (new.id, new.marca, new.modelo, new.version);
+    END;
+    CREATE TRIGGER IF NOT EXISTS vehiculos_fts_ad AFTER DELETE ON vehiculos BEGIN
+        INSERT INTO vehiculos_fts(vehiculos_fts, rowid, marca, modelo, version)
+        VALUES ('delete', old.id, old.marca, old.modelo, old.version);
+    END;
+    CREATE TRIGGER IF NOT EXISTS vehiculos_fts_au AFTER UPDATE OF marca, modelo, version ON vehiculos BEGIN
+        INSERT INTO vehiculos_fts(vehiculos_fts, rowid, marca, modelo, version)
+        VALUES ('delete', old.id, old.marca, old.modelo, old.version);
+        INSERT INTO vehiculos_fts(rowid, marca, modelo, version)
+        VALUES (new.id, new.marca, new.modelo, new.version);
+    END;
+"""
+
+# bm25 con más peso a marca/modelo que a la versión
+FTS_RANK = "bm25(vehiculos_fts, 4.0, 4.0, 1.0)"
+
+# Palabras del cliente que no aportan al match
+_STOPWORDS = {"de", "del", "la", "el", "los", "las", "un", "una", "con", "y", "o", "en", "para", "que", "mas", "modelo", "version"}
+
+# Término del cliente -> cómo aparece en las versiones del stock
+_TERM_SYNONYMS = {
+    "automatico": ("at", "dct", "cvt", "amt", "automatico"),
+    "automatica": ("at", "dct", "cvt", "amt", "automatico"),
+    "mecanico": ("mt", "mecanico"),
+    "mecanica": ("mt", "mecanico"),
+    "manual": ("mt", "mecanico"),
+    "4x4": ("4x4", "4wd", "awd"),
+    "4wd": ("4x4", "4wd", "awd"),
+}
+
+_TOKEN = re.compile(r"[0-9a-zñ][0-9a-zñ.\-]*")
+
+
+def create_fts(conn: sqlite3.Connection) -> None:
+    """Crea la tabla FTS y sus triggers; si es nueva y ya hay stock, la indexa completa."""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vehiculos_fts'"
+    ).fetchone()
+    conn.executescript(_FTS_DDL)
+    if not existed:
+        conn.execute("INSERT INTO vehiculos_fts(vehiculos_fts) VALUES ('rebuild')")
+
+
+def fts_query(texto: str | None) -> str | None:
+    """Texto del cliente -> expresión MATCH de FTS5 (todos los términos, por prefijo). None si no queda nada."""
+    terms = []
+    for word in _TOKEN.findall(fold(texto)):
+        word = word.strip(".-")
+        if not word or word in _STOPWORDS:
+            continue
+        synonyms = _TERM_SYNONYMS.get(word)
+        if synonyms:
+            terms.append("(" + " OR ".join(f'"{s}"' for s in synonyms) + ")")
+        else:
+            # Entre comillas: FTS5 lo tokeniza igual que el documento ("cx-5" -> frase cx 5)
+            terms.append(f'"{word}"*')
+    return " AND ".join(terms) if terms else None
@@ -0,0 +1,325 @@
+"""Índice columnar en memoria (NumPy) para búsquedas de stock sin tocar disco.
+
+Carga la tabla vehiculos una sola vez en arreglos por columna: id, precio, año y
+kilometraje numéricos (NaN = NULL) y el resto de columnas de texto codificadas por
+diccionario (incluidas las claves normalizadas *_key que usan los filtros). Las
+filas se guardan ya ordenadas por (precio, id), así que los filtros de
+StockRepository.search se evalúan como máscaras booleanas vectorizadas y el top-k
+es tomar las primeras posiciones verdaderas, sin ordenar en cada búsqueda.
+
+Como todo son arreglos + diccionarios, el índice se puede guardar en disco
+(save) y volver a abrir con memory-map (load) sin reconstruirlo desde SQLite.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from stock.normalize import KEY_COLUMNS, normalize_key
+from stock.vehicle import ALL_COLUMNS, Vehicle, projection
+
+# Columnas numéricas (float64 con NaN = NULL); las enteras se devuelven como int
+_INT_COLUMNS = ("id", "año")
+_REAL_COLUMNS = ("precio", "kilometraje")
+# Lo que se carga en memoria: los campos de Vehicle y las claves de los filtros (raw_json queda en SQLite)
+_INDEX_COLUMNS = ALL_COLUMNS + tuple(f"{c}_key" for c in KEY_COLUMNS)
+
+
+class _NumericColumn:
+    __slots__ = ("array", "integer")
+
+    def __init__(self, array: np.ndarray, integer: bool):
+        self.array = array
+        self.integer = integer
+
+    @classmethod
+    def from_values(cls, values: list[Any], integer: bool) -> _NumericColumn:
+        array = np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+        return cls(array, integer)
+
+    def value(self, i: int) -> Any:
+        v = float(self.array[i])
+        if v != v:  # NaN = NULL
+            return None
+        return int(v) if self.integer else v
+
+
+class _EncodedColumn:
+    """Columna de texto como códigos int32 + diccionario de valores únicos (None incluido)."""
+
+    __slots__ = ("codes", "values", "_lookup")
+
+    def __init__(self, codes: np.ndarray, values: list[Any]):
+        self.codes = codes
+        self.values = values
+        self._lookup: dict[Any, int] | None = None
+
+    @classmethod
+    def from_values(cls, raw: list[Any]) -> _EncodedColumn:
+        lookup: dict[Any, int] = {}
+        codes = np.empty(len(raw), dtype=np.int32)
+        for i, v in enumerate(raw):
+            codes[i] = lookup.setdefault(v, len(lookup))
+        column = cls(codes, list(lookup))
+        column._lookup = lookup
+        return column
+
+    def value(self, i: int) -> Any:
+        return self.values[self.codes[i]]
+
+    def equals(self, key: str) -> np.ndarray:
+        if self._lookup is None:
+            self._lookup = {v: code for code, v in enumerate(self.values)}
+        code = self._lookup.get(key)
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+    def startswith(self, prefix: str) -> np.ndarray:
+        """Equivalente a key >= prefix AND key < cota: se evalúa sobre el diccionario, no fila a fila."""
+        return self._where([code for code, v in enumerate(self.values) if v and v.startswith(prefix)])
+
+    def contains(self, sub: str) -> np.ndarray:
+        """Filas cuyo valor contiene `sub` (LIKE '%sub%'), también evaluado sobre el diccionario."""
+        return self._where([code for code, v in enumerate(self.values) if v and sub in v])
+
+    def _where(self, matches: list[int]) -> np.ndarray:
+        if len(matches) == 1:
+            return self.codes == matches[0]
+        lut = np.zeros(len(self.values), dtype=bool)
+        lut[matches] = True
+        return lut[self.codes]
+
+
+class StockIndex:
+    """Snapshot inmutable de vehiculos para búsquedas vectorizadas."""
+
+    def __init__(self, data: dict[str, _NumericColumn | _EncodedColumn]):
+        """`data` por columna, con filas ordenadas por (precio, id) y NULL primero, como ORDER BY precio, id."""
+        self.columns = list(data)
+        self.data = data
+        self.ids = data["id"].array.astype(np.int64)
+        self.precio = data["precio"].array
+        self.año = data["año"].array
+        self.kilometraje = data["kilometraje"].array
+        self.encoded = {c: data[f"{c}_key"] for c in KEY_COLUMNS}
+        # Clave de orden (NULL primero, como SQLite en ASC); queda ordenada ascendente
+        self.precio_key = np.where(np.isnan(self.precio), -np.inf, self.precio)
+        # ids ordenados -> posición, para ubicar filas por id (resultados FTS, etc.)
+        self._by_id = np.argsort(self.ids, kind="stable")
+        self._sorted_ids = self.ids[self._by_id]
+
+    @classmethod
+    def from_conn(cls, conn: sqlite3.Connection) -> StockIndex:
+        cur = conn.execute(f"SELECT {', '.join(_INDEX_COLUMNS)} FROM vehiculos ORDER BY precio, id")
+        columns = [d[0] for d in cur.description]
+        by_column = list(zip(*cur.fetchall())) or [()] * len(columns)
+        data: dict[str, _NumericColumn | _EncodedColumn] = {}
+        for name, values in zip(columns, by_column):
+            if name in _INT_COLUMNS or name in _REAL_COLUMNS:
+                data[name] = _NumericColumn.from_values(list(values), integer=name in _INT_COLUMNS)
+            else:
+                data[name] = _EncodedColumn.from_values(list(values))
+        return cls(data)
+
+    def save(self, directory: str | Path) -> None:
+        """Guarda el índice como un .npy por columna + diccionarios en JSON (para load con mmap)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        dictionaries: dict[str, list[Any]] = {}
+        kinds: dict[str, str] = {}
+        for name, column in self.data.items():
+            if isinstance(column, _NumericColumn):
+                np.save(directory / f"{name}.npy", column.array)
+                kinds[name] = "int" if column.integer else "real"
+            else:
+                np.save(directory / f"{name}.npy", column.codes)
+                dictionaries[name] = column.values
+                kinds[name] = "text"
+        meta = {"columns": self.columns, "kinds": kinds, "dictionaries": dictionaries}
+        (directory / "index.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, directory: str | Path, mmap: bool = True) -> StockIndex:
+        """Abre un índice guardado con save; con mmap los arreglos se leen del archivo bajo demanda."""
+        directory = Path(directory)
+        meta = json.loads((directory / "index.json").read_text(encoding="utf-8"))
+        mode = "r" if mmap else None
+        data: dict[str, _NumericColumn | _EncodedColumn] = {}
+        for name in meta["columns"]:
+            array = np.load(directory / f"{name}.npy", mmap_mode=mode)
+            kind = meta["kinds"][name]
+            if kind == "text":
+                data[name] = _EncodedColumn(array, meta["dictionaries"][name])
+            else:
+                data[name] = _NumericColumn(array, integer=kind == "int")
+        return cls(data)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def mask(
+        self,
+        *,
+        precio_min: float | None = None,
+        precio_max: float | None = None,
+        año_min: int | None = None,
+        año_max: int | None = None,
+        km_max: float | None = None,
+        marca: str | None = None,
+        modelo: str | None = None,
+        segmento: str | None = None,
+        transmision: str | None = None,
+        combustible: str | None = None,
+        exclude_marca: str | None = None,
+        exclude_modelo: str | None = None,
+        exclude_combustible: str | None = None,
+        terms: dict[tuple[str, Any], np.ndarray] | None = None,
+    ) -> np.ndarray:
+        """Máscara booleana con la misma semántica que los filtros SQL de StockRepository.search.
+
+        `terms`: máscaras por filtro ((nombre, valor) -> máscara) que se reutilizan y completan; así
+        varios juegos de filtros parecidos (los peldaños de stock.relax) recorren cada columna una vez.
+        """
+        m = np.ones(len(self.ids), dtype=bool)
+        filters = (
+            ("exclude_marca", exclude_marca), ("exclude_modelo", exclude_modelo),
+            ("exclude_combustible", exclude_combustible), ("precio_min", precio_min), ("precio_max", precio_max),
+            ("año_min", año_min), ("año_max", año_max), ("km_max", km_max), ("segmento", segmento),
+            ("transmision", transmision), ("combustible", combustible), ("marca", marca), ("modelo", modelo),
+        )
+        for name, value in filters:
+            if value is None:
+                continue
+            term = None if terms is None else terms.get((name, value))
+            if term is None:
+                term = self._term(name, value)
+                if terms is not None:
+                    terms[(name, value)] = term
+            if term is not True:
+                m &= term
+        return m
+
+    def _term(self, name: str, value: Any) -> np.ndarray | bool:
+        """Máscara de un solo filtro de mask; True si no filtra (clave normalizada vacía)."""
+        if name == "precio_min":
+            return self.precio >= value
+        if name == "precio_max":
+            return self.precio <= value
+        if name == "año_min":
+            return self.año >= value
+        if name == "año_max":
+            return self.año <= value
+        if name == "km_max":
+            return np.isnan(self.kilometraje) | (self.kilometraje <= value)
+        exclude = name.startswith("exclude_")
+        col = name.removeprefix("exclude_")
+        key = normalize_key(col, value)
+        if not key:
+            return True
+        if exclude:
+            return ~self.encoded[col].equals(key)
+        if col in ("marca", "modelo"):
+            return self.encoded[col].contains(key)
+        return self.encoded[col].equals(key)
+
+    def top_k(
+        self,
+        mask: np.ndarray,
+        limit: int,
+        order_by_precio: str = "asc",
+        after: tuple[float | None, int] | None = None,
+    ) -> np.ndarray:
+        """Posiciones de las `limit` primeras filas de la máscara en orden (precio, id); limit < 0 = todas.
+
+        En "desc" es el orden inverso exacto (precio DESC, id DESC), igual que el recorrido
+        hacia atrás del índice en SQLite. `after` = (precio, id) de la última fila ya vista:
+        se continúa justo después de ella (paginación por keyset), sin recorrer lo anterior.
+        """
+        desc = (order_by_precio or "").strip().lower() == "desc"
+        if after is None:
+            positions = np.flatnonzero(mask)
+            if desc:
+                positions = positions[::-1]
+        elif desc:
+            end = self.keyset_bound(after, inclusive=False)
+            positions = np.flatnonzero(mask[:end])[::-1]
+        else:
+            start = self.keyset_bound(after, inclusive=True)
+            positions = np.flatnonzero(mask[start:]) + start
+        return positions if limit < 0 else positions[:limit]
+
+    def keyset_bound(self, after: tuple[float | None, int], inclusive: bool) -> int:
+        """Cantidad de filas con (precio, id) < after (o <= si inclusive); las filas están ordenadas así."""
+        precio, row_id = after
+        key = -np.inf if precio is None else float(precio)
+        lo = int(np.searchsorted(self.precio_key, key, side="left"))
+        hi = int(np.searchsorted(self.precio_key, key, side="right"))
+        # Dentro de un mismo precio las filas van por id ascendente
+        return lo + int(np.searchsorted(self.ids[lo:hi], row_id, side="right" if inclusive else "left"))
+
+    def positions_where(self, column: str, value: Any) -> np.ndarray:
+        """Posiciones (en orden precio, id) de las filas cuyo valor en una columna de texto es `value`."""
+        return np.flatnonzero(self.data[column].equals(value))
+
+    def positions_of(self, ids: np.ndarray) -> np.ndarray:
+        """Posiciones de los ids dados; -1 para ids que no están en el índice."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        at = np.searchsorted(self._sorted_ids, ids).clip(0, len(self.ids) - 1)
+        return np.where(self._sorted_ids[at] == ids, self._by_id[at], -1)
+
+    def top_k_ranked(
+        self,
+        mask: np.ndarray,
+        ranked: list[tuple[int, float]],
+        limit: int,
+        order_by_precio: str = "asc",
+    ) -> np.ndarray:
+        """Como top_k pero solo filas de `ranked` (id, bm25), ordenadas por relevancia y luego por (precio, id)."""
+        if not ranked:
+            return np.empty(0, dtype=np.int64)
+        ids, scores = zip(*ranked)
+        positions = self.positions_of(np.array(ids))
+        scores = np.array(scores, dtype=np.float64)
+        keep = positions >= 0
+        keep[keep] = mask[positions[keep]]
+        positions, scores = positions[keep], scores[keep]
+        # Las posiciones ya siguen el orden (precio, id): sirven de desempate
+        tie = -positions if (order_by_precio or "").strip().lower() == "desc" else positions
+        positions = positions[np.lexsort((tie, scores))]
+        return positions if limit < 0 else positions[:limit]
+
+    def records(self, positions: np.ndarray, columns: tuple[str, ...] | None = None) -> list[Vehicle]:
+        """Vehículos de las posiciones dadas con las columnas de la proyección; solo se decodifican esas filas."""
+        items = [(name, self.data[name]) for name in projection(columns)]
+        return [Vehicle(**{name: column.value(i) for name, column in items}) for i in positions.tolist()]
+
+    def search(
+        self,
+        *,
+        limit: int = 50,
+        order_by_precio: str = "asc",
+        ranked: list[tuple[int, float]] | None = None,
+        after: tuple[float | None, int] | None = None,
+        offset: int = 0,
+        columns: tuple[str, ...] | None = None,
+        **filters: Any,
+    ) -> list[Vehicle]:
+        """`ranked`: resultados FTS (id, bm25) para restringir y ordenar por relevancia; None = sin texto.
+
+        Páginas siguientes: `after` (precio, id) de la última fila vista (keyset, sin texto) u `offset`
+        (con texto, dentro del ranking de relevancia).
+        """
+        mask = self.mask(**filters)
+        k = limit + offset if limit >= 0 else -1
+        if ranked is not None:
+            positions = self.top_k_ranked(mask, ranked, k, order_by_precio)
+        else:
+            positions = self.top_k(mask, k, order_by_precio, after=after)
+        return self.records(positions[offset:], columns)
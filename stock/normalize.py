@@ -0,0 +1,68 @@
+"""Normalización de valores de filtro: claves indexables para marca, modelo, segmento, etc.
+
+La misma función se aplica al ingresar el stock (columnas *_key) y a los filtros de
+búsqueda, así la consulta es una igualdad exacta que usa índices en vez de
+LOWER(TRIM(col)). Marca y modelo conservan la búsqueda por subcadena ("208" -> 208,
+NUEVO 208): se resuelve sobre los valores distintos de la columna (SUBSTRING_COLUMNS,
+matching_keys) y la consulta filtra por esas claves.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Any, Iterable
+
+# Sinónimos -> valor canónico, por columna (claves ya plegadas: minúsculas, sin tildes)
+SYNONYMS: dict[str, dict[str, str]] = {
+    "transmision": {
+        "automatico": "automatico", "automatica": "automatico", "automat": "automatico",
+        "aut": "automatico", "auto": "automatico", "at": "automatico", "dct": "automatico",
+        "cvt": "automatico", "amt": "automatico", "tiptronic": "automatico",
+        "mecanico": "mecanico", "mecanica": "mecanico", "manual": "mecanico", "mt": "mecanico",
+    },
+    "segmento": {
+        "pickup": "camioneta", "pick up": "camioneta", "pick-up": "camioneta", "camioneta": "camioneta",
+        "city car": "citycar", "citycar": "citycar",
+        "suv": "suv", "sedan": "sedan",
+        "furgon": "furgon", "van": "furgon",
+    },
+    "combustible": {
+        "diesel": "diesel", "petroleo": "diesel",
+        "gasolina": "gasolina", "bencina": "gasolina", "nafta": "gasolina",
+        "hibrido": "hibrido", "hybrid": "hibrido",
+        "electrico": "electrico", "ev": "electrico",
+    },
+    "marca": {
+        "kia motors": "kia", "vw": "volkswagen", "chevy": "chevrolet", "mercedes": "mercedes-benz",
+    },
+    "modelo": {},
+}
+
+# Columnas con clave normalizada en la tabla vehiculos (<col>_key)
+KEY_COLUMNS = ("marca", "modelo", "segmento", "transmision", "combustible")
+# Columnas cuyo filtro busca la clave como subcadena (como el LIKE '%x%' original), no igualdad
+SUBSTRING_COLUMNS = ("marca", "modelo")
+
+_SPACES = re.compile(r"\s+")
+
+
+def fold(value: Any) -> str:
+    """Minúsculas (casefold), sin tildes y con espacios colapsados. None -> ''."""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value).casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _SPACES.sub(" ", text).strip()
+
+
+def normalize_key(column: str, value: Any) -> str:
+    """Clave canónica de `value` para la columna (ej. transmision 'AT' -> 'automatico')."""
+    key = fold(value)
+    return SYNONYMS.get(column, {}).get(key, key)
+
+
+def matching_keys(column: str, value: Any, keys: Iterable[str | None]) -> list[str]:
+    """Claves de `keys` (valores distintos de <col>_key) que contienen la de `value`; [] si ninguna."""
+    key = normalize_key(column, value)
+    return [k for k in keys if k and key in k]
+
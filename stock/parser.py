@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 import pandas as pd
 
@@ -58,31 +58,55 @@ def _clean_encoding_errors(s: str) -> str:
     """Reemplaza carácter de reemplazo Unicode (U+FFFD) en textos del CSV con encoding roto."""
     if not isinstance(s, str) or "\ufffd" not in s:
         return s
-    # Correcciones por contexto antes del reemplazo genérico
-    s = s.replace("Am\ufffdrico", "Americo").replace("AM\ufffdRICO", "AMERICO")
-    s = s.replace("\ufffdu\ufffdoa", "Nunoa").replace("\ufffduñoa", "Nunoa").replace("Ñu\ufffdoa", "Nunoa")
-    # Reemplazo genérico del resto de FFFD (ó, etc.)
-    s = s.replace("\ufffd", "o")
+    for old, new in _ENCODING_FIXES:
+        s = s.replace(old, new)
     # Formas que quedan tras el genérico (ej. Ñuñoa -> ouooa)
     if "ouooa" in s or " uooa" in s:
-        s = s.replace("ouooa", "Nunoa").replace(" uooa", "Nunoa")
+        for old, new in _ENCODING_FIXES_AFTER:
+            s = s.replace(old, new)
     return s.strip()
 
 
-def parse_stock_file(path: str | Path) -> list[dict[str, Any]]:
-    """Parsea CSV o Excel y devuelve lista de diccionarios normalizados."""
-    path = Path(path)
-    if not path.exists():
-        return []
-    if path.suffix.lower() in (".xlsx", ".xls"):
-        df = pd.read_excel(path)
-    else:
-        df = pd.read_csv(path, encoding="utf-8", encoding_errors="ignore")
+# Correcciones por contexto antes del reemplazo genérico; el último par es el genérico (ó, etc.)
+_ENCODING_FIXES = (
+    ("Am\ufffdrico", "Americo"),
+    ("AM\ufffdRICO", "AMERICO"),
+    ("\ufffdu\ufffdoa", "Nunoa"),
+    ("\ufffduñoa", "Nunoa"),
+    ("Ñu\ufffdoa", "Nunoa"),
+    ("\ufffd", "o"),
+)
+_ENCODING_FIXES_AFTER = (("ouooa", "Nunoa"), (" uooa", "Nunoa"))
+
+
+def _clean_text_column(series: pd.Series) -> pd.Series:
+    """_clean_encoding_errors vectorizado: operaciones .str solo sobre las celdas que traen U+FFFD."""
+    series = series.astype(str)
+    broken = series.str.contains("\ufffd", regex=False, na=False)
+    if not broken.any():
+        return series
+    fixed = series[broken]
+    for old, new in _ENCODING_FIXES:
+        fixed = fixed.str.replace(old, new, regex=False)
+    for old, new in _ENCODING_FIXES_AFTER:
+        fixed = fixed.str.replace(old, new, regex=False)
+    series = series.copy()
+    series[broken] = fixed.str.strip()
+    return series
+
+
+def _is_text_column(series: pd.Series) -> bool:
+    # object en pandas 2; en pandas 3 los textos usan el dtype "str"
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def _prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Normaliza columnas, tipa numéricos y limpia encoding de un bloque leído del archivo."""
     if df.empty:
-        return []
+        return df
     df = _normalize_columns(df)
     if df.empty:
-        return []
+        return df
     if "precio" in df.columns:
         df["precio"] = _coerce_numeric(df["precio"])
     if "año" in df.columns:
@@ -92,6 +116,63 @@ def parse_stock_file(path: str | Path) -> list[dict[str, Any]]:
     df = df.dropna(how="all")
     # Limpiar U+FFFD en columnas de texto (ubicación, comuna, etc. con encoding roto)
     for col in df.columns:
-        if df[col].dtype == object:
-            df[col] = df[col].astype(str).apply(_clean_encoding_errors)
-    return df.to_dict(orient="records")
+        if _is_text_column(df[col]):
+            df[col] = _clean_text_column(df[col])
+    return df
+
+
+def _iter_excel_frames(path: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Lee .xlsx en modo read-only de openpyxl (fila a fila, sin cargar la hoja completa)."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = ["" if h is None else str(h) for h in header]
+        batch: list[tuple] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        wb.close()
+
+
+def iter_stock_batches(path: str | Path, chunk_size: int = 5000) -> Iterator[list[dict[str, Any]]]:
+    """Parsea CSV o Excel por bloques de `chunk_size` filas y entrega cada bloque como registros normalizados.
+
+    La memoria queda acotada por el tamaño del bloque, no por el del archivo.
+    """
+    path = Path(path)
+    if not path.exists():
+        return
+    suffix = path.suffix.lower()
+    if suffix == ".xlsx":
+        frames: Iterable[pd.DataFrame] = _iter_excel_frames(path, chunk_size)
+    elif suffix == ".xls":
+        # openpyxl no lee .xls (formato antiguo): se carga completo con pandas
+        frames = [pd.read_excel(path)]
+    else:
+        frames = pd.read_csv(path, encoding="utf-8", encoding_errors="ignore", chunksize=chunk_size)
+    for df in frames:
+        df = _prepare_frame(df)
+        if not df.empty:
+            yield _frame_records(df)
+
+
+def _frame_records(df: pd.DataFrame) -> list[dict[str, Any]]:
+    """Registros del bloque armados desde listas por columna (tolist), sin el boxeo celda a celda de to_dict."""
+    columns = list(df.columns)
+    values = [df[c].tolist() for c in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def parse_stock_file(path: str | Path) -> list[dict[str, Any]]:
+    """Parsea CSV o Excel y devuelve lista de diccionarios normalizados."""
+    return [r for batch in iter_stock_batches(path) for r in batch]
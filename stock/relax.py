@@ -0,0 +1,106 @@
+"""Relajación de filtros cuando una búsqueda de stock no encuentra nada.
+
+En vez de devolver vacío y que el agente tenga que volver a llamar, se aplica una escalera
+ordenada y acumulativa (sin tope de precio/cuota, más kilometraje, sin año, otros modelos)
+hasta que aparezca algo. Segmento, combustible, transmisión y exclusiones nunca se relajan:
+son lo que el cliente dijo que quiere (o que no quiere). Otras marcas y modelos solo se
+ofrecen si hay segmento: sin él, "del mismo tipo" no dice nada (marca="Ferrari" terminaría
+en los autos más baratos del stock) y es mejor decir que no hay.
+
+Los peldaños se arman de una vez (relaxation_rungs); con `first_match`
+(StockRepository.first_match) el primero con resultados sale de una sola pasada por el
+índice y se hace una única búsqueda, la de ese peldaño.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable
+
+# Factor para ampliar km_max
+_KM_FACTOR = 2
+
+
+def _relax_precio(params: dict[str, Any]) -> str | None:
+    had_max = params.get("precio_max") is not None
+    had_cuota = params.get("cuota_max") is not None
+    had_min = params.get("precio_min") is not None
+    if not (had_max or had_cuota or had_min):
+        return None
+    for name in ("precio_max", "cuota_max", "precio_min"):
+        params.pop(name, None)
+    if had_max or had_cuota:
+        # Lo más cercano a un tope son los más económicos por encima de él
+        params["order_by_precio"] = "asc"
+        return "sin tope de cuota, los más económicos" if had_cuota and not had_max else "sin tope de precio, los más económicos"
+    params["order_by_precio"] = "desc"
+    return "sin precio mínimo, los más cercanos bajo ese monto"
+
+
+def _relax_km(params: dict[str, Any]) -> str | None:
+    km_max = params.get("km_max")
+    if km_max is None:
+        return None
+    params["km_max"] = float(km_max) * _KM_FACTOR
+    return f"kilometraje hasta {params['km_max']:,.0f} km"
+
+
+def _relax_año(params: dict[str, Any]) -> str | None:
+    if params.get("año_min") is None and params.get("año_max") is None:
+        return None
+    params.pop("año_min", None)
+    params.pop("año_max", None)
+    return "cualquier año"
+
+
+def _relax_modelo(params: dict[str, Any]) -> str | None:
+    if not params.get("segmento") or not any(params.get(name) for name in ("marca", "modelo", "texto")):
+        return None
+    for name in ("marca", "modelo", "texto"):
+        params.pop(name, None)
+    return "otras marcas y modelos del mismo tipo"
+
+
+# Orden de la escalera: primero lo que el cliente suele flexibilizar
+RELAXATION_LADDER: tuple[Callable[[dict[str, Any]], str | None], ...] = (
+    _relax_precio,
+    _relax_km,
+    _relax_año,
+    _relax_modelo,
+)
+
+
+def relaxation_rungs(params: dict[str, Any]) -> list[tuple[dict[str, Any], list[str]]]:
+    """Peldaños que aplican a `params`, en orden: (parámetros relajados, notas acumuladas)."""
+    relaxed = dict(params)
+    notes: list[str] = []
+    rungs = []
+    for step in RELAXATION_LADDER:
+        note = step(relaxed)
+        if note is None:
+            continue
+        notes.append(note)
+        rungs.append((dict(relaxed), list(notes)))
+    return rungs
+
+
+def relax_search(
+    search: Callable[..., list[dict[str, Any]]],
+    params: dict[str, Any],
+    first_match: Callable[[list[dict[str, Any]]], int | None] | None = None,
+) -> tuple[list[dict[str, Any]], dict[str, Any], list[str]]:
+    """Sube la escalera hasta que `search(**params)` devuelve algo.
+
+    `first_match(lista de parámetros)`: posición del primer juego con resultados (o None); si se
+    da, se busca solo ese peldaño en vez de probarlos uno por uno.
+
+    Devuelve (resultados, parámetros relajados, notas de lo relajado); resultados vacíos si ni
+    relajando todo aparece nada. Los parámetros originales no se modifican.
+    """
+    rungs = relaxation_rungs(params)
+    if first_match is not None:
+        found = first_match([relaxed for relaxed, _ in rungs]) if rungs else None
+        rungs = rungs[found:found + 1] if found is not None else []
+    for relaxed, notes in rungs:
+        results = search(**relaxed)
+        if results:
+            return results, relaxed, notes
+    return [], dict(params), []
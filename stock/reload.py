@@ -0,0 +1,143 @@
+"""Recarga del stock en caliente, sin reiniciar y sin ventanas de resultados vacíos.
+
+La recarga se arma "a la sombra" en un StockRepository nuevo:
+1. sync incremental en una sola transacción (WAL: las búsquedas en curso siguen viendo el stock anterior),
+   validada antes del commit (ej. que el archivo no venga truncado);
+2. índice en memoria construido y verificado contra los conteos del sync;
+3. recién entonces se publica el repositorio nuevo (on_swap). Las búsquedas que ya tenían el
+   repositorio anterior terminan con él; las siguientes usan el nuevo.
+
+El archivo se vigila por mtime/tamaño (barato) y se confirma por sha256; un cambio se aplica
+cuando el archivo dejó de moverse entre dos revisiones (no se recarga un archivo a medio copiar).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable
+
+from stock.repository import StockRepository
+from stock.snapshot import file_sha256
+
+
+class StockReloadError(ValueError):
+    """La recarga se rechazó y el stock publicado no cambió."""
+
+
+class StockReloader:
+    def __init__(
+        self,
+        stock_file: str,
+        get_repo: Callable[[], StockRepository],
+        on_swap: Callable[[StockRepository], None],
+        *,
+        interval: float = 30.0,
+        max_drop: float = 0.5,
+    ):
+        self.stock_file = stock_file
+        self.get_repo = get_repo
+        self.on_swap = on_swap
+        self.interval = interval
+        # Fracción máxima del stock publicado que una recarga puede eliminar
+        self.max_drop = max_drop
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._fingerprint = self._stat()
+        self._pending: tuple[int, int] | None = None
+        self._sha256 = file_sha256(stock_file) if self._fingerprint else None
+        self.last_result: dict[str, Any] | None = None
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            st = os.stat(self.stock_file)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def check(self) -> dict[str, Any] | None:
+        """Una revisión del archivo; recarga si cambió y ya está estable. None si no hubo recarga."""
+        fingerprint = self._stat()
+        if fingerprint is None or fingerprint == self._fingerprint:
+            self._pending = None
+            return None
+        if fingerprint != self._pending:
+            # Cambió desde la última revisión: puede estar copiándose todavía
+            self._pending = fingerprint
+            return None
+        self._pending = None
+        return self.reload()
+
+    def reload(self, *, force: bool = False) -> dict[str, Any]:
+        """Sincroniza STOCK_FILE en un repositorio nuevo y lo publica. Con force recarga aunque el hash no cambie."""
+        with self._lock:
+            started = time.perf_counter()
+            fingerprint = self._stat()
+            if fingerprint is None:
+                raise StockReloadError(f"No existe el archivo de stock: {self.stock_file}")
+            sha256 = file_sha256(self.stock_file)
+            if not force and sha256 == self._sha256:
+                self._fingerprint = fingerprint
+                return self._result("unchanged", started)
+
+            current = self.get_repo()
+            published = current.get_summary()["total"]
+
+            def validate(counts: dict[str, int]) -> None:
+                if published and counts["deleted"] > published * self.max_drop:
+                    raise StockReloadError(
+                        f"La recarga eliminaría {counts['deleted']} de {published} vehículos; "
+                        "se rechaza (¿archivo incompleto?)"
+                    )
+
+            shadow = StockRepository(current.db_path, use_index=current.use_index)
+            try:
+                diff = shadow.sync_from_file(self.stock_file, validate=validate)
+                if diff["total"] == 0:
+                    raise StockReloadError(f"El archivo de stock no tiene vehículos: {self.stock_file}")
+                # Índice, resumen y matriz de similares se construyen antes del swap: la primera consulta con el stock nuevo no paga la carga
+                indexed = shadow.get_summary()["total"]
+                shadow.get_similarity()
+                if indexed != diff["total"]:
+                    raise StockReloadError(f"Índice inconsistente: {indexed} filas para {diff['total']} vehículos")
+            except StockReloadError:
+                # Este archivo no se reintenta hasta que vuelva a cambiar
+                self._fingerprint = fingerprint
+                raise
+            self.on_swap(shadow)
+            self._fingerprint = fingerprint
+            self._sha256 = sha256
+            return self._result("reloaded", started, diff)
+
+    def _result(self, status: str, started: float, diff: dict[str, int] | None = None) -> dict[str, Any]:
+        self.last_result = {
+            "status": status,
+            **(diff or {}),
+            "seconds": round(time.perf_counter() - started, 3),
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        return self.last_result
+
+    def start(self) -> None:
+        """Vigila el archivo en un hilo de fondo cada `interval` segundos (interval <= 0: no vigila)."""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stock-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                result = self.check()
+                if result:
+                    print(f"[Stock] Recarga: {result}")
+            except Exception as e:
+                print(f"[Stock] Recarga rechazada: {e}")
@@ -1,19 +1,25 @@
 """Repositorio de stock en SQLite con índices para búsqueda por rangos."""
 from __future__ import annotations
 
+import dataclasses
+import hashlib
 import json
+import math
 import sqlite3
-from pathlib import Path
-from typing import Any
+import threading
+from typing import Any, Callable, Iterable
 
-from stock.parser import parse_stock_file
+import numpy as np
 
-
-def _get_conn(db_path: str) -> sqlite3.Connection:
-    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+from db import ensure_schema
+from stock.facets import compute_summary
+from stock.financing import cuotas, normalize_plazo, precio_tope_for_cuota
+from stock.fulltext import FTS_RANK, create_fts, fts_query
+from stock.index import StockIndex
+from stock.normalize import KEY_COLUMNS, SUBSTRING_COLUMNS, fold, matching_keys, normalize_key
+from stock.parser import iter_stock_batches
+from stock.similar import SimilarityIndex, model_hint
+from stock.vehicle import Vehicle, projection
 
 
 def _create_schema(conn: sqlite3.Connection) -> None:
@@ -37,22 +43,73 @@ def _create_schema(conn: sqlite3.Connection) -> None:
             placa_patente TEXT,
             link TEXT,
             segmento TEXT,
-            raw_json TEXT,
+            marca_key TEXT,
+            modelo_key TEXT,
+            segmento_key TEXT,
+            transmision_key TEXT,
+            combustible_key TEXT,
             updated_at TEXT DEFAULT (datetime('now'))
         );
-        CREATE INDEX IF NOT EXISTS idx_vehiculos_precio ON vehiculos(precio);
-        CREATE INDEX IF NOT EXISTS idx_vehiculos_año ON vehiculos(año);
-        CREATE INDEX IF NOT EXISTS idx_vehiculos_kilometraje ON vehiculos(kilometraje);
-        CREATE INDEX IF NOT EXISTS idx_vehiculos_marca ON vehiculos(marca);
-        CREATE INDEX IF NOT EXISTS idx_vehiculos_marca_modelo ON vehiculos(marca, modelo);
-        CREATE INDEX IF NOT EXISTS idx_vehiculos_año_precio ON vehiculos(año, precio);
+        -- Registro original del archivo: solo se lee bajo demanda (get_raw), fuera de las búsquedas
+        CREATE TABLE IF NOT EXISTS vehiculos_raw (
+            id INTEGER PRIMARY KEY,
+            raw_json TEXT
+        );
+        CREATE TRIGGER IF NOT EXISTS vehiculos_raw_ad AFTER DELETE ON vehiculos BEGIN
+            DELETE FROM vehiculos_raw WHERE id = old.id;
+        END;
+        CREATE TABLE IF NOT EXISTS stock_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO stock_meta (key, value) VALUES ('version', 0);
+        INSERT OR IGNORE INTO stock_meta (key, value) VALUES ('generation', 0);
     """)
     # Migrar DBs antiguas: agregar columnas nuevas si no existen
-    for col in ["sucursal", "ubicacion", "comuna", "version", "placa_patente", "link", "segmento"]:
+    for col in ["sucursal", "ubicacion", "comuna", "version", "placa_patente", "link", "segmento"] + [
+        f"{c}_key" for c in KEY_COLUMNS
+    ]:
         try:
             conn.execute(f"ALTER TABLE vehiculos ADD COLUMN {col} TEXT")
         except sqlite3.OperationalError:
             pass
+    # Migrar raw_json de la tabla principal a vehiculos_raw (SELECT de vehiculos ya no arrastra el blob)
+    if any(row["name"] == "raw_json" for row in conn.execute("PRAGMA table_info(vehiculos)")):
+        conn.execute(
+            "INSERT OR IGNORE INTO vehiculos_raw (id, raw_json) "
+            "SELECT id, raw_json FROM vehiculos WHERE raw_json IS NOT NULL"
+        )
+        conn.execute("ALTER TABLE vehiculos DROP COLUMN raw_json")
+    # Índices sobre las claves normalizadas (igualdad o IN) + precio para el ORDER BY: con una
+    # sola clave el índice entrega las filas ya ordenadas (sin TEMP B-TREE);
+    # los de marca/modelo crudos no sirven con LOWER()/LIKE y solo encarecían las escrituras.
+    conn.executescript("""
+        DROP INDEX IF EXISTS idx_vehiculos_marca;
+        DROP INDEX IF EXISTS idx_vehiculos_marca_modelo;
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_precio ON vehiculos(precio);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_año ON vehiculos(año);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_kilometraje ON vehiculos(kilometraje);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_año_precio ON vehiculos(año, precio);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_marca_precio ON vehiculos(marca_key, precio);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_marca_modelo_precio ON vehiculos(marca_key, modelo_key, precio);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_modelo_precio ON vehiculos(modelo_key, precio);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_segmento_precio ON vehiculos(segmento_key, precio);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_segmento_transmision_precio
+            ON vehiculos(segmento_key, transmision_key, precio);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_combustible_precio ON vehiculos(combustible_key, precio);
+        CREATE INDEX IF NOT EXISTS idx_vehiculos_transmision_precio ON vehiculos(transmision_key, precio);
+    """)
+    # Rellenar claves de filas cargadas antes de que existieran las columnas *_key
+    pending = conn.execute(
+        f"SELECT id, {', '.join(KEY_COLUMNS)} FROM vehiculos WHERE marca_key IS NULL"
+    ).fetchall()
+    if pending:
+        assignments = ", ".join(f"{c}_key = ?" for c in KEY_COLUMNS)
+        conn.executemany(
+            f"UPDATE vehiculos SET {assignments} WHERE id = ?",
+            [tuple(normalize_key(c, row[c]) for c in KEY_COLUMNS) + (row["id"],) for row in pending],
+        )
+    create_fts(conn)
 
 
 def _str(v: Any) -> str:
@@ -72,62 +129,359 @@ def _float(v: Any) -> float | None:
     if v is None:
         return None
     try:
-        return float(v)
+        f = float(v)
     except (ValueError, TypeError):
         return None
+    # NaN (celda vacía en pandas) se guarda como NULL; así el diff no la ve siempre distinta
+    return None if math.isnan(f) else f
+
+
+# Columnas que se comparan en la sincronización incremental (id_externo primero: es la clave).
+# Incluye las claves normalizadas: si cambian las reglas de normalize_key, la próxima carga las actualiza.
+_SYNC_COLUMNS = (
+    "id_externo", "marca", "modelo", "año", "precio", "kilometraje",
+    "transmision", "combustible", "color", "estado",
+    "sucursal", "ubicacion", "comuna", "version", "placa_patente", "link", "segmento",
+) + tuple(f"{c}_key" for c in KEY_COLUMNS)
+
+
+def _row_values(r: dict[str, Any]) -> tuple:
+    """Registro parseado -> valores de _SYNC_COLUMNS tal como quedan en la tabla."""
+    return (
+        str(r.get("id") or r.get("placa_patente") or ""),
+        _str(r.get("marca")),
+        _str(r.get("modelo")),
+        _int(r.get("año")),
+        _float(r.get("precio")),
+        _float(r.get("kilometraje")),
+        _str(r.get("transmision")),
+        _str(r.get("combustible")),
+        _str(r.get("color")),
+        _str(r.get("estado")),
+        _str(r.get("sucursal")),
+        _str(r.get("ubicacion")),
+        _str(r.get("comuna")),
+        _str(r.get("version")),
+        _str(r.get("placa_patente")),
+        _str(r.get("link")),
+        _str(r.get("segmento")),
+    ) + tuple(normalize_key(c, r.get(c)) for c in KEY_COLUMNS)
+
+
+def _search_query(
+    *,
+    precio_min: float | None = None,
+    precio_max: float | None = None,
+    año_min: int | None = None,
+    año_max: int | None = None,
+    km_max: float | None = None,
+    marca_keys: list[str] | None = None,
+    modelo_keys: list[str] | None = None,
+    segmento: str | None = None,
+    transmision: str | None = None,
+    combustible: str | None = None,
+    exclude_marca: str | None = None,
+    exclude_modelo: str | None = None,
+    exclude_combustible: str | None = None,
+    texto: str | None = None,
+    limit: int = 50,
+    order_by_precio: str = "asc",
+    after: tuple[float | None, int] | None = None,
+    offset: int = 0,
+    columns: tuple[str, ...] | None = None,
+) -> tuple[str, list[Any]]:
+    """SQL parametrizado de StockRepository.search (filtros sobre columnas indexadas; solo las columnas de la proyección).
+
+    marca_keys / modelo_keys: claves que calzan con el filtro de marca / modelo (ver
+    StockRepository._matching_keys); None = sin filtro, [] = ninguna calza.
+    """
+    conditions = []
+    params: list[Any] = []
+    # Filtros de texto sobre las claves normalizadas (*_key): igualdad o lista de claves, indexables
+    for col, value in (("marca", exclude_marca), ("modelo", exclude_modelo), ("combustible", exclude_combustible)):
+        key = normalize_key(col, value)
+        if key:
+            conditions.append(f"{col}_key != ?")
+            params.append(key)
+    if precio_min is not None:
+        conditions.append("precio >= ?")
+        params.append(precio_min)
+    if precio_max is not None:
+        conditions.append("precio <= ?")
+        params.append(precio_max)
+    if año_min is not None:
+        conditions.append("año >= ?")
+        params.append(año_min)
+    if año_max is not None:
+        conditions.append("año <= ?")
+        params.append(año_max)
+    if km_max is not None:
+        conditions.append("(kilometraje IS NULL OR kilometraje <= ?)")
+        params.append(km_max)
+    for col, value in (("segmento", segmento), ("transmision", transmision), ("combustible", combustible)):
+        key = normalize_key(col, value)
+        if key:
+            conditions.append(f"{col}_key = ?")
+            params.append(key)
+    for col, keys in (("marca", marca_keys), ("modelo", modelo_keys)):
+        if keys is None:
+            continue
+        if not keys:
+            conditions.append("0")
+        else:
+            # Una sola clave (lo normal) es una igualdad: el índice compuesto entrega el orden por precio
+            conditions.append(f"{col}_key IN ({', '.join('?' * len(keys))})")
+            params.extend(keys)
+    order = "DESC" if (order_by_precio or "").strip().lower() == "desc" else "ASC"
+    if after is not None:
+        # Keyset: continuar después de la última fila vista en el orden (precio, id), NULL primero en ASC
+        after_precio, after_id = after
+        if after_precio is None:
+            conditions.append("(precio IS NOT NULL OR id > ?)" if order == "ASC" else "(precio IS NULL AND id < ?)")
+            params.append(after_id)
+        else:
+            conditions.append("(precio, id) > (?, ?)" if order == "ASC" else "((precio, id) < (?, ?) OR precio IS NULL)")
+            params.extend([after_precio, after_id])
+    where = " AND ".join(conditions) if conditions else "1=1"
+    params.extend([limit, offset])
+    select = ", ".join(f"vehiculos.{c}" for c in projection(columns))
+    match = fts_query(texto)
+    if match:
+        # Texto libre: solo filas que calzan en FTS, ordenadas por relevancia (bm25) y luego por precio
+        sql = (
+            f"SELECT {select} FROM vehiculos JOIN ("
+            f"SELECT rowid AS fts_id, {FTS_RANK} AS fts_rank FROM vehiculos_fts WHERE vehiculos_fts MATCH ?"
+            f") AS fts ON fts.fts_id = vehiculos.id WHERE {where} "
+            f"ORDER BY fts.fts_rank, precio {order}, id {order} LIMIT ? OFFSET ?"
+        )
+        return sql, [match] + params
+    sql = f"SELECT {select} FROM vehiculos WHERE {where} ORDER BY precio {order}, id {order} LIMIT ? OFFSET ?"
+    return sql, params
+
+
+# Parámetros de search que son filtros de fila (los de StockIndex.mask y _search_query)
+_ROW_FILTERS = (
+    "precio_min", "precio_max", "año_min", "año_max", "km_max", "marca", "modelo", "segmento",
+    "transmision", "combustible", "exclude_marca", "exclude_modelo", "exclude_combustible",
+)
+
+
+def _filters(params: dict[str, Any]) -> dict[str, Any]:
+    """Filtros de fila de unos parámetros de search (el resto se ignora); cuota_max pasa a tope de precio."""
+    filters = {name: params.get(name) for name in _ROW_FILTERS}
+    cuota_max = params.get("cuota_max")
+    if cuota_max is not None:
+        # La cuota crece con el precio: cuota <= cuota_max es un tope de precio (usa los índices de precio)
+        tope = np.nextafter(precio_tope_for_cuota(cuota_max, params.get("pie") or 0, params.get("plazo")), -np.inf)
+        precio_max = filters["precio_max"]
+        filters["precio_max"] = tope if precio_max is None else min(float(precio_max), tope)
+    return filters
+
+
+def _with_cuotas(rows: list[Vehicle], pie: float, plazo: int) -> list[Vehicle]:
+    """Copias de los vehículos con cuota, pie_usado y plazo (None si no tiene precio)."""
+    precios = np.array([np.nan if r.precio is None else r.precio for r in rows], dtype=np.float64)
+    pie_efectivo, cuota = cuotas(precios, max(float(pie), 0.0), plazo)
+    out = []
+    for r, p, c in zip(rows, pie_efectivo.tolist(), cuota.tolist()):
+        has_precio = c == c  # NaN = sin precio
+        out.append(dataclasses.replace(
+            r, cuota=c if has_precio else None, pie_usado=p if has_precio else None, plazo=plazo
+        ))
+    return out
 
 
 class StockRepository:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, *, use_index: bool = True):
         self.db_path = db_path
+        # Búsquedas en memoria (NumPy); use_index=False fuerza la consulta SQL
+        self.use_index = use_index
+        self._index: StockIndex | None = None
+        self._index_version = 0
+        self._index_generation = 0
+        self._summary: tuple[StockIndex, dict[str, Any]] | None = None
+        self._similarity: SimilarityIndex | None = None
+        self._lexicon: tuple[StockIndex, frozenset[str]] | None = None
+        # Valores distintos de marca_key / modelo_key para los filtros por subcadena del SQL
+        self._distinct_keys: dict[str, list[str]] = {}
+        self._index_lock = threading.Lock()
 
     def _conn(self) -> sqlite3.Connection:
-        return _get_conn(self.db_path)
+        """Conexión del hilo (compartida, con el esquema ya creado en este proceso)."""
+        return ensure_schema(self.db_path, "vehiculos", _create_schema)
+
+    def get_index(self) -> StockIndex:
+        """Índice columnar del stock; se carga una vez y se invalida en update_from_file."""
+        index = self._index
+        if index is None:
+            with self._index_lock:
+                if self._index is None:
+                    conn = self._conn()
+                    # Una sola transacción de lectura: la versión corresponde exactamente a las filas del índice
+                    conn.execute("BEGIN")
+                    try:
+                        self._index_version, self._index_generation = self._read_meta(conn)
+                        self._index = StockIndex.from_conn(conn)
+                    finally:
+                        conn.rollback()
+                index = self._index
+        return index
+
+    def set_index(self, index: StockIndex) -> None:
+        """Usa un índice ya construido (ej. abierto desde un snapshot) en vez de cargarlo de SQLite."""
+        with self._index_lock:
+            self._index_version, self._index_generation = self._read_meta(self._conn())
+            self._index = index
+
+    @staticmethod
+    def _read_meta(conn: sqlite3.Connection) -> tuple[int, int]:
+        """(versión, generación) del stock en stock_meta."""
+        meta = dict(conn.execute("SELECT key, value FROM stock_meta WHERE key IN ('version', 'generation')").fetchall())
+        return meta.get("version", 0), meta.get("generation", 0)
+
+    def stock_version(self) -> int:
+        """Contador que sube con cada sync que cambia el stock; con índice, la versión de lo que se está sirviendo.
+
+        Es local a esta base (una base recién creada empieza de nuevo): sirve para caches del proceso.
+        """
+        if self.use_index:
+            self.get_index()
+            return self._index_version
+        return self._read_meta(self._conn())[0]
+
+    def stock_generation(self) -> int:
+        """Digest del contenido del stock (el del último sync; 0 si nunca se sincronizó). El mismo stock
+        da la misma generación en cualquier base (otro worker, un snapshot), así que sirve de clave en
+        caches compartidos o persistentes; ver agent.faq_cache."""
+        if self.use_index:
+            self.get_index()
+            return self._index_generation
+        return self._read_meta(self._conn())[1]
+
+    def vacuum_into(self, target_path: str) -> None:
+        """Copia compacta y consistente de la base en target_path (que no debe existir)."""
+        self._conn().execute("VACUUM INTO ?", (target_path,))
 
     def init_schema(self) -> None:
-        with self._conn() as c:
-            _create_schema(c)
+        self._conn()
 
     def update_from_file(self, file_path: str) -> int:
-        records = parse_stock_file(file_path)
-        if not records:
-            return 0
-        with self._conn() as conn:
-            _create_schema(conn)
-            conn.execute("DELETE FROM vehiculos")
-            for r in records:
-                id_externo = str(r.get("id") or r.get("placa_patente") or "")
-                conn.execute(
-                    """
-                    INSERT INTO vehiculos
-                    (id_externo, marca, modelo, año, precio, kilometraje,
-                     transmision, combustible, color, estado,
-                     sucursal, ubicacion, comuna, version, placa_patente, link, segmento, raw_json)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        id_externo,
-                        _str(r.get("marca")),
-                        _str(r.get("modelo")),
-                        _int(r.get("año")),
-                        _float(r.get("precio")),
-                        _float(r.get("kilometraje")),
-                        _str(r.get("transmision")),
-                        _str(r.get("combustible")),
-                        _str(r.get("color")),
-                        _str(r.get("estado")),
-                        _str(r.get("sucursal")),
-                        _str(r.get("ubicacion")),
-                        _str(r.get("comuna")),
-                        _str(r.get("version")),
-                        _str(r.get("placa_patente")),
-                        _str(r.get("link")),
-                        _str(r.get("segmento")),
-                        json.dumps(r, ensure_ascii=False),
-                    ),
-                )
-            conn.commit()
-            return len(records)
+        """Sincroniza el stock con el archivo y devuelve el total de vehículos cargados."""
+        return self.sync_from_file(file_path)["total"]
+
+    def sync_from_file(
+        self, file_path: str, *, validate: Callable[[dict[str, int]], None] | None = None
+    ) -> dict[str, int]:
+        """Sincroniza incrementalmente desde CSV/Excel. Devuelve {total, inserted, updated, deleted, unchanged}."""
+        return self.sync_batches(iter_stock_batches(file_path), validate=validate)
+
+    def sync_records(self, records: list[dict[str, Any]]) -> dict[str, int]:
+        return self.sync_batches([records])
+
+    def sync_batches(
+        self,
+        batches: Iterable[list[dict[str, Any]]],
+        *,
+        validate: Callable[[dict[str, int]], None] | None = None,
+    ) -> dict[str, int]:
+        """Aplica solo el diff (altas, cambios, bajas) contra la tabla, con executemany en una transacción.
+
+        Los bloques se consumen de a uno (ej. iter_stock_batches), así la memoria no crece con el archivo.
+        Las filas se emparejan por id_externo (id o placa patente); si una clave se repite en el
+        archivo se empareja por orden de aparición. Los lectores ven el stock anterior hasta el commit.
+        Si no llega ningún registro no se toca la tabla. `validate` recibe los conteos antes del
+        commit; si lanza una excepción se hace rollback y la tabla queda como estaba.
+        """
+        counts = {"total": 0, "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        assignments = ", ".join(f"{c} = ?" for c in _SYNC_COLUMNS)
+        update_sql = f"UPDATE vehiculos SET {assignments}, updated_at = datetime('now') WHERE id = ?"
+        placeholders = ", ".join("?" for _ in range(len(_SYNC_COLUMNS) + 1))
+        insert_sql = f"INSERT INTO vehiculos (id, {', '.join(_SYNC_COLUMNS)}) VALUES ({placeholders})"
+        raw_sql = "INSERT OR REPLACE INTO vehiculos_raw (id, raw_json) VALUES (?, ?)"
+
+        # Generación: digest de las filas del archivo en orden, que es lo que queda en la tabla
+        digest = hashlib.sha256()
+        conn = self._conn()
+        with conn:
+            # IMMEDIATE: nadie más escribe entre la lectura del estado actual y el commit del diff
+            conn.execute("BEGIN IMMEDIATE")
+            current: dict[tuple[str, int], tuple[int, tuple]] = {}
+            seen: dict[str, int] = {}
+            for row in conn.execute(f"SELECT id, {', '.join(_SYNC_COLUMNS)} FROM vehiculos ORDER BY id"):
+                values = tuple(row[1:])
+                key = values[0] or ""
+                n = seen.get(key, 0)
+                seen[key] = n + 1
+                current[(key, n)] = (row[0], values)
+            # Ids explícitos para las altas (mismo criterio que AUTOINCREMENT): así el registro
+            # original va a vehiculos_raw en el mismo executemany, sin leer lastrowid fila a fila
+            seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'vehiculos'").fetchone()
+            next_id = max([seq[0] if seq else 0] + [row_id for row_id, _ in current.values()]) + 1
+
+            seen = {}
+            for records in batches:
+                inserts: list[tuple] = []
+                updates: list[tuple] = []
+                raws: list[tuple[int, str]] = []
+                for r in records:
+                    values = _row_values(r)
+                    digest.update(repr(values).encode("utf-8"))
+                    n = seen.get(values[0], 0)
+                    seen[values[0]] = n + 1
+                    existing = current.pop((values[0], n), None)
+                    if existing is None:
+                        inserts.append((next_id,) + values)
+                        raws.append((next_id, json.dumps(r, ensure_ascii=False)))
+                        next_id += 1
+                    elif existing[1] != values:
+                        updates.append(values + (existing[0],))
+                        raws.append((existing[0], json.dumps(r, ensure_ascii=False)))
+                if updates:
+                    conn.executemany(update_sql, updates)
+                if inserts:
+                    conn.executemany(insert_sql, inserts)
+                if raws:
+                    conn.executemany(raw_sql, raws)
+                counts["total"] += len(records)
+                counts["inserted"] += len(inserts)
+                counts["updated"] += len(updates)
+            if counts["total"] == 0:
+                conn.rollback()
+                return counts
+
+            # Lo que quedó en `current` ya no viene en el archivo
+            deletes = [(row_id,) for row_id, _ in current.values()]
+            if deletes:
+                conn.executemany("DELETE FROM vehiculos WHERE id = ?", deletes)
+            counts["deleted"] = len(deletes)
+            counts["unchanged"] = counts["total"] - counts["inserted"] - counts["updated"]
+            if validate is not None:
+                validate(counts)
+            # Entero de 63 bits: cabe en stock_meta.value y en las claves de cache
+            generation = int.from_bytes(digest.digest()[:8], "big") >> 1
+            changed = conn.execute(
+                "INSERT INTO stock_meta (key, value) VALUES ('generation', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value WHERE value != excluded.value",
+                (generation,),
+            ).rowcount
+            if counts["inserted"] or counts["updated"] or counts["deleted"]:
+                # Estadísticas del planner al día para elegir bien entre los índices compuestos
+                conn.execute("PRAGMA optimize")
+                # Versión del stock: invalida las búsquedas cacheadas (ver stock/cache.py)
+                conn.execute("UPDATE stock_meta SET value = value + 1 WHERE key = 'version'")
+        if changed or counts["inserted"] or counts["updated"] or counts["deleted"]:
+            self._invalidate()
+        return counts
+
+    def _invalidate(self) -> None:
+        """Descarta el índice y lo derivado de él. Solo después del commit: un get_index() concurrente
+        que ya estaba leyendo el stock anterior termina antes (mismo lock) y el siguiente lee lo nuevo."""
+        with self._index_lock:
+            self._index = None
+            self._summary = None
+            self._lexicon = None
+            self._similarity = None
+            self._distinct_keys = {}
 
     def search(
         self,
@@ -145,71 +499,229 @@ class StockRepository:
         exclude_marca: str | None = None,
         exclude_modelo: str | None = None,
         exclude_combustible: str | None = None,
+        texto: str | None = None,
+        cuota_max: float | None = None,
+        pie: float | None = None,
+        plazo: int | None = None,
         limit: int = 50,
         order_by_precio: str = "asc",
-    ) -> list[dict[str, Any]]:
-        conditions = []
-        params: list[Any] = []
-        if exclude_marca and exclude_marca.strip():
-            conditions.append("LOWER(TRIM(marca)) != LOWER(TRIM(?))")
-            params.append(exclude_marca.strip())
-        if exclude_modelo and exclude_modelo.strip():
-            conditions.append("LOWER(TRIM(modelo)) != LOWER(TRIM(?))")
-            params.append(exclude_modelo.strip())
-        if exclude_combustible and exclude_combustible.strip():
-            conditions.append("(combustible IS NULL OR TRIM(COALESCE(combustible,'')) = '' OR LOWER(TRIM(combustible)) != LOWER(TRIM(?)))")
-            params.append(exclude_combustible.strip())
-        if precio_min is not None:
-            conditions.append("precio >= ?")
-            params.append(precio_min)
-        if precio_max is not None:
-            conditions.append("precio <= ?")
-            params.append(precio_max)
-        if año_min is not None:
-            conditions.append("año >= ?")
-            params.append(año_min)
-        if año_max is not None:
-            conditions.append("año <= ?")
-            params.append(año_max)
-        if km_max is not None:
-            conditions.append("(kilometraje IS NULL OR kilometraje <= ?)")
-            params.append(km_max)
-        if marca:
-            conditions.append("LOWER(marca) LIKE ?")
-            params.append(f"%{marca.lower()}%")
-        if modelo:
-            conditions.append("LOWER(modelo) LIKE ?")
-            params.append(f"%{modelo.lower()}%")
-        if segmento and segmento.strip():
-            conditions.append("LOWER(TRIM(segmento)) = LOWER(TRIM(?))")
-            params.append(segmento.strip())
-        if transmision and transmision.strip():
-            conditions.append("LOWER(TRIM(transmision)) = LOWER(TRIM(?))")
-            params.append(transmision.strip())
-        if combustible and combustible.strip():
-            conditions.append("LOWER(TRIM(combustible)) = LOWER(TRIM(?))")
-            params.append(combustible.strip())
-        where = " AND ".join(conditions) if conditions else "1=1"
-        order = "DESC" if (order_by_precio or "").strip().lower() == "desc" else "ASC"
-        params.append(limit)
-        sql = f"SELECT * FROM vehiculos WHERE {where} ORDER BY precio {order} LIMIT ?"
+        after: tuple[float | None, int] | None = None,
+        offset: int = 0,
+        columns: tuple[str, ...] | None = None,
+    ) -> list[Vehicle]:
+        """Busca vehículos; `texto` (ej. "1.2 puretech", "4x4") busca en marca/modelo/versión y ordena por relevancia.
+
+        Financiamiento: con `cuota_max` solo vehículos cuya cuota real (pie acotado a 30%-50%, `plazo`
+        en meses, 36 por defecto) no la supera. Con `cuota_max` o `pie` cada fila trae cuota,
+        pie_usado y plazo calculados.
+
+        Paginación: `after` = (precio, id) de la última fila de la página anterior (keyset, mismo
+        costo en cualquier página); con texto el orden es por relevancia y se pagina con `offset`.
+
+        `columns`: proyección (campos de Vehicle a leer; id y precio siempre van). Por defecto
+        DEFAULT_COLUMNS, lo que usan las herramientas; los demás campos quedan en None.
+        """
+        columns = projection(columns)
+        filters = _filters(dict(
+            precio_min=precio_min,
+            precio_max=precio_max,
+            año_min=año_min,
+            año_max=año_max,
+            km_max=km_max,
+            marca=marca,
+            modelo=modelo,
+            segmento=segmento,
+            transmision=transmision,
+            combustible=combustible,
+            exclude_marca=exclude_marca,
+            exclude_modelo=exclude_modelo,
+            exclude_combustible=exclude_combustible,
+            cuota_max=cuota_max,
+            pie=pie,
+            plazo=plazo,
+        ))
+        if self.use_index:
+            match = fts_query(texto)
+            ranked = self._fts_ranked(match) if match else None
+            rows = self.get_index().search(
+                limit=limit, order_by_precio=order_by_precio, ranked=ranked, after=after, offset=offset,
+                columns=columns, **filters,
+            )
+        else:
+            rows = self._search_sql(
+                limit=limit, order_by_precio=order_by_precio, texto=texto, after=after, offset=offset,
+                columns=columns, **filters,
+            )
+        if cuota_max is not None or pie is not None:
+            rows = _with_cuotas(rows, pie or 0, normalize_plazo(plazo))
+        return rows
+
+    def first_match(self, candidates: list[dict[str, Any]]) -> int | None:
+        """Posición del primer juego de parámetros de search que encuentra algo (ej. los peldaños de
+        stock.relax); None si ninguno. En el índice en memoria es una sola pasada: cada filtro distinto
+        se evalúa una vez para todos los juegos. Sin índice, una búsqueda de una fila por juego."""
+        if not self.use_index:
+            return next((i for i, params in enumerate(candidates) if self.search(**{**params, "limit": 1})), None)
+        index = self.get_index()
+        terms: dict[tuple[str, Any], np.ndarray] = {}
+        for i, params in enumerate(candidates):
+            m = index.mask(terms=terms, **_filters(params))
+            match = fts_query(params.get("texto"))
+            if match:
+                key = ("texto", match)
+                if key not in terms:
+                    ids = [row_id for row_id, _ in self._fts_ranked(match)]
+                    terms[key] = np.isin(index.ids, np.array(ids, dtype=np.int64))
+                m &= terms[key]
+            if m.any():
+                return i
+        return None
+
+    def get_by_refs(
+        self, refs: Iterable[str], columns: tuple[str, ...] | None = None
+    ) -> list[Vehicle | None]:
+        """Vehículos por id externo / patente (o el link de su ficha, ej. .../usados/TFDL48); None si no está."""
+        columns = projection(columns)
+        found: list[Vehicle | None] = []
+        for ref in refs:
+            ref = str(ref or "").strip().rstrip("/").rsplit("/", 1)[-1]
+            row = None
+            for candidate in dict.fromkeys((ref, ref.upper())):
+                if not candidate:
+                    continue
+                if self.use_index:
+                    index = self.get_index()
+                    positions = index.positions_where("id_externo", candidate)
+                    row = index.records(positions[:1], columns)[0] if len(positions) else None
+                else:
+                    hit = self._conn().execute(
+                        f"SELECT {', '.join(columns)} FROM vehiculos WHERE id_externo = ? ORDER BY id LIMIT 1",
+                        (candidate,),
+                    ).fetchone()
+                    row = Vehicle(**dict(hit)) if hit else None
+                if row is not None:
+                    break
+            found.append(row)
+        return found
+
+    def get_raw(self, vehicle_id: int) -> dict[str, Any] | None:
+        """Registro original del archivo de stock para un vehículo (todas sus columnas); None si no está."""
+        row = self._conn().execute("SELECT raw_json FROM vehiculos_raw WHERE id = ?", (vehicle_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def get_similarity(self) -> SimilarityIndex:
+        """Matriz de vehículos similares del índice actual; se arma una vez por carga/sync."""
+        index = self.get_index()
+        similarity = self._similarity
+        if similarity is None or similarity.index is not index:
+            similarity = SimilarityIndex(index)
+            self._similarity = similarity
+        return similarity
+
+    def similar_vehicles(
+        self,
+        *,
+        ref: str | None = None,
+        modelo: str | None = None,
+        precio: float | None = None,
+        k: int = 5,
+        columns: tuple[str, ...] | None = None,
+    ) -> tuple[list[Vehicle], dict[str, Any]]:
+        """Los k vehículos más parecidos a uno del stock (ref: patente/id externo) o a un modelo por nombre.
+
+        Devuelve (filas, info) con info = {"referencia": Vehicle o None, "modelo_en_stock": bool,
+        "perfil": {marca, segmento} usado para un modelo que no está}. Sin referencia resoluble: ([], info).
+        """
+        similarity = self.get_similarity()
+        index = similarity.index
+        info: dict[str, Any] = {"referencia": None, "modelo_en_stock": False, "perfil": None}
+        if ref:
+            reference = self.get_by_refs([ref], columns)[0]
+            if reference is None:
+                return [], info
+            info["referencia"] = reference
+            position = index.positions_of(np.array([reference.id]))
+            query = similarity.matrix[position[0]].astype(np.float64)
+            if precio is not None:
+                query = similarity.profile(index.ids == reference.id, precio=precio)
+            exclude = index.ids == reference.id
+        elif modelo:
+            marca, segmento, name = model_hint(modelo)
+            modelo_key = normalize_key("modelo", name)
+            in_stock = index.encoded["modelo"].startswith(modelo_key) if modelo_key else np.zeros(len(index), bool)
+            if marca and in_stock.any():
+                in_stock &= index.encoded["marca"].equals(normalize_key("marca", marca))
+            if in_stock.any():
+                info["modelo_en_stock"] = True
+                query = similarity.profile(in_stock, precio=precio)
+            else:
+                if marca is None:
+                    # Sin pista: alguna palabra puede ser una marca del stock ("un chevrolet chico")
+                    marca = next((w for w in fold(modelo).split() if similarity.has_value("marca", normalize_key("marca", w))), None)
+                if marca is None and segmento is None:
+                    return [], info
+                rows = index.encoded["segmento"].equals(segmento) if segmento else None
+                info["perfil"] = {"marca": marca, "segmento": segmento}
+                query = similarity.profile(rows, marca=marca, segmento=segmento, precio=precio)
+            exclude = in_stock
+        else:
+            return [], info
+        return index.records(similarity.nearest(query, k, exclude=exclude), columns), info
+
+    def _fts_ranked(self, match: str) -> list[tuple[int, float]]:
+        """(id, bm25) de las filas que calzan con la expresión FTS, mejor primero."""
+        sql = f"SELECT rowid, {FTS_RANK} FROM vehiculos_fts WHERE vehiculos_fts MATCH ? ORDER BY 2"
+        return [(row[0], row[1]) for row in self._conn().execute(sql, (match,))]
+
+    def _matching_keys(self, filters: dict[str, Any]) -> dict[str, Any]:
+        """Filtros para _search_query: marca / modelo (subcadena, como LIKE '%x%') pasan a la lista de
+        claves del stock que los contienen, así la consulta es igualdad o IN sobre la columna indexada."""
+        filters = dict(filters)
+        for col in SUBSTRING_COLUMNS:
+            value = filters.pop(col, None)
+            if not normalize_key(col, value):
+                continue
+            keys = self._distinct_keys.get(col)
+            if keys is None:
+                rows = self._conn().execute(f"SELECT DISTINCT {col}_key FROM vehiculos WHERE {col}_key != ''")
+                keys = [row[0] for row in rows]
+                self._distinct_keys[col] = keys
+            filters[f"{col}_keys"] = matching_keys(col, value, keys)
+        return filters
+
+    def _search_sql(self, **filters: Any) -> list[Vehicle]:
+        sql, params = _search_query(**self._matching_keys(filters))
         with self._conn() as conn:
             rows = conn.execute(sql, params).fetchall()
-        return [dict(row) for row in rows]
+        return [Vehicle(**dict(row)) for row in rows]
+
+    def explain_search(self, **filters: Any) -> list[str]:
+        """Plan de SQLite (EXPLAIN QUERY PLAN) de la consulta SQL de search; para verificar el uso de índices."""
+        sql, params = _search_query(**self._matching_keys(filters))
+        return [row["detail"] for row in self._conn().execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    def lexicon(self) -> frozenset[str]:
+        """Marcas y modelos del stock (claves normalizadas y sus palabras, sin números sueltos); una vez por índice."""
+        index = self.get_index()
+        cached = self._lexicon
+        if cached is not None and cached[0] is index:
+            return cached[1]
+        terms = set()
+        for column in ("marca", "modelo"):
+            for key in index.encoded[column].values:
+                if key:
+                    terms.add(key)
+                    terms.update(w for w in key.split() if len(w) > 1 and not w.isdigit())
+        lexicon = frozenset(terms)
+        self._lexicon = (index, lexicon)
+        return lexicon
 
     def get_summary(self) -> dict[str, Any]:
-        with self._conn() as conn:
-            _create_schema(conn)
-            total = conn.execute("SELECT COUNT(*) FROM vehiculos").fetchone()[0]
-            if total == 0:
-                return {"total": 0, "precio_min": None, "precio_max": None, "año_min": None, "año_max": None}
-            row = conn.execute(
-                "SELECT MIN(precio), MAX(precio), MIN(año), MAX(año) FROM vehiculos"
-            ).fetchone()
-        return {
-            "total": total,
-            "precio_min": row[0],
-            "precio_max": row[1],
-            "año_min": row[2],
-            "año_max": row[3],
-        }
+        """Totales, rangos y conteos por faceta (ver stock/facets.py); se calcula una vez por índice."""
+        index = self.get_index()
+        cached = self._summary
+        if cached is not None and cached[0] is index:
+            return cached[1]
+        summary = compute_summary(index)
+        self._summary = (index, summary)
+        return summary
@@ -0,0 +1,145 @@
+"""Vehículos similares por vecinos más cercanos (k-NN por fuerza bruta sobre una matriz NumPy).
+
+Cada vehículo es un vector: precio, año y kilometraje estandarizados + one-hot de segmento,
+transmisión, combustible y marca, cada bloque con su peso. La matriz se arma una vez por
+índice (o sea, en cada carga/sync del stock) y una consulta equivale a un producto
+matriz-vector (evaluado por bloques, sin los ceros del one-hot) más un argpartition: bajo el
+milisegundo con decenas de miles de filas.
+
+Para un modelo que no está en stock se arma un vector "perfil" con MODEL_HINTS (marca y
+segmento típicos): el centroide del segmento con la marca y el precio indicados encima.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+from stock.index import StockIndex
+from stock.normalize import fold, normalize_key
+
+# Peso de cada bloque en la distancia (un bloque one-hot distinto suma 2 * peso²)
+_NUMERIC_WEIGHTS = {"precio": 2.0, "año": 1.0, "kilometraje": 0.7}
+_ONE_HOT_WEIGHTS = {"segmento": 2.5, "transmision": 1.0, "combustible": 1.0, "marca": 0.7}
+
+# Modelos frecuentes en consultas -> (marca, segmento) canónicos, para perfilar los que no están en stock
+MODEL_HINTS: dict[str, tuple[str, str]] = {
+    "morning": ("kia", "citycar"), "picanto": ("kia", "citycar"), "rio": ("kia", "sedan"),
+    "soluto": ("kia", "sedan"), "sportage": ("kia", "suv"), "sorento": ("kia", "suv"), "seltos": ("kia", "suv"),
+    "spark": ("chevrolet", "citycar"), "sail": ("chevrolet", "sedan"), "onix": ("chevrolet", "sedan"),
+    "tracker": ("chevrolet", "suv"), "captiva": ("chevrolet", "suv"), "groove": ("chevrolet", "suv"),
+    "colorado": ("chevrolet", "camioneta"), "d-max": ("chevrolet", "camioneta"),
+    "yaris": ("toyota", "sedan"), "corolla": ("toyota", "sedan"), "rav4": ("toyota", "suv"),
+    "rush": ("toyota", "suv"), "hilux": ("toyota", "camioneta"), "fortuner": ("toyota", "suv"),
+    "accent": ("hyundai", "sedan"), "grand i10": ("hyundai", "citycar"), "i10": ("hyundai", "citycar"),
+    "tucson": ("hyundai", "suv"), "santa fe": ("hyundai", "suv"), "creta": ("hyundai", "suv"), "venue": ("hyundai", "suv"),
+    "versa": ("nissan", "sedan"), "sentra": ("nissan", "sedan"), "march": ("nissan", "citycar"),
+    "kicks": ("nissan", "suv"), "qashqai": ("nissan", "suv"), "x-trail": ("nissan", "suv"), "navara": ("nissan", "camioneta"),
+    "np300": ("nissan", "camioneta"), "swift": ("suzuki", "citycar"), "baleno": ("suzuki", "citycar"),
+    "vitara": ("suzuki", "suv"), "jimny": ("suzuki", "suv"), "mazda 3": ("mazda", "sedan"), "cx-3": ("mazda", "suv"),
+    "cx-5": ("mazda", "suv"), "bt-50": ("mazda", "camioneta"), "l200": ("mitsubishi", "camioneta"),
+    "outlander": ("mitsubishi", "suv"), "ranger": ("ford", "camioneta"), "ecosport": ("ford", "suv"),
+    "territory": ("ford", "suv"), "duster": ("renault", "suv"), "kwid": ("renault", "citycar"),
+    "oroch": ("renault", "camioneta"), "gol": ("volkswagen", "citycar"), "t-cross": ("volkswagen", "suv"),
+    "amarok": ("volkswagen", "camioneta"), "208": ("peugeot", "citycar"), "2008": ("peugeot", "suv"),
+    "3008": ("peugeot", "suv"), "c3": ("citroen", "citycar"), "c4 cactus": ("citroen", "suv"),
+    "zs": ("mg", "suv"), "mg3": ("mg", "citycar"), "tiggo 2": ("chery", "suv"), "coolray": ("geely", "suv"),
+}
+
+
+class SimilarityIndex:
+    """Matriz de características del stock (mismas filas y orden que el StockIndex)."""
+
+    def __init__(self, index: StockIndex):
+        self.index = index
+        n = len(index)
+        blocks: list[np.ndarray] = []
+        self._numeric: dict[str, tuple[int, float, float, float]] = {}
+        self._one_hot: dict[str, tuple[int, int, dict[str, int], float]] = {}
+        codes_by_block: list[np.ndarray] = []
+        offset = 0
+        for name, weight in _NUMERIC_WEIGHTS.items():
+            values = np.asarray(index.data[name].array, dtype=np.float64)
+            known = ~np.isnan(values)
+            mean = float(values[known].mean()) if known.any() else 0.0
+            std = float(values[known].std()) if known.any() else 0.0
+            std = std or 1.0
+            # NULL = promedio (no acerca ni aleja)
+            column = np.where(known, (values - mean) / std, 0.0) * weight
+            blocks.append(column[:, None])
+            self._numeric[name] = (offset, mean, std, weight)
+            offset += 1
+        for name, weight in _ONE_HOT_WEIGHTS.items():
+            encoded = index.encoded[name]
+            codes = np.asarray(encoded.codes)
+            block = np.zeros((n, len(encoded.values)), dtype=np.float64)
+            block[np.arange(n), codes] = weight
+            blocks.append(block)
+            lookup = {v: i for i, v in enumerate(encoded.values) if v}
+            codes_by_block.append(codes)
+            self._one_hot[name] = (offset, len(encoded.values), lookup, weight)
+            offset += len(encoded.values)
+        self.matrix = np.ascontiguousarray(np.hstack(blocks) if n else np.zeros((0, offset)), dtype=np.float32)
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        # Para nearest, la parte one-hot de cada fila es una combinación (segmento, transmisión,
+        # combustible, marca): pocas combinaciones distintas, cada fila guarda el número de la suya
+        self._numeric_matrix = np.ascontiguousarray(self.matrix[:, :len(self._numeric)])
+        stacked = np.stack(codes_by_block, axis=1) if n else np.zeros((0, len(codes_by_block)), dtype=np.int64)
+        self._combos, combo_of_row = np.unique(stacked, axis=0, return_inverse=True)
+        self._combo_of_row = combo_of_row.reshape(-1).astype(np.intp)
+
+    def nearest(self, query: np.ndarray, k: int, exclude: np.ndarray | None = None) -> np.ndarray:
+        """Posiciones de las k filas más cercanas a `query` (más cercana primero)."""
+        if not len(self.matrix) or k <= 0:
+            return np.empty(0, dtype=np.int64)
+        query = query.astype(np.float32)
+        # matrix @ query sin recorrer los ceros del one-hot: columnas numéricas + el producto de cada
+        # combinación one-hot (calculado una vez por combinación, no por fila). ~20 bytes por fila
+        # en vez de la matriz completa; es lo que lo deja bajo el milisegundo
+        by_combo = np.zeros(len(self._combos), dtype=np.float32)
+        for block, (start, _, _, weight) in enumerate(self._one_hot.values()):
+            by_combo += query[start + self._combos[:, block]] * weight
+        dist = self._numeric_matrix @ query[:self._numeric_matrix.shape[1]]
+        dist += by_combo[self._combo_of_row]
+        # ||x - q||² sin el término ||q||², que es igual para todas las filas (en el lugar: sin temporales)
+        dist *= -2
+        dist += self.sq_norms
+        candidates = len(dist)
+        if exclude is not None and exclude.any():
+            dist[exclude] = np.inf
+            candidates -= int(exclude.sum())
+        k = min(k, candidates)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(dist, k - 1)[:k]
+        return top[np.argsort(dist[top], kind="stable")]
+
+    def has_value(self, name: str, key: str) -> bool:
+        return key in self._one_hot[name][2]
+
+    def profile(self, rows: np.ndarray | None = None, **attrs: Any) -> np.ndarray:
+        """Vector de consulta: centroide de `rows` (o de todo el stock) con los atributos dados encima.
+
+        attrs: precio, año, kilometraje (números) y segmento, transmision, combustible, marca (texto).
+        """
+        base = self.matrix if rows is None or not rows.any() else self.matrix[rows]
+        query = base.mean(axis=0).astype(np.float64) if len(base) else np.zeros(self.matrix.shape[1])
+        for name, (col, mean, std, weight) in self._numeric.items():
+            if attrs.get(name) is not None:
+                query[col] = (float(attrs[name]) - mean) / std * weight
+        for name, (start, width, lookup, weight) in self._one_hot.items():
+            key = normalize_key(name, attrs.get(name)) if attrs.get(name) else ""
+            if key in lookup:
+                query[start:start + width] = 0.0
+                query[start + lookup[key]] = weight
+        return query
+
+
+def model_hint(modelo: str) -> tuple[str | None, str | None, str]:
+    """(marca, segmento, modelo sin marca) para un nombre como "Kia Morning" o "hilux"."""
+    text = fold(modelo)
+    for name in sorted(MODEL_HINTS, key=len, reverse=True):
+        if text == name or text.endswith(" " + name) or text.startswith(name + " "):
+            marca, segmento = MODEL_HINTS[name]
+            return marca, segmento, name
+    return None, None, text
@@ -0,0 +1,107 @@
+"""Snapshot binario del stock para arrancar sin parsear el CSV.
+
+Un snapshot es un directorio con:
+- manifest.json: versión de formato, sha256 del archivo de stock de origen y de cada artefacto.
+- stock.db: la base SQLite ya cargada y compactada (VACUUM INTO), con índices y FTS.
+- index/: el StockIndex como un .npy por columna + diccionarios (se abre con memory-map).
+
+Al arrancar, si el sha256 de STOCK_FILE coincide con el del manifest, se copia stock.db
+y se abre el índice con mmap: no hay pandas ni inserts, la réplica queda lista en milisegundos.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from stock.index import StockIndex
+from stock.repository import StockRepository
+
+# 2: el índice ya no trae raw_json (vive en vehiculos_raw, se lee bajo demanda)
+# 3: stock.db trae la generación del stock en stock_meta
+SNAPSHOT_FORMAT_VERSION = 3
+
+_MANIFEST = "manifest.json"
+_DB_FILE = "stock.db"
+_INDEX_DIR = "index"
+
+
+def file_sha256(path: str | Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_manifest(snapshot_dir: str | Path) -> dict[str, Any] | None:
+    path = Path(snapshot_dir) / _MANIFEST
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def build_snapshot(source_file: str | Path, snapshot_dir: str | Path) -> dict[str, Any]:
+    """Parsea source_file una vez y escribe el snapshot en snapshot_dir (reemplazo atómico). Devuelve el manifest."""
+    source_file = Path(source_file)
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.parent.mkdir(parents=True, exist_ok=True)
+    source_hash = file_sha256(source_file)
+    with tempfile.TemporaryDirectory(dir=snapshot_dir.parent) as work:
+        repo = StockRepository(str(Path(work) / "build.db"))
+        diff = repo.sync_from_file(str(source_file))
+        if diff["total"] == 0:
+            raise ValueError(f"El archivo de stock no tiene vehículos: {source_file}")
+        staging = Path(work) / "snapshot"
+        staging.mkdir()
+        repo.get_index().save(staging / _INDEX_DIR)
+        repo.vacuum_into(str(staging / _DB_FILE))
+        files = {
+            str(p.relative_to(staging)): file_sha256(p)
+            for p in sorted(staging.rglob("*"))
+            if p.is_file()
+        }
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "source_file": source_file.name,
+            "source_sha256": source_hash,
+            "rows": diff["total"],
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "files": files,
+        }
+        (staging / _MANIFEST).write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+        # Reemplazo: el snapshot anterior se mueve aparte y recién entonces se borra
+        old = Path(work) / "old"
+        if snapshot_dir.exists():
+            snapshot_dir.rename(old)
+        staging.rename(snapshot_dir)
+    return manifest
+
+
+def load_snapshot(snapshot_dir: str | Path, source_file: str | Path, db_path: str) -> StockRepository | None:
+    """Repositorio listo desde el snapshot si corresponde a source_file; None si falta o está desactualizado.
+
+    Copia stock.db a db_path (debe llamarse antes de abrir conexiones a db_path) y deja el
+    índice abierto con memory-map.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    manifest = read_manifest(snapshot_dir)
+    if not manifest or manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    if not Path(source_file).exists() or file_sha256(source_file) != manifest.get("source_sha256"):
+        return None
+    target = Path(db_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    for suffix in ("-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    shutil.copyfile(snapshot_dir / _DB_FILE, target)
+    repo = StockRepository(db_path)
+    repo.set_index(StockIndex.load(snapshot_dir / _INDEX_DIR, mmap=True))
+    return repo
@@ -0,0 +1,66 @@
+"""Registro compacto de un vehículo tal como lo devuelven las búsquedas de stock.
+
+Inmutable y con __slots__: ocupa una fracción de un dict con las mismas claves y puede
+compartirse sin copias entre el cache de búsquedas y las herramientas. Los campos que no
+se pidieron en la proyección (ver StockRepository.search) quedan en None.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+
+# Columnas de la tabla vehiculos que puede traer un Vehicle (sin claves *_key ni raw_json)
+ALL_COLUMNS = (
+    "id", "id_externo", "marca", "modelo", "año", "precio", "kilometraje",
+    "transmision", "combustible", "color", "estado", "sucursal", "ubicacion",
+    "comuna", "version", "placa_patente", "link", "segmento",
+)
+
+# Proyección por defecto: lo que muestran las herramientas del agente
+DEFAULT_COLUMNS = (
+    "id", "id_externo", "marca", "modelo", "año", "precio", "kilometraje",
+    "transmision", "combustible", "sucursal", "comuna", "version", "link", "segmento",
+)
+
+# Siempre se proyectan: id y precio son la clave del orden (cursores) y la base de las cuotas
+_REQUIRED = ("id", "precio")
+
+
+def projection(columns: tuple[str, ...] | list[str] | None) -> tuple[str, ...]:
+    """Columnas a leer: las pedidas (validadas, en orden de tabla) más id y precio."""
+    if columns is None:
+        return DEFAULT_COLUMNS
+    wanted = set(columns) | set(_REQUIRED)
+    unknown = wanted - set(ALL_COLUMNS)
+    if unknown:
+        raise ValueError(f"Columnas desconocidas: {', '.join(sorted(unknown))}")
+    return tuple(c for c in ALL_COLUMNS if c in wanted)
+
+
+@dataclass(frozen=True, slots=True)
+class Vehicle:
+    id: int
+    id_externo: str | None = None
+    marca: str | None = None
+    modelo: str | None = None
+    año: int | None = None
+    precio: float | None = None
+    kilometraje: float | None = None
+    transmision: str | None = None
+    combustible: str | None = None
+    color: str | None = None
+    estado: str | None = None
+    sucursal: str | None = None
+    ubicacion: str | None = None
+    comuna: str | None = None
+    version: str | None = None
+    placa_patente: str | None = None
+    link: str | None = None
+    segmento: str | None = None
+    # Simulación de financiamiento (search con pie o cuota_max)
+    cuota: float | None = None
+    pie_usado: float | None = None
+    plazo: int | None = None
+
+    def as_dict(self) -> dict:
+        """Campos con valor, como dict (para serializar o depurar)."""
+        return {f.name: getattr(self, f.name) for f in fields(self) if getattr(self, f.name) is not None}